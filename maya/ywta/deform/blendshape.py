@@ -1,13 +1,19 @@
 import os
 from six import string_types
+import numpy as np
 import maya.cmds as cmds
 import maya.OpenMaya as OpenMaya
 import maya.OpenMayaAnim as OpenMayaAnim
+import maya.api.OpenMaya as OpenMaya2
+import maya.api.OpenMayaAnim as OpenMayaAnim2
 
 from ywta.io.obj import import_obj, export_obj
 import ywta.shortcuts as shortcuts
+import ywta.utility.mayaarrays as mayaarrays
+import ywta.deform.historycache as historycache
 import ywta.deform.np_mesh as np_mesh
 import ywta.rig.common as common
+from ywta.utility.timing import Section
 
 
 def get_blendshape_node(geometry):
@@ -16,14 +22,7 @@ def get_blendshape_node(geometry):
     :param geometry: Name of the geometry
     :return: The blendShape node name
     """
-    geometry = shortcuts.get_shape(geometry)
-    history = cmds.listHistory(geometry, il=2, pdo=False) or []
-    blendshapes = [
-        x
-        for x in history
-        if cmds.nodeType(x) == "blendShape"
-        and cmds.blendShape(x, q=True, g=True)[0] == geometry
-    ]
+    blendshapes = historycache.get_deformers(geometry, "blendShape")
     if blendshapes:
         return blendshapes[0]
     else:
@@ -105,19 +104,227 @@ def set_target_weights(blendshape, target, weights):
         )
 
 
-def import_obj_directory(directory, base_mesh=None):
+def import_obj_directory(directory, base_mesh=None, as_deltas=False, max_workers=None):
+    """Import all the obj files in a directory.
+
+    :param directory: Directory containing obj files.  Files starting with an
+        underscore are skipped.
+    :param base_mesh: Optional mesh to add the objs to as blendShape targets.
+    :param as_deltas: True to read the objs into point arrays in parallel and write the
+        target deltas directly into the blendShape instead of importing each obj as a
+        mesh.  Requires base_mesh.
+    :param max_workers: Maximum number of processes used to read the objs when
+        as_deltas is True.
+    """
     if base_mesh:
         blendshape = get_or_create_blendshape_node(base_mesh)
-    for f in os.listdir(directory):
-        if not f.lower().endswith(".obj") or f.startswith("_"):
-            continue
-        full_path = os.path.join(directory, f)
+    paths = [
+        os.path.join(directory, f)
+        for f in sorted(os.listdir(directory))
+        if f.lower().endswith(".obj") and not f.startswith("_")
+    ]
+    if as_deltas:
+        if not base_mesh:
+            raise RuntimeError("Importing objs as deltas requires a base mesh.")
+        add_obj_targets(blendshape, paths, max_workers)
+        return
+    for full_path in paths:
         target = import_obj(full_path)
         if base_mesh:
             add_target(blendshape, target)
             cmds.delete(target)
 
 
+def add_obj_targets(blendshape, file_paths, max_workers=None):
+    """Add obj files as blendShape targets without importing them into Maya.
+
+    The objs are parsed on a process pool into a memory-mapped point array and only
+    the final target creation touches Maya.  The time spent in each stage is printed.
+
+    :param blendshape: BlendShape node name
+    :param file_paths: List of obj file paths.  The target names are the file names.
+    :param max_workers: Maximum number of processes used to read the objs.
+    :return: List of the target indices
+    """
+    workspace = "add_obj_targets {} files".format(len(file_paths))
+    with Section(workspace, "read objs"):
+        names, points = np_mesh.read_obj_points(file_paths, max_workers)
+    with Section(workspace, "read base points"):
+        base_points = get_base_points(blendshape)
+    if points.shape[0] and points.shape[1:] != base_points.shape:
+        raise RuntimeError(
+            "The objs have {} vertices, expected {}".format(
+                points.shape[1], base_points.shape[0]
+            )
+        )
+    with Section(workspace, "create targets"):
+        deltas = (target - base_points for target in points)
+        indices = add_targets_from_deltas(blendshape, names, deltas)
+    Section.print_timing()
+    return indices
+
+
+def get_base_points(blendshape):
+    """Get the points of the geometry going into a blendShape node.
+
+    Target deltas are relative to these points.
+
+    :param blendshape: BlendShape node name
+    :return: (N x 3) numpy array
+    """
+    fn_geometry_filter = OpenMayaAnim2.MFnGeometryFilter(
+        shortcuts.get_mobject(blendshape)
+    )
+    shape = fn_geometry_filter.inputShapeAtIndex(0)
+    path = OpenMaya2.MDagPath.getAPathTo(shape)
+    return mayaarrays.get_points(path.fullPathName())
+
+
+def add_target_deltas(blendshape, target, deltas, threshold=1e-5):
+    """Add a target to a blendShape from point deltas without a target mesh.
+
+    If a target with the given name already exists, its deltas are replaced.
+
+    :param blendshape: BlendShape node name
+    :param target: Target name
+    :param deltas: (N x 3) point deltas from the base geometry
+    :param threshold: Deltas with no component larger than this value are not stored.
+    :return: The target index
+    """
+    return add_targets_from_deltas(blendshape, [target], [deltas], threshold)[0]
+
+
+def add_targets_from_deltas(blendshape, targets, deltas, threshold=1e-5):
+    """Add many targets to a blendShape from point deltas in one batch.
+
+    No target meshes are created.  The weight of all new targets are created with a
+    single setAttr and the point data of all targets is written with a single
+    MDGModifier, so adding hundreds of targets does not duplicate meshes or evaluate
+    the DG per target.  Existing targets with the same names have their deltas
+    replaced.
+
+    :param blendshape: BlendShape node name
+    :param targets: List of target names
+    :param deltas: (targets x N x 3) array or iterable of (N x 3) point deltas from
+        the base geometry or np_mesh.SparseDelta.
+    :param threshold: Deltas with no component larger than this value are not stored.
+    :return: List of the target indices
+    """
+    indices = get_or_create_target_indices(blendshape, targets)
+    set_targets_deltas(blendshape, indices, deltas, threshold)
+    return indices
+
+
+def get_or_create_target_indices(blendshape, targets):
+    """Get the indices of the given targets, creating the weights of missing targets.
+
+    :param blendshape: BlendShape node name
+    :param targets: List of target names
+    :return: List of target indices
+    """
+    aliases = cmds.aliasAttr(blendshape, q=True) or []
+    # aliasAttr returns a flat list of alias, attribute pairs such as "weight[3]"
+    existing = {
+        alias: int(attribute.split("[")[-1][:-1])
+        for alias, attribute in zip(aliases[::2], aliases[1::2])
+        if attribute.startswith("weight[")
+    }
+    used = cmds.getAttr("{}.w".format(blendshape), mi=True) or []
+    next_index = used[-1] + 1 if used else 0
+
+    indices = []
+    new_targets = []
+    for target in targets:
+        if target not in existing:
+            existing[target] = next_index
+            new_targets.append((target, next_index))
+            next_index += 1
+        indices.append(existing[target])
+
+    if new_targets:
+        first, last = new_targets[0][1], new_targets[-1][1]
+        cmds.setAttr(
+            "{}.w[{}:{}]".format(blendshape, first, last),
+            *[0.0] * len(new_targets),
+            size=len(new_targets)
+        )
+        for target, index in new_targets:
+            cmds.aliasAttr(target, "{}.w[{}]".format(blendshape, index))
+    return indices
+
+
+def set_target_deltas(blendshape, index, deltas, threshold=1e-5):
+    """Write point deltas into the inputTarget data of a blendShape target.
+
+    :param blendshape: BlendShape node name
+    :param index: Target index
+    :param deltas: (N x 3) point deltas from the base geometry
+    :param threshold: Deltas with no component larger than this value are not stored.
+    """
+    set_targets_deltas(blendshape, [index], [deltas], threshold)
+
+
+def set_targets_deltas(blendshape, indices, deltas, threshold=1e-5):
+    """Write the point deltas of many targets with a single MDGModifier.
+
+    :param blendshape: BlendShape node name
+    :param indices: List of target indices
+    :param deltas: (targets x N x 3) array or iterable of (N x 3) point deltas or
+        np_mesh.SparseDelta.
+    :param threshold: Deltas with no component larger than this value are not stored.
+    """
+    modifier = OpenMaya2.MDGModifier()
+    for index, target_deltas in zip(indices, deltas):
+        points, components = _create_target_data(target_deltas, threshold)
+        points_plug, components_plug = _get_target_item_plugs(blendshape, index)
+        modifier.newPlugValue(points_plug, points)
+        modifier.newPlugValue(components_plug, components)
+    modifier.doIt()
+
+
+def _create_target_data(deltas, threshold=1e-5):
+    """Create the inputPointsTarget and inputComponentsTarget data of a target.
+
+    :param deltas: (N x 3) point deltas from the base geometry or np_mesh.SparseDelta
+    :param threshold: Dense deltas with no component larger than this value are not
+        stored.
+    :return: Tuple of the pointArray and componentList data MObjects
+    """
+    if not isinstance(deltas, np_mesh.SparseDelta):
+        deltas = np_mesh.SparseDelta.from_dense(deltas, threshold)
+
+    points = OpenMaya2.MPointArray(deltas.deltas.astype(np.float64).tolist())
+    points = OpenMaya2.MFnPointArrayData().create(points)
+
+    fn_component = OpenMaya2.MFnSingleIndexedComponent()
+    components = fn_component.create(OpenMaya2.MFn.kMeshVertComponent)
+    fn_component.addElements(deltas.indices.tolist())
+    fn_component_list = OpenMaya2.MFnComponentListData()
+    component_list = fn_component_list.create()
+    fn_component_list.add(components)
+    return points, component_list
+
+
+def _get_target_item_plugs(blendshape, index, item=6000):
+    """Get the inputPointsTarget and inputComponentsTarget plugs of a target.
+
+    :param blendshape: BlendShape node name
+    :param index: Target index
+    :param item: Target item index.  6000 is the target at full weight.
+    :return: Tuple of the (inputPointsTarget, inputComponentsTarget) MPlugs
+    """
+    fn_node = OpenMaya2.MFnDependencyNode(shortcuts.get_mobject(blendshape))
+    plug = fn_node.findPlug("inputTarget", False).elementByLogicalIndex(0)
+    plug = plug.child(fn_node.attribute("inputTargetGroup"))
+    plug = plug.elementByLogicalIndex(index)
+    plug = plug.child(fn_node.attribute("inputTargetItem"))
+    plug = plug.elementByLogicalIndex(item)
+    return (
+        plug.child(fn_node.attribute("inputPointsTarget")),
+        plug.child(fn_node.attribute("inputComponentsTarget")),
+    )
+
+
 def export_blendshape_targets(blendshape, directory):
     """Export all targets of a blendshape as objs.
 
@@ -182,14 +389,17 @@ def transfer_shapes(source, destination, blendshape=None):
             return
     connections = zero_weights(blendshape)
     targets = get_target_list(blendshape)
-    new_targets = []
+    target_points = []
     for t in targets:
         cmds.setAttr("{}.{}".format(blendshape, t), 1)
-        new_targets.append(cmds.duplicate(destination, name=t)[0])
+        target_points.append(mayaarrays.get_points(destination))
         cmds.setAttr("{}.{}".format(blendshape, t), 0)
     cmds.delete(destination, ch=True)
-    new_blendshape = cmds.blendShape(new_targets, destination, foc=True)[0]
-    cmds.delete(new_targets)
+    new_blendshape = cmds.blendShape(destination, foc=True)[0]
+    base_points = get_base_points(new_blendshape)
+    add_targets_from_deltas(
+        new_blendshape, targets, (points - base_points for points in target_points)
+    )
     for t in targets:
         cmds.connectAttr(
             "{}.{}".format(blendshape, t), "{}.{}".format(new_blendshape, t)
@@ -198,20 +408,25 @@ def transfer_shapes(source, destination, blendshape=None):
     return new_blendshape
 
 
-def propagate_neutral_update(old_neutral, new_neutral, shapes):
+def propagate_neutral_update(old_neutral, new_neutral, shapes, mask=None):
     """Propagate neutral update deltas to target shapes
 
+    The points of all shapes are read into one (shapes x vertices x 3) array, the
+    delta is added to every shape in a single numpy operation and the points are
+    written back through the mesh point buffers.
+
     :param old_neutral: The old neutral mesh
     :param new_neutral: The new neutral mesh
     :param shapes: The list of shapes to update
+    :param mask: Optional np_mesh.Mask or per vertex weights used to fade the delta.
     """
     _old = np_mesh.Mesh.from_maya_mesh(old_neutral)
     _new = np_mesh.Mesh.from_maya_mesh(new_neutral)
-    delta = _new - _old
-    for shape in shapes:
-        _shape = np_mesh.Mesh.from_maya_mesh(shape)
-        new_shape = _shape + delta
-        new_shape.to_maya_mesh(shape)
+    # Neutral updates usually move few vertices so only those are stored and added
+    delta = np_mesh.SparseDelta.from_meshes(_new, _old)
+    points = np_mesh.get_maya_points(shapes)
+    np_mesh.propagate_delta(points, delta, mask)
+    np_mesh.set_maya_points(shapes, points)
 
 
 def create_shapes_joint(blendshapes, parent, name="shapes"):
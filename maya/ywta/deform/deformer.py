@@ -7,6 +7,7 @@ and managing blendshape keyframes.
 
 import maya.cmds as cmds
 import ywta.deform.blendshape as blendshape
+import ywta.utility.mayaarrays as mayaarrays
 
 
 def add_blendshape_target_with_frame(target_mesh, source_mesh, frame):
@@ -29,15 +30,11 @@ def add_blendshape_target_with_frame(target_mesh, source_mesh, frame):
         if not blendshape_name:
             raise RuntimeError(f"Could not get blendshape node for {target_mesh}")
 
-        # Duplicate the source mesh
+        # Write the source deltas directly instead of duplicating the source mesh
         target_name = f"deformer_{frame}"
-        duplicated_mesh = cmds.duplicate(source_mesh, name=target_name)[0]
-
-        # Add as blendshape target
-        blendshape.add_target(blendshape_name, duplicated_mesh)
-
-        # Clean up the duplicated mesh
-        cmds.delete(duplicated_mesh)
+        blendshape.add_target_deltas(
+            blendshape_name, target_name, _get_deltas(blendshape_name, source_mesh)
+        )
 
         return target_name
 
@@ -119,24 +116,23 @@ def bake_deformed_to_blendshape():
         # Store current time to restore later
         current_time = cmds.currentTime(query=True)
 
-        created_targets = []
-
-        for frame in range(start_frame, end_frame + 1):
-            # Move to frame
+        # Sample the deformed points of every frame first, then add all targets in
+        # one batch without duplicating the mesh per frame
+        frames = list(range(start_frame, end_frame + 1))
+        base_points = blendshape.get_base_points(blendshape_name)
+        deltas = []
+        for frame in frames:
             cmds.currentTime(frame)
-
-            # Create blendshape target
-            target_name = add_blendshape_target_with_frame(
-                target_mesh, source_mesh, frame
+            deltas.append(_get_points(source_mesh) - base_points)
+        created_targets = [f"deformer_{frame}" for frame in frames]
+        blendshape.add_targets_from_deltas(blendshape_name, created_targets, deltas)
+
+        for frame, target_name in zip(frames, created_targets):
+            # Set keyframes for this target
+            _set_target_keyframes(
+                blendshape_name, target_name, frame, start_frame, end_frame
             )
 
-            if target_name:
-                created_targets.append(target_name)
-                # Set keyframes for this target
-                _set_target_keyframes(
-                    blendshape_name, target_name, frame, start_frame, end_frame
-                )
-
         # Restore original time
         cmds.currentTime(current_time)
 
@@ -251,3 +247,30 @@ def _set_target_keyframes(
 
     # Return to original frame
     cmds.currentTime(frame)
+
+
+def _get_points(mesh):
+    """
+    Get the object space points of a mesh.
+
+    Args:
+        mesh (str): Mesh name
+
+    Returns:
+        numpy.ndarray: (N x 3) points
+    """
+    return mayaarrays.get_points(mesh)
+
+
+def _get_deltas(blendshape_name, mesh):
+    """
+    Get the deltas of a mesh from the base geometry of a blendshape.
+
+    Args:
+        blendshape_name (str): Name of the blendshape node
+        mesh (str): Mesh whose current points are used
+
+    Returns:
+        numpy.ndarray: (N x 3) deltas
+    """
+    return _get_points(mesh) - blendshape.get_base_points(blendshape_name)
@@ -0,0 +1,223 @@
+"""Cache of the deformers driving each shape in the scene.
+
+Looking up the deformers of a shape with listHistory and nodeType for every shape of a
+hierarchy is slow when batch tools repeat the lookup for many meshes.  This module
+walks every deformer of the scene once through the API, stores the shape -> deformer
+stack mapping and answers subsequent lookups from the stored mapping.
+
+The cache is invalidated by Maya callbacks whenever the scene is opened or cleared, a
+deformer is created or deleted, a DAG node is renamed or reparented or a connection of a
+cached deformer changes, so the next lookup rebuilds it.  The callbacks are registered on
+the first lookup, connection callbacks only watch the cached deformers, and the
+callbacks of a previous import are removed when the module is reloaded.
+
+Example Usage
+=============
+
+    import ywta.deform.historycache as historycache
+
+    skins = historycache.get_deformers("body", "skinCluster")
+    skins = historycache.get_deformers_in_hierarchy(["character"], "skinCluster")
+
+    # Remove the callbacks, e.g. before reloading the module
+    historycache.uninstall()
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from six import string_types
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as OpenMaya
+import maya.api.OpenMayaAnim as OpenMayaAnim
+
+# Remove the callbacks of the cache of a previous import when the module is reloaded
+if globals().get("_cache") is not None:
+    _cache.uninstall()
+_cache = None
+
+
+class DeformerCache(object):
+    """Mapping of shape long names to the deformers driving them."""
+
+    def __init__(self):
+        # {shape long name: [(deformer, node type)]}
+        self._shape_deformers = None
+        # Shapes with more than one deformer whose stack has been sorted
+        self._sorted_shapes = set()
+        self._callback_ids = []
+        # Connection callbacks of the deformers in the cache
+        self._node_callback_ids = []
+
+    def install(self):
+        """Register the callbacks used to invalidate the cache."""
+        if self._callback_ids:
+            return
+        for message in [
+            OpenMaya.MSceneMessage.kAfterNew,
+            OpenMaya.MSceneMessage.kAfterOpen,
+            OpenMaya.MSceneMessage.kAfterImport,
+            OpenMaya.MSceneMessage.kAfterCreateReference,
+            OpenMaya.MSceneMessage.kAfterRemoveReference,
+        ]:
+            self._callback_ids.append(
+                OpenMaya.MSceneMessage.addCallback(message, self.invalidate)
+            )
+        self._callback_ids += [
+            OpenMaya.MDGMessage.addNodeAddedCallback(self.invalidate, "geometryFilter"),
+            OpenMaya.MDGMessage.addNodeRemovedCallback(
+                self.invalidate, "geometryFilter"
+            ),
+            OpenMaya.MDagMessage.addAllDagChangesCallback(self.invalidate),
+            OpenMaya.MNodeMessage.addNameChangedCallback(
+                OpenMaya.MObject.kNullObj, self._on_name_changed
+            ),
+        ]
+
+    def uninstall(self):
+        """Remove the callbacks and clear the cache."""
+        if self._callback_ids:
+            OpenMaya.MMessage.removeCallbacks(self._callback_ids)
+        self._callback_ids = []
+        self._remove_node_callbacks()
+        self.invalidate()
+
+    def _remove_node_callbacks(self):
+        if self._node_callback_ids:
+            OpenMaya.MMessage.removeCallbacks(self._node_callback_ids)
+        self._node_callback_ids = []
+
+    def invalidate(self, *args):
+        """Clear the cached data so the next lookup walks the scene again."""
+        self._shape_deformers = None
+        self._sorted_shapes = set()
+
+    def _on_attribute_changed(self, message, plug, other_plug, *args):
+        if message & (
+            OpenMaya.MNodeMessage.kConnectionMade
+            | OpenMaya.MNodeMessage.kConnectionBroken
+        ):
+            self.invalidate()
+
+    def _on_name_changed(self, node, previous_name, *args):
+        if node.hasFn(OpenMaya.MFn.kDagNode) or node.hasFn(
+            OpenMaya.MFn.kGeometryFilt
+        ):
+            self.invalidate()
+
+    def build(self):
+        """Walk every deformer in the scene and store the shapes they deform."""
+        self.install()
+        # The callbacks of the previous build cannot be removed while they run so they
+        # are replaced here
+        self._remove_node_callbacks()
+        shape_deformers = {}
+        it = OpenMaya.MItDependencyNodes(OpenMaya.MFn.kGeometryFilt)
+        while not it.isDone():
+            node = it.thisNode()
+            self._node_callback_ids.append(
+                OpenMaya.MNodeMessage.addAttributeChangedCallback(
+                    node, self._on_attribute_changed
+                )
+            )
+            fn_node = OpenMaya.MFnDependencyNode(node)
+            deformer = (fn_node.name(), fn_node.typeName)
+            outputs = OpenMayaAnim.MFnGeometryFilter(node).getOutputGeometry()
+            for i in range(len(outputs)):
+                shape = OpenMaya.MDagPath.getAPathTo(outputs[i]).fullPathName()
+                shape_deformers.setdefault(shape, []).append(deformer)
+            it.next()
+        self._shape_deformers = shape_deformers
+        self._sorted_shapes = set()
+
+    def get_deformers(self, shape, node_type=None):
+        """Get the deformers driving a shape in history order.
+
+        :param shape: Long name of the shape.
+        :param node_type: Optional deformer node type to filter by.
+        :return: List of deformer names.
+        """
+        if self._shape_deformers is None:
+            self.build()
+        deformers = self._shape_deformers.get(shape, [])
+        if len(deformers) > 1 and shape not in self._sorted_shapes:
+            # Only shapes with a stack of deformers need the history order
+            history = cmds.listHistory(shape, pruneDagObjects=True, il=2) or []
+            order = {name: i for i, name in enumerate(history)}
+            deformers.sort(key=lambda x: order.get(x[0], len(order)))
+            self._sorted_shapes.add(shape)
+        return [name for name, typ in deformers if node_type in [None, typ]]
+
+
+def get_cache():
+    """Get the scene deformer cache.
+
+    :return: DeformerCache
+    """
+    global _cache
+    if _cache is None:
+        _cache = DeformerCache()
+    return _cache
+
+
+def uninstall():
+    """Remove the callbacks of the scene deformer cache."""
+    global _cache
+    if _cache is not None:
+        _cache.uninstall()
+    _cache = None
+
+
+def get_deformers(node, node_type=None):
+    """Get the deformers driving a shape or the shape of a transform.
+
+    :param node: Shape or transform name.
+    :param node_type: Optional deformer node type to filter by.
+    :return: List of deformer names in history order.
+    """
+    shapes = _get_shapes([node])
+    if not shapes:
+        return []
+    return get_cache().get_deformers(shapes[0], node_type)
+
+
+def get_deformers_in_hierarchy(nodes, node_type=None):
+    """Get the first deformer of each shape of the given nodes and their descendents.
+
+    :param nodes: Dag node name or list of dag node names.
+    :param node_type: Optional deformer node type to filter by.
+    :return: List of unique deformer names.
+    """
+    if isinstance(nodes, string_types):
+        nodes = [nodes]
+    if not nodes:
+        return []
+    relatives = cmds.listRelatives(nodes, ad=True, fullPath=True) or []
+    cache = get_cache()
+    result = set()
+    for shape in _get_shapes(list(nodes) + relatives):
+        deformers = cache.get_deformers(shape, node_type)
+        if deformers:
+            result.add(deformers[0])
+    return list(result)
+
+
+def _get_shapes(nodes):
+    """Get the long names of the non-intermediate shapes of the given nodes.
+
+    :param nodes: List of shape or transform names.
+    :return: List of shape long names.
+    """
+    shapes = cmds.ls(nodes, long=True, shapes=True, noIntermediate=True) or []
+    transforms = cmds.ls(nodes, long=True, transforms=True) or []
+    if transforms:
+        shapes += (
+            cmds.listRelatives(
+                transforms, shapes=True, fullPath=True, noIntermediate=True
+            )
+            or []
+        )
+    # Preserve order while removing duplicates
+    return list(dict.fromkeys(shapes))
@@ -1,41 +1,64 @@
-"""Efficient mesh processing using numpy"""
+"""Efficient mesh processing using numpy
+
+OBJ files are read and written with numpy so target shapes can be loaded and saved
+without going through the Maya OBJ translator.  Maya is only imported by the methods that
+read from or write to Maya meshes so the rest of the module can be used outside of Maya.
+
+Example Usage
+=============
+
+    import ywta.deform.np_mesh as np_mesh
+
+    target = np_mesh.Mesh.from_obj("/path/to/smile.obj")
+    base = np_mesh.Mesh.from_obj("/path/to/neutral.obj")
+    deltas = target - base
+
+    # Write the points using the topology of an existing obj
+    (base + deltas).to_obj("/path/to/smile_fixed.obj", template="/path/to/neutral.obj")
+
+    data = np_mesh.read_obj("/path/to/neutral.obj", uvs=True, normals=True)
+
+    # Read the points of a directory of targets on multiple processes
+    names, points = np_mesh.read_obj_points(paths)
+"""
 
 import numpy as np
 import os
 import json
-import maya.api.OpenMaya as OpenMaya
-import ywta.shortcuts as shortcuts
+import re
+import tempfile
+
+_VERTEX_LINE = re.compile(r"^v[ \t]+(.*)$", re.MULTILINE)
+_UV_LINE = re.compile(r"^vt[ \t]+(.*)$", re.MULTILINE)
+_NORMAL_LINE = re.compile(r"^vn[ \t]+(.*)$", re.MULTILINE)
+_FACE_LINE = re.compile(r"^f[ \t]+(.*)$", re.MULTILINE)
 
 
 class Mesh(object):
     @classmethod
-    def from_obj(cls, file_path):
-        with open(file_path, "r") as fh:
-            lines = fh.readlines()
-
-        points = []
-        read_vertices = False
-        for line in lines:
-            if line.startswith("v "):
-                read_vertices = True
-                v = line.split()[1:]
-                points.append([float(v[0]), float(v[1]), float(v[2])])
-            elif read_vertices:
-                break
-        points = np.array(points)
+    def from_obj(cls, file_path, faces=False):
+        """Read a mesh from an obj file.
+
+        :param file_path: Path to the obj file.
+        :param faces: True to also read the face topology.
+        :return: Mesh named after the file.
+        """
+        data = read_obj(file_path, faces=faces)
         name = os.path.splitext(os.path.basename(file_path))[0]
-        return Mesh(points, name)
+        return Mesh(
+            data["points"], name, data.get("face_counts"), data.get("face_connects")
+        )
 
     @classmethod
     def from_maya_mesh(cls, mesh):
-
-        points = shortcuts.get_points(mesh)
-        points = np.array([[p.x, p.y, p.z] for p in points])
+        points = get_maya_points([mesh], np.float64)[0]
         return Mesh(points)
 
-    def __init__(self, points, name=None):
+    def __init__(self, points, name=None, face_counts=None, face_connects=None):
         self.points = points
         self.name = name
+        self.face_counts = face_counts
+        self.face_connects = face_connects
 
     def mask_points(self, base, mask):
         points = base.points + ((self.points - base.points).T * mask.values).T
@@ -69,22 +92,537 @@ class Mesh(object):
             name += "Z"
         return Mesh(points, name)
 
-    def to_maya_mesh(self, mesh):
+    def to_obj(self, file_path, template=None):
+        """Write the mesh to an obj file.
+
+        :param file_path: Path to write to.
+        :param template: Optional obj file whose lines other than the vertex positions
+            are copied so uvs, normals and groups are preserved.  The face topology of
+            the mesh is written otherwise.
+        """
+        if template:
+            write_obj_points(file_path, self.points, template)
+        else:
+            write_obj(file_path, self.points, self.face_counts, self.face_connects)
 
-        points = OpenMaya.MPointArray()
-        for p in self.points:
-            points.append(OpenMaya.MPoint(p[0], p[1], p[2]))
-        shortcuts.set_points(mesh, points)
+    def to_maya_mesh(self, mesh):
+        set_maya_points([mesh], self.points[np.newaxis])
 
     def __sub__(self, other):
+        if isinstance(other, SparseDelta):
+            return Mesh(other.apply(self.points, -1.0), self.name)
         points = (self.points - other.points)
         return Mesh(points)
 
     def __add__(self, other):
+        if isinstance(other, SparseDelta):
+            return Mesh(other.apply(self.points), self.name)
         points = (self.points + other.points)
         return Mesh(points)
 
 
+class SparseDelta(object):
+    """Point deltas stored only for the vertices that move.
+
+    Facial targets usually move a small fraction of the vertices, so only the indices
+    of the moving vertices and their float32 deltas are stored.  Arithmetic works on
+    the stored vertices only.
+    """
+
+    @classmethod
+    def from_dense(cls, deltas, threshold=1e-5, name=None):
+        """Create a SparseDelta from a dense (N x 3) delta array.
+
+        :param deltas: (N x 3) point deltas
+        :param threshold: Deltas with no component larger than this value are not
+            stored.
+        :param name: Optional name
+        :return: SparseDelta
+        """
+        deltas = np.asarray(deltas)
+        indices = np.nonzero(np.any(np.abs(deltas) > threshold, axis=1))[0]
+        return SparseDelta(indices, deltas[indices], deltas.shape[0], name)
+
+    @classmethod
+    def from_meshes(cls, target, base, threshold=1e-5):
+        """Create the SparseDelta of a target Mesh from a base Mesh.
+
+        :param target: Target Mesh
+        :param base: Base Mesh
+        :param threshold: Deltas with no component larger than this value are not
+            stored.
+        :return: SparseDelta named after the target.
+        """
+        return cls.from_dense(target.points - base.points, threshold, target.name)
+
+    @classmethod
+    def from_component_list(cls, components, points, vertex_count, name=None):
+        """Create a SparseDelta from the blendShape inputTarget layout.
+
+        :param components: List of component strings such as "vtx[0:4]" as stored in
+            inputComponentsTarget.
+        :param points: Deltas of each component vertex as stored in inputPointsTarget.
+        :param vertex_count: Number of vertices of the mesh.
+        :param name: Optional name
+        :return: SparseDelta
+        """
+        indices = []
+        for component in components:
+            elements = component[component.index("[") + 1 : -1].split(":")
+            start = int(elements[0])
+            stop = int(elements[-1]) + 1
+            indices.append(np.arange(start, stop))
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+        points = np.asarray(points).reshape(-1, len(points[0]) if len(points) else 3)
+        return SparseDelta(indices, points[:, :3], vertex_count, name)
+
+    def __init__(self, indices, deltas, vertex_count, name=None):
+        """Constructor
+
+        :param indices: Sorted indices of the moving vertices.
+        :param deltas: (len(indices) x 3) deltas of the moving vertices.
+        :param vertex_count: Number of vertices of the mesh.
+        :param name: Optional name
+        """
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.deltas = np.asarray(deltas, dtype=np.float32).reshape(-1, 3)
+        self.vertex_count = vertex_count
+        self.name = name
+        if self.indices.shape[0] != self.deltas.shape[0]:
+            raise RuntimeError("Delta indices and values must be the same length")
+
+    def __len__(self):
+        return self.indices.shape[0]
+
+    def __repr__(self):
+        return "SparseDelta({}, {} of {} vertices)".format(
+            self.name, len(self), self.vertex_count
+        )
+
+    def to_dense(self, dtype=np.float64):
+        """Get the deltas of every vertex.
+
+        :param dtype: Type of the returned array.
+        :return: (vertex_count x 3) numpy array
+        """
+        deltas = np.zeros((self.vertex_count, 3), dtype=dtype)
+        deltas[self.indices] = self.deltas
+        return deltas
+
+    def to_component_list(self):
+        """Get the deltas in the blendShape inputTarget layout.
+
+        Consecutive vertices are merged into ranges the same way Maya stores
+        inputComponentsTarget.
+
+        :return: Tuple of the list of component strings such as "vtx[0:4]" and the
+            (len(self) x 4) points stored in inputPointsTarget.
+        """
+        if not len(self):
+            return [], np.zeros((0, 4))
+        breaks = np.nonzero(np.diff(self.indices) != 1)[0] + 1
+        starts = self.indices[np.concatenate([[0], breaks])]
+        stops = self.indices[np.concatenate([breaks - 1, [len(self) - 1]])]
+        components = [
+            "vtx[{}]".format(start) if start == stop else "vtx[{}:{}]".format(start, stop)
+            for start, stop in zip(starts, stops)
+        ]
+        points = np.ones((len(self), 4))
+        points[:, :3] = self.deltas
+        return components, points
+
+    def apply(self, points, scale=1.0):
+        """Add the deltas to the points of a mesh.
+
+        :param points: (vertex_count x 3) points
+        :param scale: Multiplier of the deltas.
+        :return: New (vertex_count x 3) points
+        """
+        points = np.array(points, dtype=np.float64)
+        points[self.indices] += self.deltas * scale
+        return points
+
+    def mask(self, mask):
+        """Multiply the deltas by a Mask.
+
+        :param mask: Mask with a value per vertex.
+        :return: SparseDelta
+        """
+        deltas = self.deltas * mask.values[self.indices, np.newaxis]
+        name = "{}_{}".format(self.name, mask.name)
+        return SparseDelta(self.indices, deltas, self.vertex_count, name)
+
+    def separate_axis(
+        self,
+        x_axis=1.0,
+        y_axis=1.0,
+        z_axis=1.0,
+        x_direction=0,
+        y_direction=0,
+        z_direction=0,
+    ):
+        """Get the deltas of only some axes and directions.
+
+        Same as Mesh.separate_axis without the need for a base mesh.
+
+        :return: SparseDelta
+        """
+        deltas = self.deltas * np.array([x_axis, y_axis, z_axis], dtype=np.float32)
+        isolate_vector_direction(deltas, x_direction, 0)
+        isolate_vector_direction(deltas, y_direction, 1)
+        isolate_vector_direction(deltas, z_direction, 2)
+        name = "{}_".format(self.name)
+        if x_axis != 0.0:
+            name += "X"
+        if y_axis != 0.0:
+            name += "Y"
+        if z_axis != 0.0:
+            name += "Z"
+        return SparseDelta(self.indices, deltas, self.vertex_count, name).prune(0.0)
+
+    def prune(self, threshold=1e-5):
+        """Remove the vertices whose deltas have no component larger than threshold.
+
+        :param threshold: Minimum delta
+        :return: SparseDelta
+        """
+        keep = np.any(np.abs(self.deltas) > threshold, axis=1)
+        return SparseDelta(
+            self.indices[keep], self.deltas[keep], self.vertex_count, self.name
+        )
+
+    def __neg__(self):
+        return SparseDelta(self.indices, -self.deltas, self.vertex_count, self.name)
+
+    def __add__(self, other):
+        if isinstance(other, Mesh):
+            return other + self
+        if self.vertex_count != other.vertex_count:
+            raise RuntimeError(
+                "Unable to add deltas of {} and {} vertices".format(
+                    self.vertex_count, other.vertex_count
+                )
+            )
+        indices = np.union1d(self.indices, other.indices)
+        deltas = np.zeros((indices.shape[0], 3), dtype=np.float32)
+        deltas[np.searchsorted(indices, self.indices)] += self.deltas
+        deltas[np.searchsorted(indices, other.indices)] += other.deltas
+        return SparseDelta(indices, deltas, self.vertex_count, self.name)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __mul__(self, other):
+        if isinstance(other, Mask):
+            return self.mask(other)
+        return SparseDelta(
+            self.indices, self.deltas * other, self.vertex_count, self.name
+        )
+
+    __rmul__ = __mul__
+
+
+def propagate_delta(points, delta, mask=None):
+    """Add a delta to a stack of target points in place.
+
+    :param points: (targets x N x 3) points of the targets.
+    :param delta: SparseDelta or dense (N x 3) delta added to every target.
+    :param mask: Optional Mask or array of per vertex falloff weights applied to the
+        delta.
+    :return: points
+    """
+    if not isinstance(delta, SparseDelta):
+        delta = SparseDelta.from_dense(delta, 0.0)
+    if mask is not None:
+        if not isinstance(mask, Mask):
+            mask = Mask(np.asarray(mask))
+        delta = delta.mask(mask)
+    # One broadcast add over every target touching only the moving vertices
+    points[:, delta.indices] += delta.deltas.astype(points.dtype)
+    return points
+
+
+def get_maya_points(meshes, dtype=np.float32):
+    """Read the object space points of many meshes into a single array.
+
+    Points are read through ywta.utility.mayaarrays without creating a Python object
+    per vertex.
+
+    :param meshes: List of mesh names with the same vertex count.
+    :param dtype: Type of the returned array.
+    :return: (meshes x N x 3) numpy array
+    """
+    import ywta.utility.mayaarrays as mayaarrays
+
+    points = None
+    for i, mesh in enumerate(meshes):
+        mesh_points = mayaarrays.get_points(mesh, dtype=dtype)
+        if points is None:
+            points = np.empty((len(meshes),) + mesh_points.shape, dtype=dtype)
+        elif mesh_points.shape != points.shape[1:]:
+            raise RuntimeError(
+                "{} has {} vertices, expected {}".format(
+                    mesh, mesh_points.shape[0], points.shape[1]
+                )
+            )
+        points[i] = mesh_points
+    if points is None:
+        points = np.zeros((0, 0, 3), dtype=dtype)
+    return points
+
+
+def set_maya_points(meshes, points):
+    """Set the object space points of many meshes.
+
+    :param meshes: List of mesh names.
+    :param points: (meshes x N x 3) points.
+    """
+    import ywta.utility.mayaarrays as mayaarrays
+
+    for mesh, mesh_points in zip(meshes, points):
+        mayaarrays.set_points(mesh, mesh_points)
+
+
+def benchmark_propagate(target_count=300, vertex_count=50000, moved=0.1):
+    """Compare the per target neutral propagation loop with propagate_delta.
+
+    :param target_count: Number of targets.
+    :param vertex_count: Number of vertices per target.
+    :param moved: Fraction of the vertices moved by the neutral update.
+    """
+    from ywta.utility.timing import Section
+
+    rng = np.random.default_rng(0)
+    points = rng.random((target_count, vertex_count, 3)).astype(np.float32)
+    old = Mesh(rng.random((vertex_count, 3)))
+    new = Mesh(old.points.copy())
+    count = int(vertex_count * moved)
+    new.points[rng.choice(vertex_count, count, replace=False)] += 0.1
+    mask = Mask(rng.random(vertex_count))
+
+    workspace = "propagate {} targets x {} vertices".format(
+        target_count, vertex_count
+    )
+    with Section(workspace, "per target loop"):
+        delta = Mesh((new - old).points * mask.values[:, np.newaxis])
+        looped = [(Mesh(p.astype(np.float64)) + delta).points for p in points]
+    with Section(workspace, "batched"):
+        delta = SparseDelta.from_meshes(new, old)
+        propagate_delta(points, delta, mask)
+    if not np.allclose(np.stack(looped), points, atol=1e-5):
+        raise RuntimeError("Batched propagation does not match the per target loop")
+    Section.print_timing()
+
+
+def read_obj(file_path, faces=True, uvs=False, normals=False):
+    """Read an obj file with bulk numeric conversion.
+
+    Only the data of a single polygon mesh is read. Groups, materials and smoothing
+    groups are ignored.
+
+    :param file_path: Path to the obj file.
+    :param faces: True to read the face topology.
+    :param uvs: True to read the uvs and the uv index of each face vertex.
+    :param normals: True to read the normals and the normal index of each face vertex.
+    :return: Dictionary with "points" and depending on the arguments "face_counts",
+        "face_connects", "uvs", "uv_connects", "normals" and "normal_connects".
+        Connects are 0-based indices.
+    """
+    with open(file_path, "r") as fh:
+        text = fh.read()
+
+    data = {"points": _parse_vectors(_VERTEX_LINE.findall(text), 3)}
+    if uvs:
+        data["uvs"] = _parse_vectors(_UV_LINE.findall(text), 2)
+    if normals:
+        data["normals"] = _parse_vectors(_NORMAL_LINE.findall(text), 3)
+    if not (faces or uvs or normals):
+        return data
+
+    lines = _FACE_LINE.findall(text)
+    face_counts = np.array([len(line.split()) for line in lines], dtype=np.int32)
+    first = lines[0].split()[0] if lines else ""
+    # Each face vertex is v, v/vt, v//vn or v/vt/vn
+    fields = first.count("/") + 1
+    joined = " ".join(lines).replace("//", "/0/").replace("/", " ")
+    indices = np.array(joined.split(), dtype=np.int64).reshape(-1, fields)
+    counts = [
+        data["points"].shape[0],
+        len(data.get("uvs", [])),
+        len(data.get("normals", [])),
+    ]
+    for column in range(fields):
+        values = indices[:, column]
+        # Negative indices are relative to the end of the element list
+        indices[:, column] = np.where(values < 0, values + counts[column], values - 1)
+    if faces:
+        data["face_counts"] = face_counts
+        data["face_connects"] = indices[:, 0].astype(np.int32)
+    if uvs and fields > 1:
+        data["uv_connects"] = indices[:, 1].astype(np.int32)
+    if normals and fields > 2:
+        data["normal_connects"] = indices[:, 2].astype(np.int32)
+    return data
+
+
+def write_obj(
+    file_path,
+    points,
+    face_counts=None,
+    face_connects=None,
+    uvs=None,
+    uv_connects=None,
+):
+    """Write a polygon mesh to an obj file.
+
+    :param file_path: Path to write to.
+    :param points: (N x 3) vertex positions.
+    :param face_counts: Optional number of vertices of each face.
+    :param face_connects: Optional flat 0-based vertex indices of each face.
+    :param uvs: Optional (U x 2) uvs.
+    :param uv_connects: Optional flat 0-based uv indices of each face vertex.
+    """
+    chunks = [_format_vectors("v", points)]
+    if uvs is not None:
+        chunks.append(_format_vectors("vt", uvs))
+    if face_counts is not None and face_connects is not None:
+        face_counts = np.asarray(face_counts, dtype=np.int64)
+        values = np.asarray(face_connects, dtype=np.int64)[:, np.newaxis] + 1
+        vertex = " %d"
+        if uvs is not None and uv_connects is not None:
+            uv_values = np.asarray(uv_connects, dtype=np.int64)[:, np.newaxis] + 1
+            values = np.hstack([values, uv_values])
+            vertex = " %d/%d"
+        # Build one format string for all faces so the values are formatted in bulk
+        line_formats = {
+            count: "f{}\n".format(vertex * count) for count in np.unique(face_counts)
+        }
+        face_format = "".join([line_formats[count] for count in face_counts])
+        chunks.append(face_format % tuple(values.ravel().tolist()))
+    with open(file_path, "w") as fh:
+        fh.write("".join(chunks))
+
+
+def write_obj_points(file_path, points, template):
+    """Write new vertex positions into a copy of an existing obj file.
+
+    :param file_path: Path to write to.
+    :param points: (N x 3) vertex positions.
+    :param template: Path to the obj file providing every line other than the vertex
+        positions.
+    """
+    with open(template, "r") as fh:
+        text = fh.read()
+    lines = iter(_format_vectors("v", points).splitlines())
+    try:
+        text = _VERTEX_LINE.sub(lambda match: next(lines), text)
+    except StopIteration:
+        raise RuntimeError(
+            "{} has more vertices than the {} points given".format(
+                template, len(points)
+            )
+        )
+    if next(lines, None) is not None:
+        raise RuntimeError(
+            "{} has less vertices than the {} points given".format(
+                template, len(points)
+            )
+        )
+    with open(file_path, "w") as fh:
+        fh.write(text)
+
+
+def read_obj_points(file_paths, max_workers=None, dtype=np.float64, directory=None):
+    """Read the points of many objs with the same vertex count.
+
+    The files are parsed on a process pool.  Each worker writes its points straight
+    into a shared memory-mapped (files x vertices x 3) array so points are never
+    pickled back to the calling process.  The points are copied into memory and the
+    memory-mapped file is deleted before returning.
+
+    :param file_paths: List of obj file paths.
+    :param max_workers: Maximum number of worker processes.  1 reads the files in the
+        calling process.
+    :param dtype: Type of the returned points.
+    :param directory: Optional directory of the memory-mapped file.  The temp directory
+        is used by default.
+    :return: Tuple of the list of mesh names and the (files x vertices x 3) points
+        numpy array.
+    """
+    from ywta.utility.parallel import process_pool
+
+    names = [os.path.splitext(os.path.basename(path))[0] for path in file_paths]
+    if not file_paths:
+        return names, np.zeros((0, 0, 3), dtype=dtype)
+    first = read_obj(file_paths[0], faces=False)["points"]
+    shape = (len(file_paths),) + first.shape
+    handle, memmap_path = tempfile.mkstemp(suffix=".points", dir=directory)
+    os.close(handle)
+    try:
+        shared = np.memmap(memmap_path, dtype=dtype, mode="w+", shape=shape)
+        shared[0] = first
+        shared.flush()
+
+        jobs = [
+            (path, memmap_path, i, shape, np.dtype(dtype).str)
+            for i, path in enumerate(file_paths)
+        ][1:]
+        if max_workers == 1 or len(jobs) < 2:
+            for job in jobs:
+                _read_obj_points_into(*job)
+        else:
+            with process_pool(max_workers) as executor:
+                # Consume the results so worker errors are raised here
+                list(executor.map(_read_obj_points_into, *zip(*jobs)))
+        points = np.array(shared)
+        # Close the mapping so the file can be deleted on Windows
+        del shared
+    finally:
+        os.remove(memmap_path)
+    return names, points
+
+
+def _read_obj_points_into(file_path, memmap_path, index, shape, dtype):
+    """Process pool worker of read_obj_points."""
+    points = read_obj(file_path, faces=False)["points"]
+    if points.shape != shape[1:]:
+        raise RuntimeError(
+            "{} has {} vertices, expected {}".format(
+                file_path, points.shape[0], shape[1]
+            )
+        )
+    output = np.memmap(memmap_path, dtype=dtype, mode="r+", shape=shape)
+    output[index] = points
+    output.flush()
+    return index
+
+
+def _parse_vectors(lines, size):
+    """Convert the value strings of obj lines into a 2D float array.
+
+    :param lines: List of the text after the line prefix.
+    :param size: Number of values kept per line.  Extra values such as vertex colors
+        are ignored.
+    :return: (len(lines) x size) numpy array
+    """
+    if not lines:
+        return np.zeros((0, size))
+    columns = len(lines[0].split())
+    values = np.array(" ".join(lines).split(), dtype=np.float64)
+    if values.shape[0] != columns * len(lines):
+        # Lines with different value counts need to be converted one by one
+        return np.array([line.split()[:size] for line in lines], dtype=np.float64)
+    return values.reshape(-1, columns)[:, :size]
+
+
+def _format_vectors(prefix, vectors):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if not vectors.size:
+        return ""
+    line = "{} {}\n".format(prefix, " ".join(["%.6f"] * vectors.shape[1]))
+    return (line * vectors.shape[0]) % tuple(vectors.ravel())
+
+
 def isolate_vector_direction(deltas, direction, axis):
     if direction < 0:
         deltas[:, :][deltas[:, axis] > 0] = 0
@@ -119,8 +657,7 @@ class Mask(object):
 
     def __mul__(self, other):
         if not isinstance(other, Mask):
-            raise RuntimeError(
-                "Unable to multiply Mask with type {}".format(type(other))
-            )
+            # Let the other operand such as SparseDelta handle the multiplication
+            return NotImplemented
         name = "{}_{}".format(self.name, other.name)
         return Mask(self.values * other.values, name)
@@ -148,12 +148,12 @@ class ShapesWindow(MayaQWidgetBaseMixin, QMainWindow):
 
         sel = cmds.ls(sl=True)
         blendshape = bs.get_blendshape_node(sel[0]) if sel else None
-        meshes = [import_obj(path) for path in paths]
         if blendshape and add_as_targets:
-            for mesh in meshes:
-                bs.add_target(blendshape, mesh)
-                cmds.delete(mesh)
-        elif meshes:
+            # Read the objs in parallel and write the deltas without creating meshes
+            bs.add_obj_targets(blendshape, paths)
+            return []
+        meshes = [import_obj(path) for path in paths]
+        if meshes:
             cmds.select(meshes)
         return meshes
 
@@ -0,0 +1,351 @@
+"""Maya-free reader and writer for .skin files.
+
+Two layouts can be read:
+
+* Version 1: The legacy JSON dictionary written by older versions of skinio with a
+  Python list per influence.
+* Version 2: A binary container with a small JSON header describing the influences and
+  skinCluster attributes followed by raw little-endian array blocks.
+
+Version 2 files are always written by default.  The file layout is::
+
+    MAGIC          8 bytes  b"YWTASKIN"
+    version        uint32
+    header size    uint32
+    header         utf-8 JSON, padded with spaces to ALIGNMENT
+    array blocks   raw arrays, each starting on an ALIGNMENT boundary
+
+The header stores the dtype, shape and absolute byte offset of each array so blocks can
+be read with numpy.fromfile or memory-mapped without parsing the rest of the file.
+
+Files can optionally store the world space points and triangles of the exported mesh so
+the weights can be transferred when importing onto a mesh with a different topology.
+
+Weights are either stored ``dense`` as a single (vertices x influences) matrix or
+``sparse`` as the indptr, indices and values arrays of
+ywta.deform.skinweights.SparseWeights.  Weights are always read back as SparseWeights.
+
+Example Usage
+=============
+
+    import ywta.deform.skinformat as skinformat
+
+    data = skinformat.read("/path/to/body.skin")
+    skinformat.write("/path/to/body_copy.skin", data)
+
+    skinformat.benchmark(vertex_count=200000, influence_count=150)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+from ywta.deform.skinweights import SparseWeights
+
+MAGIC = b"YWTASKIN"
+VERSION = 2
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+DENSE = "dense"
+SPARSE = "sparse"
+
+# Keys of the data dictionary that are not skinCluster attributes
+_RESERVED_KEYS = ["weights", "blendWeights", "name", "shape", "points", "triangles"]
+
+
+def is_binary(file_path):
+    """Get whether the given file is a binary .skin file.
+
+    :param file_path: Path to a .skin file
+    :return: True if the file uses the binary container.
+    """
+    with open(file_path, "rb") as fh:
+        return fh.read(len(MAGIC)) == MAGIC
+
+
+def read(file_path, mmap=False):
+    """Read a .skin file of any supported version.
+
+    :param file_path: Path to a .skin file
+    :param mmap: True to memory-map the uncompressed array blocks of binary files
+        instead of reading them.  Sparse weights then only load the vertex ranges
+        that are accessed which keeps peak memory low when applying weights in
+        chunks.  Dense weights are converted to sparse one block of rows at a time.
+    :return: The skin data dictionary in the same form returned by
+        SkinCluster.gather_data.
+    """
+    if not is_binary(file_path):
+        with open(file_path, "r") as fh:
+            data = json.load(fh)
+        data["blendWeights"] = np.asarray(data["blendWeights"], dtype=np.float64)
+        data["weights"] = SparseWeights.from_dict(
+            data["weights"], data["blendWeights"].shape[0]
+        )
+        for key in ["points", "triangles"]:
+            if key in data:
+                data[key] = np.asarray(data[key])
+        return data
+
+    header = read_header(file_path)
+    arrays = {
+        name: _read_array(file_path, info, mmap)
+        for name, info in header["arrays"].items()
+    }
+    data = dict(header["attributes"])
+    data["name"] = header["name"]
+    data["shape"] = header["shape"]
+    blend_weights = arrays["blendWeights"]
+    data["blendWeights"] = (
+        blend_weights if mmap else blend_weights.astype(np.float64)
+    )
+
+    influences = header["influences"]
+    # Optional source geometry used to transfer weights onto different topology
+    for key in ["points", "triangles"]:
+        if key in arrays:
+            data[key] = arrays[key]
+
+    if header["layout"] == DENSE:
+        data["weights"] = SparseWeights.from_dense(arrays["weights"], influences)
+    else:
+        data["weights"] = SparseWeights(
+            influences, arrays["indptr"], arrays["indices"], arrays["values"]
+        )
+    return data
+
+
+def read_header(file_path):
+    """Read the JSON header of a binary .skin file.
+
+    :param file_path: Path to a binary .skin file
+    :return: The header dictionary.
+    """
+    with open(file_path, "rb") as fh:
+        magic, version, size = _PREAMBLE.unpack(fh.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise RuntimeError("{} is not a binary skin file".format(file_path))
+        if version > VERSION:
+            raise RuntimeError(
+                "{} was written with skin format version {}. Only versions up to {} "
+                "are supported.".format(file_path, version, VERSION)
+            )
+        return json.loads(fh.read(size).decode("utf-8"))
+
+
+def write(file_path, data, layout=SPARSE, dtype=np.float32, compress=False):
+    """Write skin data to a binary .skin file.
+
+    :param file_path: Path to write to
+    :param data: Skin data dictionary as returned by SkinCluster.gather_data.
+    :param layout: DENSE or SPARSE weight storage.
+    :param dtype: Float type used to store the weight values.
+    :param compress: True to zlib compress the array blocks.  Compressed blocks cannot
+        be memory-mapped.
+    """
+    if layout not in [DENSE, SPARSE]:
+        raise RuntimeError("Invalid skin layout {}".format(layout))
+    blend_weights = np.asarray(data["blendWeights"], dtype=dtype)
+    weights = _get_sparse_weights(data)
+
+    arrays = [("blendWeights", blend_weights)]
+    if layout == DENSE:
+        arrays.append(("weights", weights.to_dense(dtype)))
+    else:
+        arrays += [
+            ("indptr", weights.indptr),
+            ("indices", weights.indices),
+            ("values", weights.values.astype(dtype)),
+        ]
+    if data.get("points") is not None:
+        arrays.append(("points", np.asarray(data["points"], dtype=np.float64)))
+    if data.get("triangles") is not None:
+        arrays.append(("triangles", np.asarray(data["triangles"], dtype=np.int32)))
+
+    header = {
+        "version": VERSION,
+        "name": data["name"],
+        "shape": data["shape"],
+        "influences": weights.influences,
+        "vertexCount": weights.vertex_count,
+        "layout": layout,
+        "attributes": _get_attributes(data),
+    }
+    _write_container(file_path, header, arrays, compress)
+
+
+def write_json(file_path, data):
+    """Write skin data to a legacy JSON .skin file.
+
+    :param file_path: Path to write to
+    :param data: Skin data dictionary as returned by SkinCluster.gather_data.
+    """
+    json_data = _get_attributes(data)
+    json_data["name"] = data["name"]
+    json_data["shape"] = data["shape"]
+    json_data["weights"] = _get_sparse_weights(data).to_dict()
+    json_data["blendWeights"] = np.asarray(data["blendWeights"]).tolist()
+    for key in ["points", "triangles"]:
+        if data.get(key) is not None:
+            json_data[key] = np.asarray(data[key]).tolist()
+    with open(file_path, "w") as fh:
+        json.dump(json_data, fh)
+
+
+def _get_sparse_weights(data):
+    weights = data["weights"]
+    if isinstance(weights, SparseWeights):
+        return weights
+    return SparseWeights.from_dict(weights, len(data["blendWeights"]))
+
+
+def _get_attributes(data):
+    return {
+        key: _to_json_value(value)
+        for key, value in data.items()
+        if key not in _RESERVED_KEYS
+    }
+
+
+def _write_container(file_path, header, arrays, compress=False):
+    """Write the header and array blocks to disk.
+
+    The header size depends on the array offsets which in turn depend on the header
+    size, so offsets are computed against a header padded up to the next ALIGNMENT
+    boundary until the size is stable.
+    """
+    blocks = []
+    for name, array in arrays:
+        dtype = np.asarray(array).dtype.newbyteorder("<")
+        array = np.ascontiguousarray(array, dtype=dtype)
+        info = {"dtype": dtype.str, "shape": list(array.shape)}
+        block = array.tobytes()
+        if compress:
+            block = zlib.compress(block, 1)
+            info["compression"] = "zlib"
+        info["size"] = len(block)
+        blocks.append((name, info, block))
+
+    header["arrays"] = {}
+    header_size = 0
+    while True:
+        offset = _align(_PREAMBLE.size + header_size)
+        for name, info, block in blocks:
+            info["offset"] = offset
+            header["arrays"][name] = info
+            offset = _align(offset + len(block))
+        encoded = json.dumps(header).encode("utf-8")
+        if len(encoded) <= header_size:
+            break
+        header_size = _align(len(encoded) + _PREAMBLE.size) - _PREAMBLE.size
+
+    encoded += b" " * (header_size - len(encoded))
+    with open(file_path, "wb") as fh:
+        fh.write(_PREAMBLE.pack(MAGIC, VERSION, header_size))
+        fh.write(encoded)
+        for name, info, block in blocks:
+            fh.write(b"\0" * (info["offset"] - fh.tell()))
+            fh.write(block)
+
+
+def _read_array(file_path, info, mmap=False):
+    dtype = np.dtype(info["dtype"])
+    count = int(np.prod(info["shape"], dtype=np.int64))
+    if mmap and "compression" not in info and count:
+        return np.memmap(
+            file_path,
+            dtype=dtype,
+            mode="r",
+            offset=info["offset"],
+            shape=tuple(info["shape"]),
+        )
+    with open(file_path, "rb") as fh:
+        fh.seek(info["offset"])
+        if info.get("compression") == "zlib":
+            block = zlib.decompress(fh.read(info["size"]))
+            array = np.frombuffer(block, dtype=dtype, count=count)
+        else:
+            array = np.fromfile(fh, dtype=dtype, count=count)
+    return array.reshape(info["shape"])
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _to_json_value(value):
+    """Convert numpy scalars read back from binary files into native Python types."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def benchmark(vertex_count=200000, influence_count=150, max_influences=4, directory=None):
+    """Compare JSON and binary .skin export and import times on synthetic data.
+
+    :param vertex_count: Number of vertices of the synthetic mesh.
+    :param influence_count: Number of influences of the synthetic skinCluster.
+    :param max_influences: Number of non-zero weights per vertex.
+    :param directory: Optional directory to write the files to.  A temporary directory
+        is used by default.
+    :return: Dictionary of {format: file size in bytes}
+    """
+    from ywta.utility.timing import Section
+
+    data = _synthetic_data(vertex_count, influence_count, max_influences)
+    directory = directory or tempfile.mkdtemp()
+    workspace = "skinformat {}x{}".format(vertex_count, influence_count)
+    sizes = {}
+
+    json_path = os.path.join(directory, "benchmark_json.skin")
+    with Section(workspace, "json write"):
+        write_json(json_path, data)
+    with Section(workspace, "json read"):
+        read(json_path)
+    sizes["json"] = os.path.getsize(json_path)
+
+    for layout in [DENSE, SPARSE]:
+        path = os.path.join(directory, "benchmark_{}.skin".format(layout))
+        with Section(workspace, "{} write".format(layout)):
+            write(path, data, layout=layout)
+        with Section(workspace, "{} read".format(layout)):
+            read(path)
+        sizes[layout] = os.path.getsize(path)
+
+    Section.print_timing()
+    for label, size in sizes.items():
+        print("  {} file size: {:.2f} MB".format(label, size / (1024.0 * 1024.0)))
+    return sizes
+
+
+def _synthetic_data(vertex_count, influence_count, max_influences):
+    """Create a skin data dictionary with max_influences random weights per vertex."""
+    rng = np.random.default_rng(0)
+    # Consecutive influences from a random start keep the indices of a row unique
+    indices = rng.integers(0, influence_count, (vertex_count, 1))
+    indices = (indices + np.arange(max_influences)) % influence_count
+    values = rng.random((vertex_count, max_influences))
+    values /= values.sum(axis=1)[:, np.newaxis]
+    indptr = np.arange(vertex_count + 1) * max_influences
+    influences = ["joint{}".format(i) for i in range(influence_count)]
+    data = {
+        "weights": SparseWeights(
+            influences, indptr, indices.ravel(), values.ravel()
+        ),
+        "blendWeights": np.zeros(vertex_count),
+        "name": "skinCluster1",
+        "shape": "body",
+        "skinningMethod": 0,
+        "normalizeWeights": 1,
+        "maintainMaxInfluences": True,
+        "maxInfluences": max_influences,
+    }
+    return data
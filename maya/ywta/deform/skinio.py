@@ -9,19 +9,29 @@ Usage:
 
     # To import
     skinio.import_skin(file_path='/path/to/data.skin')
+
+    # To export and import every skinned shape of a hierarchy
+    skinio.export_skins(directory='/path/to/skins', shapes=['character'])
+    skinio.import_skins(directory='/path/to/skins')
+
+Skins are exported in the binary format defined in ywta.deform.skinformat.  Pass
+binary=False to export_skin to write the legacy JSON format.  Both formats can be
+imported.
 """
 
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import json
 import logging
 import os
 import re
-from six import string_types
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import partial
 
+import numpy as np
+
 from PySide2.QtCore import *
 from PySide2.QtGui import *
 from PySide2.QtWidgets import *
@@ -32,6 +42,12 @@ import maya.api.OpenMaya as OpenMaya
 import maya.api.OpenMayaAnim as OpenMayaAnim
 
 import ywta.shortcuts as shortcuts
+import ywta.utility.mayaarrays as mayaarrays
+import ywta.deform.historycache as historycache
+import ywta.deform.skinformat as skinformat
+import ywta.deform.weight_processing as weight_processing
+import ywta.deform.weight_transfer as weight_transfer
+from ywta.deform.skinweights import SparseWeights
 
 logger = logging.getLogger(__name__)
 EXTENSION = ".skin"
@@ -41,10 +57,25 @@ KEY_STORE = "skinio.start_directory"
 
 
 def import_skin(
-    file_path=None, shape=None, to_selected_shapes=False, enable_remap=True
+    file_path=None,
+    shape=None,
+    to_selected_shapes=False,
+    enable_remap=True,
+    chunk_size=None,
+    pipeline=None,
 ):
     """Creates a skinCluster on the specified shape if one does not already exist
     and then import the weight data.
+
+    :param file_path: Path to the .skin file.
+    :param shape: Optional shape to import onto.  The shape stored in the file is used
+        by default.
+    :param to_selected_shapes: True to import onto the selected shape or components.
+    :param enable_remap: True to ask the user to remap influences that do not exist.
+    :param chunk_size: Optional number of vertices to apply at a time.  Binary files
+        are memory-mapped and streamed in vertex blocks to keep peak memory bounded.
+    :param pipeline: Optional weight_processing.Pipeline run on the imported weights
+        before they are set.
     """
 
     if file_path is None:
@@ -55,12 +86,7 @@ def import_skin(
         return
 
     # Read in the file
-    with open(file_path, "r") as fh:
-        data = json.load(fh)
-
-    # Some cases the skinningMethod may have been set to -1
-    if data.get("skinningMethod", 0) < 0:
-        data["skinningMethod"] = 0
+    data = skinformat.read(file_path, mmap=bool(chunk_size))
 
     selected_components = []
     if to_selected_shapes:
@@ -71,21 +97,67 @@ def import_skin(
                 int(re.search("(?<=\[)\d+", x).group(0)) for x in components
             ]
             shape = shape[0].split(".")[0]
+    set_skin_data(
+        data,
+        file_path,
+        shape,
+        selected_components,
+        enable_remap,
+        chunk_size,
+        pipeline,
+    )
+
+
+def set_skin_data(
+    data,
+    file_path=None,
+    shape=None,
+    selected_components=None,
+    enable_remap=True,
+    chunk_size=None,
+    pipeline=None,
+):
+    """Creates a skinCluster on the shape if one does not already exist and then sets
+    the weight data read from a .skin file.
+
+    :param data: Skin data dictionary as returned by skinformat.read
+    :param file_path: Path the data was read from.  Used for display only.
+    :param shape: Optional shape to apply the data to.  The shape stored in the data is
+        used by default.
+    :param selected_components: Optional list of vertex indices to set.
+    :param enable_remap: True to ask the user to remap influences that do not exist.
+    :param chunk_size: Optional number of vertices to apply at a time.
+    :param pipeline: Optional weight_processing.Pipeline run on the weights before
+        they are set.
+    :return: The SkinCluster the data was set on or None if the shape does not exist.
+    """
+    # Some cases the skinningMethod may have been set to -1
+    if data.get("skinningMethod", 0) < 0:
+        data["skinningMethod"] = 0
+
     if shape is None:
         shape = data["shape"]
     if not cmds.objExists(shape):
         logging.warning("Cannot import skin, {} does not exist".format(shape))
-        return
+        return None
 
     # Make sure the vertex count is the same
     mesh_vertex_count = cmds.polyEvaluate(shape, vertex=True)
     imported_vertex_count = len(data["blendWeights"])
     if mesh_vertex_count != imported_vertex_count:
-        raise RuntimeError(
-            "Vertex counts do not match. Mesh {} != File {}".format(
-                mesh_vertex_count, imported_vertex_count
+        if data.get("points") is None or data.get("triangles") is None:
+            raise RuntimeError(
+                "Vertex counts do not match. Mesh {} != File {}".format(
+                    mesh_vertex_count, imported_vertex_count
+                )
             )
+        # The file stores its geometry so the weights can be transferred
+        logger.info(
+            "Transferring weights from %d to %d vertices",
+            imported_vertex_count,
+            mesh_vertex_count,
         )
+        transfer_data(data, get_mesh_geometry(shape)[0])
 
     # Check if the shape has a skinCluster
     skins = get_skin_clusters(shape)
@@ -93,7 +165,7 @@ def import_skin(
         skin_cluster = SkinCluster(skins[0])
     else:
         # Create a new skinCluster
-        joints = data["weights"].keys()
+        joints = data["weights"].influences
 
         unused_imports, no_match = get_joints_that_need_remapping(joints)
 
@@ -106,7 +178,7 @@ def import_skin(
 
         # Create the skinCluster with post normalization so setting the weights does not
         # normalize all the weights
-        joints = [x for x in data["weights"].keys() if cmds.objExists(x)]
+        joints = [x for x in data["weights"].influences if cmds.objExists(x)]
         kwargs = {}
         if data["maintainMaxInfluences"]:
             kwargs["obeyMaxInfluences"] = True
@@ -116,29 +188,133 @@ def import_skin(
         )[0]
         skin_cluster = SkinCluster(skin)
 
-    skin_cluster.set_data(data, selected_components)
+    skin_cluster.set_data(data, selected_components, chunk_size, pipeline)
     logging.info("Imported %s", file_path)
+    return skin_cluster
+
+
+def import_skins(directory=None, max_workers=None, progress=None, enable_remap=True):
+    """Import all the .skin files in a directory.
+
+    Files are read and decoded in parallel on a thread pool.  The weights of each file
+    are applied on the main thread as soon as its data is available since the Maya API
+    can only be used from the main thread.
+
+    :param directory: Directory containing .skin files.
+    :param max_workers: Maximum number of reader threads.
+    :param progress: Optional callable called with (completed count, total count,
+        file path) after each file is imported.
+    :param enable_remap: True to ask the user to remap influences that do not exist.
+    :return: Dictionary of {file path: {"read": seconds, "apply": seconds}}
+    """
+    if directory is None:
+        directory = shortcuts.get_directory_name(KEY_STORE)
+    if not directory:
+        return None
+
+    file_paths = [
+        os.path.join(directory, f)
+        for f in sorted(os.listdir(directory))
+        if f.endswith(EXTENSION)
+    ]
+    timings = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_read_skin_file, path): path for path in file_paths}
+        for i, future in enumerate(as_completed(futures)):
+            file_path = futures[future]
+            data, read_time = future.result()
+            start = time.time()
+            set_skin_data(data, file_path, enable_remap=enable_remap)
+            timings[file_path] = {"read": read_time, "apply": time.time() - start}
+            if progress:
+                progress(i + 1, len(futures), file_path)
+    return timings
+
+
+def _read_skin_file(file_path):
+    start = time.time()
+    data = skinformat.read(file_path)
+    return data, time.time() - start
+
+
+def transfer_skin(source, destination, method=weight_transfer.CLOSEST_POINT):
+    """Transfer the skin weights of a mesh onto a mesh with a different topology.
+
+    A skinCluster with the source influences is created on the destination if it does
+    not already have one.
+
+    :param source: Skinned source mesh.
+    :param destination: Destination mesh.
+    :param method: One of the weight_transfer methods.
+    :return: The destination SkinCluster.
+    """
+    skins = get_skin_clusters(source)
+    if not skins:
+        raise RuntimeError("{} has no skinCluster".format(source))
+    data = SkinCluster(skins[0]).gather_data(include_geometry=True)
+    transfer_data(data, get_mesh_geometry(destination)[0], method)
+    data["name"] = "{}_skinCluster".format(destination.split("|")[-1])
+    return set_skin_data(data, shape=destination, enable_remap=False)
+
+
+def transfer_data(data, points, method=weight_transfer.CLOSEST_POINT):
+    """Transfer skin data in place onto new points.
+
+    :param data: Skin data dictionary containing the source points and triangles.
+    :param points: (N x 3) world space destination points.
+    :param method: One of the weight_transfer methods.
+    :return: The skin data dictionary.
+    """
+    if method == weight_transfer.CLOSEST_POINT:
+        matrix = weight_transfer.closest_point_matrix(
+            data["points"], data["triangles"], points
+        )
+    else:
+        matrix = weight_transfer.inverse_distance_matrix(data["points"], points)
+    data["weights"] = weight_transfer.apply_matrix(matrix, data["weights"])
+    data["blendWeights"] = weight_transfer.apply_matrix(
+        matrix, np.asarray(data["blendWeights"])
+    )
+    data["points"] = points
+    data["triangles"] = None
+    return data
+
+
+def get_mesh_geometry(shape):
+    """Get the world space points and triangles of a mesh.
+
+    :param shape: Mesh name.
+    :return: Tuple of (N x 3) points and (T x 3) triangle vertex indices.
+    """
+    fn_mesh = shortcuts.get_mfnmesh(shape)
+    points = mayaarrays.get_points(shape, world=True)
+    triangles = np.array(fn_mesh.getTriangles()[1], dtype=np.int64).reshape(-1, 3)
+    return points, triangles
+
+
+def get_mesh_adjacency(shape):
+    """Get the vertex adjacency matrix of a mesh used to smooth weights.
+
+    :param shape: Mesh name.
+    :return: (N x N) scipy csr_matrix
+    """
+    fn_mesh = shortcuts.get_mfnmesh(shape)
+    face_counts, face_connects = fn_mesh.getVertices()
+    return weight_processing.vertex_adjacency(
+        face_counts, face_connects, fn_mesh.numVertices
+    )
 
 
 def get_skin_clusters(nodes):
     """Get the skinClusters attached to the specified node and all nodes in descendents.
 
+    Lookups go through the scene deformer cache in ywta.deform.historycache so
+    repeated calls do not walk the history of every shape again.
+
     :param nodes: List of dag nodes.
     @return A list of the skinClusters in the hierarchy of the specified root node.
     """
-    if isinstance(nodes, string_types):
-        nodes = [nodes]
-    all_skins = []
-    for node in nodes:
-        relatives = cmds.listRelatives(node, ad=True, path=True) or []
-        relatives.insert(0, node)
-        relatives = [shortcuts.get_shape(node) for node in relatives]
-        for relative in relatives:
-            history = cmds.listHistory(relative, pruneDagObjects=True, il=2) or []
-            skins = [x for x in history if cmds.nodeType(x) == "skinCluster"]
-            if skins:
-                all_skins.append(skins[0])
-    return list(set(all_skins))
+    return historycache.get_deformers_in_hierarchy(nodes, "skinCluster")
 
 
 def get_joints_that_need_remapping(joints_in_file):
@@ -156,19 +332,31 @@ def get_joints_that_need_remapping(joints_in_file):
     return unused_joints_from_file, joints_that_get_no_weights
 
 
-def remap_weights(remapping, weight_dict):
+def remap_weights(remapping, weights):
+    """Rename the influences of imported weights.
+
+    :param remapping: Dictionary of {imported influence: new influence}
+    :param weights: SparseWeights or legacy {influence: weights} dictionary.
+    :return: The remapped weights
+    """
+    if isinstance(weights, SparseWeights):
+        weights.rename_influences(remapping)
+        return weights
     for src, dst in remapping.items():
-        weight_dict[dst] = weight_dict[src]
-        del weight_dict[src]
-    return weight_dict
+        weights[dst] = weights[src]
+        del weights[src]
+    return weights
 
 
-def export_skin(file_path=None, shapes=None):
+def export_skin(file_path=None, shapes=None, binary=True, include_geometry=False):
     """Exports the skinClusters of the given shapes to disk.
 
     :param file_path: Path to export the data.
     :param shapes: Optional list of dag nodes to export skins from.  All descendent nodes will be
         searched for skinClusters also.
+    :param binary: True to write the binary skinformat file, False to write legacy JSON.
+    :param include_geometry: True to store the mesh points and triangles so the
+        weights can be imported onto meshes with a different topology.
     """
     if shapes is None:
         shapes = cmds.ls(sl=True) or []
@@ -188,30 +376,109 @@ def export_skin(file_path=None, shapes=None):
         if not file_path:
             return
 
-    directory = file_path if len(skins) > 1 else os.path.dirname(file_path)
+    if len(skins) > 1:
+        # With multiple skinClusters, the user just chooses an export directory.
+        return export_skins(
+            file_path, skins=skins, binary=binary, include_geometry=include_geometry
+        )
+
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    skin = SkinCluster(skins[0])
+    data = skin.gather_data(include_geometry)
+    _log_export(skin, data, file_path)
+    _write_skin_file(file_path, data, binary)
+
+
+def export_skins(
+    directory=None,
+    shapes=None,
+    skins=None,
+    binary=True,
+    compress=False,
+    include_geometry=False,
+    max_workers=None,
+    progress=None,
+):
+    """Exports the skinClusters of the given shapes to a directory.
+
+    Each file is named after the skinned shape.  The skin data is gathered on the main
+    thread since the Maya API can only be used from the main thread while the encoding,
+    compression and writing of the files happens on a thread pool.
+
+    :param directory: Directory to export the .skin files to.
+    :param shapes: Optional list of dag nodes to export skins from.  All descendent
+        nodes will be searched for skinClusters also.
+    :param skins: Optional list of skinClusters to export instead of searching shapes.
+    :param binary: True to write the binary skinformat file, False to write legacy JSON.
+    :param compress: True to compress the binary files.
+    :param include_geometry: True to store the mesh points and triangles so the
+        weights can be imported onto meshes with a different topology.
+    :param max_workers: Maximum number of writer threads.
+    :param progress: Optional callable called with (completed count, total count,
+        file path) after each file is written.
+    :return: Dictionary of {file path: {"gather": seconds, "write": seconds}}
+    """
+    if skins is None:
+        if shapes is None:
+            shapes = cmds.ls(sl=True) or []
+        skins = get_skin_clusters(shapes) if shapes else cmds.ls(type="skinCluster")
+    if not skins:
+        raise RuntimeError("No skins to export.")
 
+    if directory is None:
+        directory = shortcuts.get_directory_name(KEY_STORE)
+    if not directory:
+        return None
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    for skin in skins:
-        skin = SkinCluster(skin)
-        data = skin.gather_data()
-        if len(skins) > 1:
-            # With multiple skinClusters, the user just chooses an export directory.  Set the
-            # name to the transform name.
+    timings = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for skin in skins:
+            start = time.time()
+            skin = SkinCluster(skin)
+            data = skin.gather_data(include_geometry)
+            # Set the name to the transform name.
             file_path = os.path.join(
                 directory, "{}{}".format(skin.shape.replace("|", "!"), EXTENSION)
             )
-        logger.info(
-            "Exporting skinCluster %s on %s (%d influences, %d vertices) : %s",
-            skin.node,
-            skin.shape,
-            len(data["weights"].keys()),
-            len(data["blendWeights"]),
-            file_path,
-        )
-        with open(file_path, "w") as fh:
-            json.dump(data, fh)
+            timings[file_path] = {"gather": time.time() - start}
+            _log_export(skin, data, file_path)
+            future = executor.submit(
+                _write_skin_file, file_path, data, binary, compress
+            )
+            futures[future] = file_path
+
+        for i, future in enumerate(as_completed(futures)):
+            file_path = futures[future]
+            timings[file_path]["write"] = future.result()
+            if progress:
+                progress(i + 1, len(futures), file_path)
+    return timings
+
+
+def _write_skin_file(file_path, data, binary=True, compress=False):
+    start = time.time()
+    if binary:
+        skinformat.write(file_path, data, compress=compress)
+    else:
+        skinformat.write_json(file_path, data)
+    return time.time() - start
+
+
+def _log_export(skin, data, file_path):
+    logger.info(
+        "Exporting skinCluster %s on %s (%d influences, %d vertices) : %s",
+        skin.node,
+        skin.shape,
+        len(data["weights"].influences),
+        len(data["blendWeights"]),
+        file_path,
+    )
 
 
 class SkinCluster(object):
@@ -239,20 +506,23 @@ class SkinCluster(object):
         self.mobject = shortcuts.get_mobject(self.node)
         self.fn = OpenMayaAnim.MFnSkinCluster(self.mobject)
         self.data = {
-            "weights": {},
-            "blendWeights": [],
+            "weights": None,
+            "blendWeights": None,
             "name": self.node,
             "shape": self.shape,
         }
 
-    def gather_data(self):
+    def gather_data(self, include_geometry=False):
         """Gather all the skinCluster data into a dictionary so it can be serialized.
 
+        :param include_geometry: True to also store the world space points and
+            triangles of the shape so the weights can be transferred to other meshes.
         :return: The data dictionary containing all the skinCluster data.
         """
-        dag_path, components = self.__get_geometry_components()
-        self.gather_influence_weights(dag_path, components)
-        self.gather_blend_weights(dag_path, components)
+        self.gather_influence_weights()
+        self.gather_blend_weights()
+        if include_geometry:
+            self.data["points"], self.data["triangles"] = get_mesh_geometry(self.shape)
 
         for attr in SkinCluster.attributes:
             self.data[attr] = cmds.getAttr("%s.%s" % (self.node, attr))
@@ -264,114 +534,99 @@ class SkinCluster(object):
         :return: (MDagPath, MObject)
         """
         # Get dagPath and member components of skinned shape
-        fnset = OpenMaya.MFnSet(self.fn.deformerSet())
-        members = OpenMaya.MSelectionList()
-        fnset.getMembers(members, False)
-        dag_path = OpenMaya.MDagPath()
-        components = OpenMaya.MObject()
-        members.getDagPath(0, dag_path, components)
+        fnset = OpenMaya.MFnSet(self.fn.deformerSet)
+        members = fnset.getMembers(False)
+        dag_path, components = members.getComponent(0)
         return dag_path, components
 
-    def gather_influence_weights(self, dag_path, components):
-        """Gathers all the influence weights
+    def influence_names(self):
+        """Get the influence names without namespaces in skinCluster index order.
 
-        :param dag_path: MDagPath of the deformed geometry.
-        :param components: Component MObject of the deformed components.
-        """
-        weights = self.__get_current_weights(dag_path, components)
-
-        influence_paths = OpenMaya.MDagPathArray()
-        influence_count = self.fn.influenceObjects(influence_paths)
-        components_per_influence = weights.length() // influence_count
-        for ii in range(influence_paths.length()):
-            influence_name = influence_paths[ii].partialPathName()
-            # We want to store the weights by influence without the namespace so it is easier
-            # to import if the namespace is different
-            influence_without_namespace = shortcuts.remove_namespace_from_name(
-                influence_name
-            )
-            self.data["weights"][influence_without_namespace] = [
-                weights[jj * influence_count + ii]
-                for jj in range(components_per_influence)
-            ]
+        We store the weights by influence without the namespace so it is easier to
+        import if the namespace is different.
 
-    def gather_blend_weights(self, dag_path, components):
-        """Gathers the blendWeights
-
-        :param dag_path: MDagPath of the deformed geometry.
-        :param components: Component MObject of the deformed components.
+        :return: List of influence names
         """
-        weights = OpenMaya.MDoubleArray()
-        self.fn.getBlendWeights(dag_path, components, weights)
-        self.data["blendWeights"] = [weights[i] for i in range(weights.length())]
+        return [
+            shortcuts.remove_namespace_from_name(path.partialPathName())
+            for path in self.fn.influenceObjects()
+        ]
 
-    def __get_current_weights(self, dag_path, components):
-        """Get the current skin weight array.
+    def gather_influence_weights(self):
+        """Gathers all the influence weights
 
-        :param dag_path: MDagPath of the deformed geometry.
-        :param components: Component MObject of the deformed components.
-        :return: An MDoubleArray of the weights.
+        The weights are copied from the API 1 weight array in bulk.
         """
-        weights = OpenMaya.MDoubleArray()
-        util = OpenMaya.MScriptUtil()
-        util.createFromInt(0)
-        ptr = util.asUintPtr()
-        self.fn.getWeights(dag_path, components, weights, ptr)
-        return weights
+        matrix = mayaarrays.get_skin_weights(self.node)
+        self.data["weights"] = SparseWeights.from_dense(matrix, self.influence_names())
+
+    def gather_blend_weights(self):
+        """Gathers the blendWeights"""
+        self.data["blendWeights"] = mayaarrays.get_blend_weights(self.node)
 
-    def set_data(self, data, selected_components=None):
+    def set_data(self, data, selected_components=None, chunk_size=None, pipeline=None):
         """Sets the data and stores it in the Maya skinCluster node.
 
         :param data: Data dictionary.
+        :param selected_components: Optional list of vertex indices to set.
+        :param chunk_size: Optional number of vertices to set at a time.  When
+            given, the weights are applied to consecutive component ranges so peak
+            memory is bounded by the chunk size rather than the mesh size.
+        :param pipeline: Optional weight_processing.Pipeline run on the weights before
+            they are set, e.g. to prune, limit, smooth and normalize.
         """
 
         self.data = data
+        if not isinstance(data["weights"], SparseWeights):
+            # Weights of the legacy {influence: weights} form
+            data["weights"] = SparseWeights.from_dict(
+                data["weights"], len(data["blendWeights"])
+            )
+        if pipeline is not None:
+            data["weights"] = pipeline.run(data["weights"])
         dag_path, components = self.__get_geometry_components()
         if selected_components:
-            fncomp = OpenMaya.MFnSingleIndexedComponent()
-            components = fncomp.create(OpenMaya.MFn.kMeshVertComponent)
-            for i in selected_components:
-                fncomp.addElement(i)
-        self.set_influence_weights(dag_path, components)
-        self.set_blend_weights(dag_path, components)
+            components = self.__create_components(selected_components)
+        if chunk_size:
+            elements = self.__get_elements(components)
+            for start in range(0, elements.shape[0], chunk_size):
+                chunk = self.__create_components(elements[start : start + chunk_size])
+                self.set_influence_weights(dag_path, chunk)
+                self.set_blend_weights(dag_path, chunk)
+        else:
+            self.set_influence_weights(dag_path, components)
+            self.set_blend_weights(dag_path, components)
 
         for attr in SkinCluster.attributes:
             cmds.setAttr("{0}.{1}".format(self.node, attr), self.data[attr])
 
+    def __create_components(self, elements):
+        """Create a vertex component MObject.
+
+        :param elements: Sequence of vertex indices.
+        :return: Component MObject
+        """
+        fncomp = OpenMaya.MFnSingleIndexedComponent()
+        components = fncomp.create(OpenMaya.MFn.kMeshVertComponent)
+        fncomp.addElements([int(i) for i in elements])
+        return components
+
     def set_influence_weights(self, dag_path, components):
         """Sets all the influence weights.
 
+        The imported influences are matched to the skinCluster influences once by
+        name and the full weight matrix is assembled with numpy before being handed
+        to MFnSkinCluster.setWeights in a single call.
+
         :param dag_path: MDagPath of the deformed geometry.
         :param components: Component MObject of the deformed components.
         """
-        influence_paths = OpenMaya.MDagPathArray()
-        influence_count = self.fn.influenceObjects(influence_paths)
-
-        elements = OpenMaya.MIntArray()
-        fncomp = OpenMaya.MFnSingleIndexedComponent(components)
-        fncomp.getElements(elements)
-        weights = OpenMaya.MDoubleArray(elements.length() * influence_count)
-
-        components_per_influence = elements.length()
+        influences = self.influence_names()
+        elements = self.__get_elements(components)
+        weights = self.data["weights"].to_influence_matrix(influences, elements)
 
-        for imported_influence, imported_weights in self.data["weights"].items():
-            imported_influence = imported_influence.split("|")[-1]
-            for ii in range(influence_paths.length()):
-                influence_name = influence_paths[ii].partialPathName()
-                influence_without_namespace = shortcuts.remove_namespace_from_name(
-                    influence_name
-                )
-                if influence_without_namespace == imported_influence:
-                    # Store the imported weights into the MDoubleArray
-                    for jj in range(components_per_influence):
-                        weights.set(
-                            imported_weights[elements[jj]], jj * influence_count + ii
-                        )
-                    break
-
-        influence_indices = OpenMaya.MIntArray(influence_count)
-        for ii in range(influence_count):
-            influence_indices.set(ii, ii)
+        influence_indices = OpenMaya.MIntArray(list(range(len(influences))))
+        weights = mayaarrays.to_double_array(weights)
         self.fn.setWeights(dag_path, components, influence_indices, weights, False)
 
     def set_blend_weights(self, dag_path, components):
@@ -380,14 +635,20 @@ class SkinCluster(object):
         :param dag_path: MDagPath of the deformed geometry.
         :param components: Component MObject of the deformed components.
         """
-        elements = OpenMaya.MIntArray()
-        fncomp = OpenMaya.MFnSingleIndexedComponent(components)
-        fncomp.getElements(elements)
-        blend_weights = OpenMaya.MDoubleArray(elements.length())
-        for i in range(elements.length()):
-            blend_weights.set(self.data["blendWeights"][elements[i]], i)
+        elements = self.__get_elements(components)
+        blend_weights = np.asarray(self.data["blendWeights"])[elements]
+        blend_weights = mayaarrays.to_double_array(blend_weights)
         self.fn.setBlendWeights(dag_path, components, blend_weights)
 
+    def __get_elements(self, components):
+        """Get the vertex indices of a component MObject.
+
+        :param components: Single indexed component MObject.
+        :return: numpy array of vertex indices
+        """
+        fncomp = OpenMaya.MFnSingleIndexedComponent(components)
+        return np.array(fncomp.getElements(), dtype=np.int64)
+
 
 class WeightRemapDialog(MayaQWidgetBaseMixin, QDialog):
     def __init__(self, file_path=None, parent=None):
@@ -0,0 +1,308 @@
+"""Sparse skin weight storage.
+
+Skin weights are almost entirely zero since each vertex is usually only influenced by a
+handful of joints.  SparseWeights stores the weights in CSR style arrays keyed by
+vertex so memory and file size scale with the number of non-zero weights rather than
+vertices x influences:
+
+* indptr: (vertices + 1) offsets into indices/values.  The weights of vertex i are
+  stored in indices[indptr[i]:indptr[i + 1]] and values[indptr[i]:indptr[i + 1]]
+* indices: Influence index of each non-zero weight
+* values: Non-zero weight values
+
+This module does not depend on Maya so weights can be processed and tested with only
+numpy.
+
+Example Usage
+=============
+
+    weights = SparseWeights.from_dense(matrix, ["hip", "knee", "ankle"])
+    knee = weights.column("knee")
+    subset = weights.take([0, 5, 10])
+    dense = subset.to_dense()
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+class SparseWeights(object):
+    """CSR style skin weights keyed by vertex."""
+
+    @classmethod
+    def from_dense(cls, matrix, influences, threshold=0.0, chunk_size=65536):
+        """Create SparseWeights from a dense (vertices x influences) matrix.
+
+        :param matrix: Dense weight matrix.  Memory-mapped matrices are only read one
+            block of rows at a time.
+        :param influences: List of influence names, one per matrix column.
+        :param threshold: Weights with an absolute value at or below the threshold are
+            not stored.
+        :param chunk_size: Number of rows converted at a time.
+        :return: SparseWeights
+        """
+        if not isinstance(matrix, np.ndarray):
+            matrix = np.asarray(matrix)
+        if matrix.ndim != 2 or matrix.shape[1] != len(influences):
+            raise RuntimeError(
+                "Weight matrix of shape {} does not match {} influences".format(
+                    matrix.shape, len(influences)
+                )
+            )
+        counts, indices, values = [], [], []
+        for start in range(0, matrix.shape[0], chunk_size):
+            block = np.asarray(matrix[start : start + chunk_size])
+            rows, columns = np.nonzero(np.abs(block) > threshold)
+            counts.append(np.bincount(rows, minlength=block.shape[0]))
+            indices.append(columns)
+            values.append(block[rows, columns])
+        indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+        if counts:
+            np.cumsum(np.concatenate(counts), out=indptr[1:])
+            indices = np.concatenate(indices)
+            values = np.concatenate(values)
+        else:
+            values = np.zeros(0, dtype=matrix.dtype)
+        return cls(influences, indptr, indices, values)
+
+    @classmethod
+    def from_dict(cls, weights, vertex_count=None):
+        """Create SparseWeights from the legacy {influence: [weight per vertex]} form.
+
+        :param weights: Dictionary of influence name to per vertex weights.
+        :param vertex_count: Optional vertex count used when there are no influences.
+        :return: SparseWeights
+        """
+        influences = list(weights.keys())
+        if vertex_count is None:
+            vertex_count = len(weights[influences[0]]) if influences else 0
+        matrix = np.zeros((vertex_count, len(influences)))
+        for i, influence in enumerate(influences):
+            matrix[:, i] = weights[influence]
+        return cls.from_dense(matrix, influences)
+
+    def __init__(self, influences, indptr, indices, values):
+        """Constructor
+
+        :param influences: List of influence names
+        :param indptr: (vertices + 1) array of offsets into indices and values
+        :param indices: Influence index of each stored weight
+        :param values: Stored weight values
+        """
+        self.influences = list(influences)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.values = np.asarray(values)
+        if self.indices.shape != self.values.shape:
+            raise RuntimeError("Weight indices and values must be the same length")
+        if self.indptr[-1] != self.values.shape[0]:
+            raise RuntimeError("Weight indptr does not match the number of values")
+
+    def __len__(self):
+        return self.vertex_count
+
+    def __repr__(self):
+        return "SparseWeights({} vertices, {} influences, {} weights)".format(
+            self.vertex_count, len(self.influences), self.nnz
+        )
+
+    @property
+    def vertex_count(self):
+        return self.indptr.shape[0] - 1
+
+    @property
+    def nnz(self):
+        """Number of stored weights."""
+        return self.values.shape[0]
+
+    @property
+    def shape(self):
+        return self.vertex_count, len(self.influences)
+
+    def row_indices(self):
+        """Get the vertex index of each stored weight.
+
+        :return: Array the same length as values.
+        """
+        return np.repeat(
+            np.arange(self.vertex_count, dtype=np.int64), np.diff(self.indptr)
+        )
+
+    def to_dense(self, dtype=np.float64):
+        """Get the weights as a dense (vertices x influences) matrix.
+
+        :param dtype: Type of the returned matrix.
+        :return: numpy array
+        """
+        matrix = np.zeros(self.shape, dtype=dtype)
+        matrix[self.row_indices(), self.indices] = self.values
+        return matrix
+
+    def to_scipy(self):
+        """Get the weights as a scipy csr_matrix.
+
+        :return: (vertices x influences) scipy.sparse.csr_matrix
+        """
+        from scipy.sparse import csr_matrix
+
+        return csr_matrix((self.values, self.indices, self.indptr), shape=self.shape)
+
+    @classmethod
+    def from_scipy(cls, matrix, influences):
+        """Create SparseWeights from a scipy sparse matrix.
+
+        :param matrix: (vertices x influences) scipy sparse matrix
+        :param influences: List of influence names, one per matrix column.
+        :return: SparseWeights
+        """
+        matrix = matrix.tocsr()
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        return cls(influences, matrix.indptr, matrix.indices, matrix.data)
+
+    def to_dict(self):
+        """Get the weights in the legacy {influence: [weight per vertex]} form.
+
+        :return: Dictionary of influence name to a list of weights.
+        """
+        matrix = self.to_dense()
+        return {
+            influence: matrix[:, i].tolist()
+            for i, influence in enumerate(self.influences)
+        }
+
+    def column(self, influence):
+        """Get the dense per vertex weights of a single influence.
+
+        :param influence: Influence name or index
+        :return: Array of vertex_count weights
+        """
+        if not isinstance(influence, (int, np.integer)):
+            influence = self.influences.index(influence)
+        column = np.zeros(self.vertex_count, dtype=np.float64)
+        mask = self.indices == influence
+        column[self.row_indices()[mask]] = self.values[mask]
+        return column
+
+    def rows(self, start, stop):
+        """Get the weights of a contiguous range of vertices.
+
+        Only the values between indptr[start] and indptr[stop] are read so this works
+        on memory-mapped arrays without loading the whole file.
+
+        :param start: First vertex
+        :param stop: Vertex after the last vertex
+        :return: SparseWeights of stop - start vertices
+        """
+        indptr = np.asarray(self.indptr[start : stop + 1])
+        begin, end = indptr[0], indptr[-1]
+        return SparseWeights(
+            self.influences,
+            indptr - begin,
+            self.indices[begin:end],
+            self.values[begin:end],
+        )
+
+    def take(self, vertices):
+        """Get the weights of the given vertices.
+
+        :param vertices: Sequence of vertex indices
+        :return: SparseWeights with one row per given vertex
+        """
+        vertices = np.asarray(vertices, dtype=np.int64)
+        if vertices.size and np.array_equal(
+            vertices, np.arange(vertices[0], vertices[0] + vertices.size)
+        ):
+            # Contiguous ranges only touch the stored values of those rows
+            return self.rows(vertices[0], vertices[-1] + 1)
+        starts = self.indptr[vertices]
+        counts = self.indptr[vertices + 1] - starts
+        indptr = np.zeros(vertices.shape[0] + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        # Offset of each taken value into the source arrays
+        positions = np.repeat(starts - indptr[:-1], counts) + np.arange(indptr[-1])
+        return SparseWeights(
+            self.influences, indptr, self.indices[positions], self.values[positions]
+        )
+
+    def to_influence_matrix(self, influences, vertices=None, dtype=np.float64):
+        """Get a dense weight matrix with columns ordered by the given influences.
+
+        Stored influences are matched by their short name, so DAG paths stored in older
+        files match the short influence names of the scene.  Stored influences without
+        a match are dropped and influences without stored weights get zero weights.
+
+        :param influences: List of influence names defining the matrix columns.
+        :param vertices: Optional vertex indices defining the matrix rows.  All
+            vertices are used by default.
+        :param dtype: Type of the returned matrix.
+        :return: (vertices x influences) numpy array
+        """
+        lookup = {name: i for i, name in enumerate(influences)}
+        column_map = np.array(
+            [lookup.get(name.split("|")[-1], -1) for name in self.influences],
+            dtype=np.int64,
+        )
+        source = self if vertices is None else self.take(vertices)
+        matrix = np.zeros((source.vertex_count, len(influences)), dtype=dtype)
+        if not column_map.size:
+            return matrix
+        columns = column_map[source.indices]
+        matched = columns >= 0
+        matrix[source.row_indices()[matched], columns[matched]] = source.values[matched]
+        return matrix
+
+    def rename_influences(self, mapping):
+        """Rename influences in place.
+
+        :param mapping: Dictionary of {old name: new name}
+        """
+        self.influences = [mapping.get(x, x) for x in self.influences]
+
+    def copy(self):
+        return SparseWeights(
+            self.influences,
+            self.indptr.copy(),
+            self.indices.copy(),
+            self.values.copy(),
+        )
+
+
+def benchmark(vertex_count=100000, influence_count=100, max_influences=4):
+    """Compare the per element weight assembly loop previously used by
+    SkinCluster.set_influence_weights with SparseWeights.to_influence_matrix.
+
+    :param vertex_count: Number of vertices of the synthetic mesh.
+    :param influence_count: Number of influences of the synthetic skinCluster.
+    :param max_influences: Number of non-zero weights per vertex.
+    """
+    from ywta.utility.timing import Section
+
+    rng = np.random.default_rng(0)
+    influences = ["joint{}".format(i) for i in range(influence_count)]
+    scene_influences = ["ns:{}".format(x) for x in reversed(influences)]
+    matrix = np.zeros((vertex_count, influence_count))
+    rows = np.repeat(np.arange(vertex_count), max_influences)
+    matrix[rows, rng.integers(0, influence_count, rows.shape[0])] = 1.0
+    weights = SparseWeights.from_dense(matrix, influences)
+    elements = list(range(vertex_count))
+
+    workspace = "set_influence_weights {}x{}".format(vertex_count, influence_count)
+    with Section(workspace, "python loop"):
+        flat = [0.0] * (vertex_count * influence_count)
+        for imported_index, imported_influence in enumerate(weights.influences):
+            imported_weights = weights.column(imported_index).tolist()
+            for ii, influence in enumerate(scene_influences):
+                if influence.split(":")[-1] == imported_influence:
+                    for jj in range(vertex_count):
+                        flat[jj * influence_count + ii] = imported_weights[elements[jj]]
+                    break
+    with Section(workspace, "vectorized"):
+        names = [x.split(":")[-1] for x in scene_influences]
+        result = weights.to_influence_matrix(names, elements)
+    if not np.array_equal(result.ravel(), np.array(flat)):
+        raise RuntimeError("Vectorized weights do not match the python loop")
+    Section.print_timing()
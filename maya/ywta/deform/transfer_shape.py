@@ -1,70 +1,89 @@
 from math import e
+import numpy as np
 import maya.cmds as cmds
 import maya.api.OpenMaya as OpenMaya2
 import ywta.deform.blendshape as blendshape
 import ywta.mesh.colorset as colorset
 import ywta.shortcuts as shortcuts
+import ywta.utility.mayaarrays as mayaarrays
 from ywta.ui.optionbox import OptionBox
 
 def blend_points_width_weights(source, target, weights):
 
-    source_points = shortcuts.get_points(source)
-    target_points = shortcuts.get_points(target)
+    source_points = mayaarrays.get_points(source)
+    target_points = mayaarrays.get_points(target)
 
     if len(source_points) != len(target_points):
         raise RuntimeError("Source and target points must be the same length")
     if len(weights) != len(target_points):
         raise RuntimeError("Weights must be the same length as target points")
 
-    new_points = OpenMaya2.MPointArray()
-    for i,w in enumerate(weights):
-        p = OpenMaya2.MPoint()
-        p.x = source_points[i].x * w + target_points[i].x * (1 - w)
-        p.y = source_points[i].y * w + target_points[i].y * (1 - w)
-        p.z = source_points[i].z * w + target_points[i].z * (1 - w)
-        new_points.append(p)
-    return new_points
+    new_points = blend_points_stack(source_points, target_points, [weights])[0]
+    return mayaarrays.to_point_array(new_points)
+
+def blend_points_stack(source_points, target_points, weights):
+    """Blend the source points onto the target points for many weight sets at once.
+
+    :param source_points: (N x 3) source points
+    :param target_points: (N x 3) target points
+    :param weights: (sets x N) weights.  1 is the source point, 0 the target point.
+    :return: (sets x N x 3) blended points
+    """
+    weights = np.asarray(weights, dtype=np.float64)[..., np.newaxis]
+    return target_points + weights * (source_points - target_points)
 
 def new_target_with_points(target_mesh, points, target_name=None):
 
+    if target_name is None:
+        target_name = f"{target_mesh.split('|')[-1]}_dup"
+    if not isinstance(points, np.ndarray):
+        points = mayaarrays.to_numpy(points)
+    return new_targets_with_points(target_mesh, [points[:, :3]], [target_name])[0]
+
+def new_targets_with_points(target_mesh, points, target_names):
+    """Add a blendshape target per point array in one batch.
+
+    :param target_mesh: Mesh to add the targets to.
+    :param points: (targets x N x 3) points
+    :param target_names: List of target names
+    :return: List of target indices
+    """
     # blendspageがなければ作成
     blendshape_name = blendshape.get_blendshape_node(target_mesh)
     if blendshape_name is None:
         blendshape_name = cmds.blendShape(target_mesh, foc=True)[0]
 
-    # メッシュを複製して
-    target_dup = cmds.duplicate(target_mesh, name=f"{target_mesh}_dup")[0]
-
-    # 頂点をセットして
-    target_dup_fnmesh = shortcuts.get_mfnmesh(target_dup)
-    target_dup_fnmesh.setPoints(points)
-
-    # ブレンドシェイプターゲットに追加
-    target_index = blendshape.add_target(blendshape_name, target_dup, target_name)
-
-    # 複製したshapeを削除
-    cmds.delete(target_dup)
+    # メッシュを複製せずにベースとの差分をターゲットに直接書き込む
+    deltas = np.asarray(points) - blendshape.get_base_points(blendshape_name)
+    return blendshape.add_targets_from_deltas(blendshape_name, target_names, deltas)
 
 def transfer_shape_with_colorset(source_mesh, target_mesh, is_use_colorset=None, is_add_blendshape_target=False):
     """ターゲットのカラーセットのリストを取得して、それぞれのカラーセットに対してシェイプを転送する"""
+    source_points = mayaarrays.get_points(source_mesh)
+    target_points = mayaarrays.get_points(target_mesh)
+    if len(source_points) != len(target_points):
+        raise RuntimeError("Source and target points must be the same length")
+    source_name = source_mesh.split('|')[-1]
+
     if is_use_colorset:
-        for colorset_name in colorset.get_colorset_list(target_mesh):
-            weights = colorset.get_weights_from_colorset(target_mesh, colorset_name)
-            new_points = blend_points_width_weights(source_mesh, target_mesh, weights)
-            if is_add_blendshape_target:
-                target_name = f"{source_mesh.split('|')[-1]}_{colorset_name}"
-                new_target_with_points(target_mesh, new_points, target_name)
-            else:
-                raise RuntimeError("enable Add Blendshape Target")
+        if not is_add_blendshape_target:
+            raise RuntimeError("enable Add Blendshape Target")
+        # 全てのカラーセットをまとめて処理する
+        colorset_names = colorset.get_colorset_list(target_mesh) or []
+        if not colorset_names:
+            return
+        weights = colorset.get_weights_from_colorsets(target_mesh, colorset_names)
+        new_points = blend_points_stack(source_points, target_points, weights)
+        target_names = [f"{source_name}_{name}" for name in colorset_names]
+        new_targets_with_points(target_mesh, new_points, target_names)
     else:
         weights = colorset.get_weights_from_colorset(target_mesh)
-        new_points = blend_points_width_weights(source_mesh, target_mesh, weights)
-        target_fnmesh = shortcuts.get_mfnmesh(target_mesh)
+        new_points = blend_points_stack(source_points, target_points, [weights])[0]
         if is_add_blendshape_target:
-            target_name = f"new_target_{source_mesh.split('|')[-1]}"
-            new_target_with_points( target_mesh, new_points, target_name)
+            target_name = f"new_target_{source_name}"
+            new_target_with_points(target_mesh, new_points, target_name)
         else:
-            target_fnmesh.setPoints(new_points)
+            mayaarrays.set_points(target_mesh, new_points)
 
 def exec_from_menu(*args, **kwargs):
     sel = cmds.ls(sl=True)
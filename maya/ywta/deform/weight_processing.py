@@ -0,0 +1,199 @@
+"""Skin weight clean up operations on SparseWeights.
+
+Every operation works on the stored non-zero weights directly so the cost scales with
+the number of weights rather than vertices x influences.  Smoothing uses a vertex
+adjacency matrix built once from the mesh topology so each iteration is a single sparse
+matrix product instead of per vertex Maya commands.
+
+This module does not depend on Maya.
+
+Example Usage
+=============
+
+    import ywta.deform.weight_processing as wp
+
+    adjacency = wp.vertex_adjacency(face_counts, face_connects)
+    pipeline = wp.Pipeline().prune(0.01).limit(4).smooth(adjacency, 2).normalize()
+    weights = pipeline.run(weights)
+
+    # In Maya
+    adjacency = skinio.get_mesh_adjacency("body")
+    skinio.import_skin("/path/to/body.skin", pipeline=pipeline)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import functools
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from ywta.deform.skinweights import SparseWeights
+
+
+def vertex_adjacency(face_counts, face_connects, vertex_count=None):
+    """Build the vertex adjacency matrix of a polygon mesh.
+
+    :param face_counts: Number of vertices of each polygon, as returned by
+        MFnMesh.getVertices.
+    :param face_connects: Flat list of polygon vertex indices.
+    :param vertex_count: Optional number of vertices.  Defaults to the highest vertex
+        index + 1.
+    :return: Symmetric (vertices x vertices) scipy csr_matrix with 1 for each edge.
+    """
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    face_connects = np.asarray(face_connects, dtype=np.int64)
+    if vertex_count is None:
+        vertex_count = int(face_connects.max()) + 1 if face_connects.size else 0
+    # The next vertex of each face vertex wraps around to the start of its face
+    starts = np.repeat(np.cumsum(face_counts) - face_counts, face_counts)
+    positions = np.arange(face_connects.shape[0])
+    following = starts + (positions - starts + 1) % np.repeat(face_counts, face_counts)
+    rows = np.concatenate([face_connects, face_connects[following]])
+    columns = np.concatenate([face_connects[following], face_connects])
+    adjacency = csr_matrix(
+        (np.ones(rows.shape[0]), (rows, columns)), shape=(vertex_count, vertex_count)
+    )
+    # Edges shared by two faces are summed, so clamp back to 1
+    adjacency.data[:] = 1.0
+    return adjacency
+
+
+def prune(weights, threshold=0.001):
+    """Remove small weights.
+
+    :param weights: SparseWeights
+    :param threshold: Weights at or below this value are removed.
+    :return: SparseWeights
+    """
+    keep = weights.values > threshold
+    return _select(weights, keep)
+
+
+def limit(weights, max_influences=4):
+    """Keep only the largest weights of each vertex.
+
+    :param weights: SparseWeights
+    :param max_influences: Maximum number of weights per vertex.
+    :return: SparseWeights
+    """
+    rows = weights.row_indices()
+    # Sort by vertex then by descending weight so the rank within each vertex is the
+    # position relative to the start of the vertex
+    order = np.lexsort((-weights.values, rows))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.shape[0]) - weights.indptr[rows[order]]
+    return _select(weights, rank < max_influences)
+
+
+def normalize(weights):
+    """Scale the weights of each vertex so they sum to 1.
+
+    Vertices without weights are left unchanged.
+
+    :param weights: SparseWeights
+    :return: SparseWeights
+    """
+    totals = np.bincount(
+        weights.row_indices(), weights.values, minlength=weights.vertex_count
+    )
+    totals[totals == 0.0] = 1.0
+    values = weights.values / np.repeat(totals, np.diff(weights.indptr))
+    return SparseWeights(weights.influences, weights.indptr, weights.indices, values)
+
+
+def smooth(weights, adjacency, iterations=1, strength=0.5, vertices=None):
+    """Blend each vertex weight towards the average weight of its neighbors.
+
+    :param weights: SparseWeights
+    :param adjacency: Vertex adjacency matrix from vertex_adjacency.
+    :param iterations: Number of smoothing iterations.
+    :param strength: Blend amount towards the neighbor average per iteration.
+    :param vertices: Optional vertex indices to smooth.  All vertices are smoothed by
+        default.
+    :return: SparseWeights
+    """
+    neighbor_counts = np.asarray(adjacency.sum(axis=1)).ravel()
+    neighbor_counts[neighbor_counts == 0.0] = 1.0
+    average = diags(1.0 / neighbor_counts) @ adjacency
+    amount = np.zeros(weights.vertex_count)
+    if vertices is None:
+        amount[:] = strength
+    else:
+        amount[np.asarray(vertices, dtype=np.int64)] = strength
+    keep = diags(1.0 - amount)
+    blend = diags(amount) @ average
+    # (1 - s) * W + s * A * W == ((1 - s) * I + s * A) * W
+    operator = (keep + blend).tocsr()
+
+    matrix = weights.to_scipy()
+    for _ in range(iterations):
+        matrix = operator @ matrix
+    return SparseWeights.from_scipy(matrix, weights.influences)
+
+
+def _select(weights, mask):
+    """Keep the stored weights where mask is True.
+
+    :param weights: SparseWeights
+    :param mask: Boolean array the same length as weights.values
+    :return: SparseWeights
+    """
+    counts = np.bincount(weights.row_indices()[mask], minlength=weights.vertex_count)
+    indptr = np.zeros(weights.vertex_count + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return SparseWeights(
+        weights.influences, indptr, weights.indices[mask], weights.values[mask]
+    )
+
+
+class Pipeline(object):
+    """An ordered list of weight operations.
+
+    Operations are added with the chainable methods and run in the order they were
+    added.
+    """
+
+    def __init__(self):
+        self.operations = []
+
+    def __repr__(self):
+        return "Pipeline({})".format(
+            " -> ".join([op.func.__name__ for op in self.operations])
+        )
+
+    def prune(self, threshold=0.001):
+        self.operations.append(functools.partial(prune, threshold=threshold))
+        return self
+
+    def limit(self, max_influences=4):
+        self.operations.append(functools.partial(limit, max_influences=max_influences))
+        return self
+
+    def smooth(self, adjacency, iterations=1, strength=0.5, vertices=None):
+        self.operations.append(
+            functools.partial(
+                smooth,
+                adjacency=adjacency,
+                iterations=iterations,
+                strength=strength,
+                vertices=vertices,
+            )
+        )
+        return self
+
+    def normalize(self):
+        self.operations.append(functools.partial(normalize))
+        return self
+
+    def run(self, weights):
+        """Run all operations.
+
+        :param weights: SparseWeights
+        :return: The processed SparseWeights
+        """
+        for operation in self.operations:
+            weights = operation(weights)
+        return weights
@@ -0,0 +1,287 @@
+"""Transfer skin weights between meshes with different topology.
+
+The transfer works on numpy arrays only so it can run and be tested without Maya.  Each
+method builds a sparse (destination vertices x source vertices) interpolation matrix
+and multiplies it with the source weights, so dense weight matrices and SparseWeights
+are both supported and influences never need to be looped over.
+
+Two methods are available:
+
+* closest_point: Each destination vertex takes the barycentric interpolation of the
+  weights at the closest point on the source triangles.  Candidate triangles are found
+  with a KD-tree of the triangle centroids.
+* inverse_distance: Each destination vertex blends the weights of the k nearest source
+  vertices weighted by inverse distance.
+
+Example Usage
+=============
+
+    import ywta.deform.weight_transfer as weight_transfer
+
+    weights = weight_transfer.transfer_weights(
+        source_points, source_weights, destination_points, triangles=source_triangles
+    )
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+from ywta.deform.skinweights import SparseWeights
+
+CLOSEST_POINT = "closest_point"
+INVERSE_DISTANCE = "inverse_distance"
+
+
+def transfer_weights(
+    source_points,
+    source_weights,
+    destination_points,
+    triangles=None,
+    method=CLOSEST_POINT,
+    **kwargs
+):
+    """Transfer weights from a source mesh onto destination points.
+
+    :param source_points: (N x 3) source vertex positions.
+    :param source_weights: (N x influences) dense weights or SparseWeights.
+    :param destination_points: (M x 3) destination vertex positions.
+    :param triangles: (T x 3) source triangle vertex indices.  Required for the
+        closest point method.
+    :param method: CLOSEST_POINT or INVERSE_DISTANCE.
+    :param kwargs: Extra arguments of closest_point_matrix or inverse_distance_matrix.
+    :return: The transferred weights in the same type as source_weights.
+    """
+    if method == CLOSEST_POINT:
+        if triangles is None:
+            raise RuntimeError("Closest point transfer requires source triangles.")
+        matrix = closest_point_matrix(
+            source_points, triangles, destination_points, **kwargs
+        )
+    elif method == INVERSE_DISTANCE:
+        matrix = inverse_distance_matrix(source_points, destination_points, **kwargs)
+    else:
+        raise RuntimeError("Invalid weight transfer method {}".format(method))
+    return apply_matrix(matrix, source_weights)
+
+
+def apply_matrix(matrix, weights):
+    """Apply a (destination x source) interpolation matrix to weights.
+
+    :param matrix: scipy sparse interpolation matrix.
+    :param weights: (source vertices x influences) dense weights or SparseWeights.
+    :return: The interpolated weights in the same type as weights.
+    """
+    if isinstance(weights, SparseWeights):
+        return SparseWeights.from_scipy(matrix @ weights.to_scipy(), weights.influences)
+    return np.asarray(matrix @ np.asarray(weights))
+
+
+def closest_point_matrix(
+    source_points, triangles, destination_points, candidates=8, batch_size=50000
+):
+    """Get the barycentric interpolation matrix of the closest points on a mesh.
+
+    :param source_points: (N x 3) source vertex positions.
+    :param triangles: (T x 3) source triangle vertex indices.
+    :param destination_points: (M x 3) destination vertex positions.
+    :param candidates: Number of triangles with the closest centroids tested for each
+        destination point.
+    :param batch_size: Number of destination points processed at a time.
+    :return: (M x N) scipy csr_matrix with 3 barycentric weights per row.
+    """
+    source_points = np.asarray(source_points, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64)
+    destination_points = np.asarray(destination_points, dtype=np.float64)
+    corners = source_points[triangles]
+    candidates = min(candidates, triangles.shape[0])
+    tree = cKDTree(corners.mean(axis=1))
+
+    columns = np.empty((destination_points.shape[0], 3), dtype=np.int64)
+    values = np.empty((destination_points.shape[0], 3), dtype=np.float64)
+    for start in range(0, destination_points.shape[0], batch_size):
+        points = destination_points[start : start + batch_size]
+        _, nearest = tree.query(points, k=candidates)
+        nearest = nearest.reshape(points.shape[0], candidates)
+        # Test every candidate triangle and keep the closest
+        closest, barycentric = closest_points_on_triangles(
+            points[:, np.newaxis, :], corners[nearest]
+        )
+        distance = np.sum((closest - points[:, np.newaxis, :]) ** 2, axis=2)
+        best = np.argmin(distance, axis=1)
+        rows = np.arange(points.shape[0])
+        columns[start : start + batch_size] = triangles[nearest[rows, best]]
+        values[start : start + batch_size] = barycentric[rows, best]
+
+    rows = np.repeat(np.arange(destination_points.shape[0]), 3)
+    return csr_matrix(
+        (values.ravel(), (rows, columns.ravel())),
+        shape=(destination_points.shape[0], source_points.shape[0]),
+    )
+
+
+def inverse_distance_matrix(
+    source_points, destination_points, k=4, power=2.0, epsilon=1e-8
+):
+    """Get the inverse distance interpolation matrix of the k nearest source points.
+
+    :param source_points: (N x 3) source vertex positions.
+    :param destination_points: (M x 3) destination vertex positions.
+    :param k: Number of nearest source points to blend.
+    :param power: Exponent applied to the distances.
+    :param epsilon: Distance below which a destination point copies the source point.
+    :return: (M x N) scipy csr_matrix with k normalized weights per row.
+    """
+    source_points = np.asarray(source_points, dtype=np.float64)
+    destination_points = np.asarray(destination_points, dtype=np.float64)
+    k = min(k, source_points.shape[0])
+    distance, nearest = cKDTree(source_points).query(destination_points, k=k)
+    distance = distance.reshape(destination_points.shape[0], k)
+    nearest = nearest.reshape(destination_points.shape[0], k)
+
+    values = 1.0 / np.maximum(distance, epsilon) ** power
+    # Points on top of a source point take its weights exactly
+    exact = distance[:, 0] < epsilon
+    values[exact] = 0.0
+    values[exact, 0] = 1.0
+    values /= values.sum(axis=1)[:, np.newaxis]
+
+    rows = np.repeat(np.arange(destination_points.shape[0]), k)
+    return csr_matrix(
+        (values.ravel(), (rows, nearest.ravel())),
+        shape=(destination_points.shape[0], source_points.shape[0]),
+    )
+
+
+def closest_points_on_triangles(points, corners):
+    """Get the closest points on triangles and their barycentric coordinates.
+
+    Vectorized version of the region tests in Real-Time Collision Detection
+    (Ericson, 5.1.5).  Arrays broadcast against each other so many points can be
+    tested against many triangles at once.
+
+    :param points: (..., 3) query points.
+    :param corners: (..., 3, 3) triangle corner positions.
+    :return: Tuple of the (..., 3) closest points and (..., 3) barycentric coordinates.
+    """
+    a, b, c = corners[..., 0, :], corners[..., 1, :], corners[..., 2, :]
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    bp = points - b
+    cp = points - c
+    d1 = np.sum(ab * ap, axis=-1)
+    d2 = np.sum(ac * ap, axis=-1)
+    d3 = np.sum(ab * bp, axis=-1)
+    d4 = np.sum(ac * bp, axis=-1)
+    d5 = np.sum(ab * cp, axis=-1)
+    d6 = np.sum(ac * cp, axis=-1)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Inside the face region
+        denominator = va + vb + vc
+        v = vb / denominator
+        w = vc / denominator
+        u = 1.0 - v - w
+
+        regions = [
+            # Vertex regions
+            (d1 <= 0) & (d2 <= 0),
+            (d3 >= 0) & (d4 <= d3),
+            (d6 >= 0) & (d5 <= d6),
+            # Edge regions
+            (vc <= 0) & (d1 >= 0) & (d3 <= 0),
+            (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+            (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0),
+        ]
+        t_ab = d1 / (d1 - d3)
+        t_ac = d2 / (d2 - d6)
+        t_bc = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+    zero = np.zeros_like(d1)
+    one = np.ones_like(d1)
+    coordinates = [
+        (one, zero, zero),
+        (zero, one, zero),
+        (zero, zero, one),
+        (1.0 - t_ab, t_ab, zero),
+        (1.0 - t_ac, zero, t_ac),
+        (zero, 1.0 - t_bc, t_bc),
+    ]
+    # Apply the regions in reverse so the earliest matching test wins
+    for region, (ru, rv, rw) in reversed(list(zip(regions, coordinates))):
+        u = np.where(region, ru, u)
+        v = np.where(region, rv, v)
+        w = np.where(region, rw, w)
+
+    # Degenerate triangles fall back to the first corner
+    invalid = ~np.isfinite(u) | ~np.isfinite(v) | ~np.isfinite(w)
+    u = np.where(invalid, 1.0, u)
+    v = np.where(invalid, 0.0, v)
+    w = np.where(invalid, 0.0, w)
+
+    barycentric = np.stack([u, v, w], axis=-1)
+    closest = (
+        a * u[..., np.newaxis] + b * v[..., np.newaxis] + c * w[..., np.newaxis]
+    )
+    return closest, barycentric
+
+
+def benchmark(source_vertex_count=50000, destination_vertex_count=100000, influences=60):
+    """Time both transfer methods on random points of a sphere.
+
+    :param source_vertex_count: Approximate number of source vertices.
+    :param destination_vertex_count: Number of destination points.
+    :param influences: Number of influences of the synthetic weights.
+    """
+    from ywta.utility.timing import Section
+
+    points, triangles = _sphere(int(np.sqrt(source_vertex_count)))
+    rng = np.random.default_rng(0)
+    matrix = np.zeros((points.shape[0], influences))
+    rows = np.repeat(np.arange(points.shape[0]), 4)
+    matrix[rows, rng.integers(0, influences, rows.shape[0])] = rng.random(
+        rows.shape[0]
+    )
+    matrix /= matrix.sum(axis=1)[:, np.newaxis]
+    weights = SparseWeights.from_dense(
+        matrix, ["joint{}".format(i) for i in range(influences)]
+    )
+    destination = rng.normal(size=(destination_vertex_count, 3))
+    destination /= np.linalg.norm(destination, axis=1)[:, np.newaxis]
+
+    workspace = "weight transfer {} -> {}".format(
+        points.shape[0], destination_vertex_count
+    )
+    with Section(workspace, CLOSEST_POINT):
+        transfer_weights(points, weights, destination, triangles)
+    with Section(workspace, INVERSE_DISTANCE):
+        transfer_weights(points, weights, destination, method=INVERSE_DISTANCE)
+    Section.print_timing()
+
+
+def _sphere(resolution):
+    """Create a UV sphere.
+
+    :param resolution: Number of rings and segments.
+    :return: Tuple of (N x 3) points and (T x 3) triangles.
+    """
+    theta, phi = np.meshgrid(
+        np.linspace(0.0, np.pi, resolution), np.linspace(0.0, 2.0 * np.pi, resolution)
+    )
+    points = np.stack(
+        [np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)],
+        axis=-1,
+    ).reshape(-1, 3)
+    index = np.arange(resolution * resolution).reshape(resolution, resolution)
+    quads = np.stack(
+        [index[:-1, :-1], index[1:, :-1], index[1:, 1:], index[:-1, 1:]], axis=-1
+    ).reshape(-1, 4)
+    triangles = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])
+    return points, triangles
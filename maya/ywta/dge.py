@@ -7,6 +7,50 @@ connectAttr commands, you can specify a string equation.
 No compiled plug-ins are used.  All created nodes are vanilla Maya nodes.  Each created
 node has notes added to it to describe its place in the equation
 
+Expressions are parsed once into an expression tree and cached by expression string, so
+calling dge many times with the same expression only binds the variables and creates the
+nodes.  The tree is optimized before any node is created: constant sub-expressions such
+as 2*PI are folded into values and identities such as x*1, x+0 and x^1 are removed.
+Numeric kwargs are folded in the same way.  An expression that folds to a constant
+returns the value instead of an attribute.
+
+Nodes, values and connections are queued in a single MDGModifier that is executed once
+per dge call and undone as a single step.  A dge_batch executes the networks of many dge
+calls at once.  The returned attributes can be used by dge calls within the batch and by
+any command once the batch is done::
+
+    with dge_batch():
+        length = dge("distance(a, b)", a=start, b=end)
+        dge("y = x / restLength", y="{}.sx".format(joint), x=length, restLength=4.0)
+
+Like connectAttr, connections between angle, linear and unitless attributes go through
+unitConversion nodes, so variables and assignments use the values in UI units.
+
+Functions without a dedicated node are lowered to the implementation with the lowest
+estimated cost among the node types of the running Maya version.  For example, sin uses
+the sin node of Maya 2024 or a unitConversion and an eulerToQuat node in older
+versions.  estimate returns the number of nodes and the cost of an expression without
+creating them.  Angles are in radians: the inverse functions return doubles in radians
+like evaluate instead of angle attributes, which connectAttr and getAttr would convert to
+the UI unit.  verify_lowerings compares the implementations of a Maya version with
+evaluate.
+
+Within a dge_session, sub-expressions with the same inputs are shared between dge calls
+instead of creating duplicate nodes::
+
+    with dge_session() as session:
+        build_arm()
+        build_leg()
+    # Prints the nodes saved and the node count and cost of each expression
+    session.report()
+
+The same expressions can be evaluated on numpy arrays without Maya with evaluate.  This
+is used to test rig math headless and to verify the created node networks::
+
+    x = np.linspace(0.0, 2.0, 1000)
+    y = evaluate("x > 1.0 ? 1.0 + exp(-x) : x", x=x)
+    error = verify("x > 1.0 ? 1.0 + exp(-x) : x", x=x)
+
 Example Usage
 =============
 
@@ -189,19 +233,267 @@ from pyparsing import (
     Optional,
     FollowedBy,
 )
-import maya.cmds as cmds
 import math
 import operator
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
 from six import string_types
 
+try:
+    import maya.cmds as cmds
+    import maya.api.OpenMaya as OpenMaya2
+except ImportError:
+    # Expressions can still be compiled and evaluated with evaluate outside of Maya
+    cmds = None
+    OpenMaya2 = None
+
 _parser = None
 
+# Number of compiled expressions kept by DGParser.compile
+COMPILE_CACHE_SIZE = 256
+
+# Node type: last number used to name the nodes created by DGModifier
+_name_counters = {}
+# (Node type, attribute): whether the attribute has 3 values
+_array_attributes = {}
+# (Node type, attribute): function setting a value in a MDGModifier
+_plug_setters = {}
+# (Node type, attribute): unit type of the attribute
+_unit_types = {}
+
+# Unit types of the attributes converted by DGModifier.connect
+ANGLE = "angle"
+LINEAR = "linear"
+NUMBER = "number"
+
+# Expressions of a two bone ik and soft ik build used by benchmark
+_BENCHMARK_EXPRESSIONS = [
+    "1.0 - ikFk",
+    "ikBlend = 1.0 - ikFk",
+    "max(x, 0.001)",
+    "x > (1.0 - softIk)"
+    "? (1.0 - softIk) + softIk * (1.0 - exp(-(x - (1.0 - softIk)) / softIk)) "
+    ": x",
+    "tx = restLength * lerp(softIk, lengthRatio, stretch)",
+    "lerp(1, lengthRatio / softIk, stretch)",
+    "1/sx",
+    "x = 2.5 * s",
+]
+
 
 def dge(expression, container=None, **kwargs):
+    return get_parser().eval(expression, container=container, **kwargs)
+
+
+def get_parser():
+    """Get the DGParser used by dge."""
     global _parser
     if _parser is None:
         _parser = DGParser()
-    return _parser.eval(expression, container=container, **kwargs)
+    return _parser
+
+
+def dge_batch():
+    """Create the nodes of all the dge calls in the block with a single MDGModifier.
+
+    The block is undone as a single step.  If the block raises an exception, the queued
+    nodes are not created.  Expressions with a container execute the queued nodes
+    right away to add them to the container, so those nodes and the nodes queued
+    before them are kept.
+
+    :return: Context manager yielding the DGModifier
+    """
+    return get_parser().batch()
+
+
+@contextmanager
+def dge_session():
+    """Share the nodes of common sub-expressions between the dge calls of a build.
+
+    Nodes are only shared within the same container.
+
+    :return: The DGSession collecting the node statistics
+    """
+    parser = get_parser()
+    previous = parser.session
+    parser.session = DGSession()
+    try:
+        yield parser.session
+    finally:
+        parser.session = previous
+
+
+class DGSession(object):
+    """Nodes created by the dge calls of a build session."""
+
+    def __init__(self):
+        # Operation key: (output attribute, number of nodes created)
+        self.results = {}
+        self.nodes_created = 0
+        self.nodes_shared = 0
+        self.operations_folded = 0
+        # (Expression, number of nodes, estimated evaluation cost) of each dge call
+        self.expressions = []
+
+    @property
+    def nodes_saved(self):
+        """Number of nodes that were not created thanks to sharing and folding."""
+        return self.nodes_shared + self.operations_folded
+
+    def get(self, key, exists):
+        """Get the output attribute of an operation created earlier in the session.
+
+        :param key: Operation key
+        :param exists: Function returning whether a node exists
+        :return: The output attribute or None if the operation was not created yet.
+        """
+        result = self.results.get(key)
+        if result is None:
+            return None
+        output, node_count = result
+        if not exists(output.split(".")[0]):
+            # The node was deleted since
+            del self.results[key]
+            return None
+        self.nodes_shared += node_count
+        return output
+
+    def add(self, key, output, node_count):
+        self.results[key] = (output, node_count)
+
+    def report(self):
+        """Print the node statistics of the session."""
+        print(
+            "dge created {} nodes and saved {} nodes "
+            "({} shared, {} folded or removed)".format(
+                self.nodes_created,
+                self.nodes_saved,
+                self.nodes_shared,
+                self.operations_folded,
+            )
+        )
+        for expression, node_count, cost in self.expressions:
+            print("  {:>3} nodes  cost {:>6.1f}  {}".format(node_count, cost, expression))
+
+
+def benchmark(iterations=20):
+    """Compare the cost of parsing dge expressions with the cost of creating the nodes.
+
+    The expressions of a two bone ik build are parsed, looked up in the compile cache
+    and evaluated on the attributes of a new transform.
+
+    :param iterations: Number of times each expression is processed.
+    """
+    from ywta.utility.timing import Section
+
+    parser = DGParser()
+    workspace = "dge {} expressions x {}".format(
+        len(_BENCHMARK_EXPRESSIONS), iterations
+    )
+    with Section(workspace, "parse"):
+        for _ in range(iterations):
+            parser.compiled.clear()
+            for expression in _BENCHMARK_EXPRESSIONS:
+                parser.compile(expression)
+    with Section(workspace, "cached compile"):
+        for _ in range(iterations):
+            for expression in _BENCHMARK_EXPRESSIONS:
+                parser.compile(expression)
+
+    node = cmds.createNode("transform", name="dge_benchmark#")
+    kwargs = {}
+    for expression in _BENCHMARK_EXPRESSIONS:
+        for variable in get_variables(parser.compile(expression)):
+            if variable not in kwargs:
+                cmds.addAttr(node, ln=variable, at="double", dv=0.5)
+                kwargs[variable] = "{}.{}".format(node, variable)
+    with Section(workspace, "create nodes"):
+        for _ in range(iterations):
+            for expression in _BENCHMARK_EXPRESSIONS:
+                parser.eval(expression, **kwargs)
+    with Section(workspace, "create nodes in one batch"):
+        with parser.batch():
+            for _ in range(iterations):
+                for expression in _BENCHMARK_EXPRESSIONS:
+                    parser.eval(expression, **kwargs)
+    Section.print_timing()
+
+
+def evaluate(expression, **kwargs):
+    """Evaluate an expression on numpy arrays instead of creating nodes.
+
+    The kwargs are numbers or arrays of samples that are broadcast against each other,
+    so thousands of samples are evaluated in a single call.  Maya is not required.
+
+    :param expression: Expression string
+    :param kwargs: Variable name: number or array of values.  distance takes (..., 4, 4)
+        matrices.
+    :return: Array of the expression values.  Assignments return the assigned values.
+    """
+    return NumpyEvaluator().eval(expression, **kwargs)
+
+
+def verify(expression, tolerance=1e-4, **kwargs):
+    """Compare the values of the node network of an expression with evaluate.
+
+    The network is created on new attributes of a transform and evaluated once per
+    sample by setting the attributes.  The transform and the network are deleted
+    afterwards.
+
+    :param expression: Expression string without assignment
+    :param tolerance: Largest allowed absolute difference
+    :param kwargs: Variable name: number or 1D array of samples.  Only scalar variables
+        are supported.
+    :return: The largest absolute difference between the network and evaluate.
+    """
+    values = {var: np.atleast_1d(value) for var, value in kwargs.items()}
+    samples = np.broadcast_arrays(*values.values())
+    values = dict(zip(values.keys(), samples))
+    expected = np.broadcast_to(evaluate(expression, **values), samples[0].shape)
+
+    node = cmds.createNode("transform", name="dge_verify#")
+    attributes = {}
+    for var in values:
+        cmds.addAttr(node, ln=var, at="double")
+        attributes[var] = "{}.{}".format(node, var)
+    existing = set(cmds.ls())
+    try:
+        output = dge(expression, **attributes)
+        result = np.empty(expected.shape)
+        for i in range(result.size):
+            for var, attribute in attributes.items():
+                cmds.setAttr(attribute, values[var][i])
+            result[i] = (
+                cmds.getAttr(output) if isinstance(output, string_types) else output
+            )
+    finally:
+        created = [n for n in cmds.ls() if n not in existing]
+        cmds.delete([node] + created)
+    error = float(np.max(np.abs(result - expected))) if result.size else 0.0
+    if error > tolerance:
+        raise RuntimeError(
+            "{} differs from the reference evaluation by {}".format(expression, error)
+        )
+    return error
+
+
+def get_variables(tree):
+    """Get the names of the variables used in a compiled expression tree.
+
+    :param tree: Expression tree from DGParser.compile
+    :return: List of variable names in order of appearance
+    """
+    if tree[0] == "variable":
+        return [tree[1]]
+    variables = []
+    children = tree[2] if tree[0] == "call" else tree[1:]
+    for child in children:
+        if isinstance(child, tuple):
+            for variable in get_variables(child):
+                if variable not in variables:
+                    variables.append(variable)
+    return variables
 
 
 class DGParser(object):
@@ -219,11 +511,22 @@ class DGParser(object):
         self.kwargs = {}
         self.expr_stack = []
         self.assignment_stack = []
+        self._reverse_kwargs = {}
         self.expression_string = None
         self.results = None
         self.container = None
         # Look up to optimize redundant nodes
         self.created_nodes = {}
+        # Compiled expression trees by expression string in least recently used order
+        self.compiled = OrderedDict()
+        # Active DGSession of dge_session
+        self.session = None
+        # Container the created nodes are shared in
+        self.scope = None
+        # Number of nodes created by the parser
+        self.node_count = 0
+        # DGModifier of the active batch
+        self.modifier = None
 
         self.opn = {
             "+": self.add,
@@ -303,6 +606,23 @@ class DGParser(object):
         self.bnf = assignment
 
     def eval(self, expression_string, container=None, **kwargs):
+        if self.modifier is None:
+            with self.batch():
+                return self.eval(expression_string, container=container, **kwargs)
+
+        tree, removed = self._compile(expression_string)
+        constants = {
+            var: value
+            for var, value in kwargs.items()
+            if not isinstance(value, string_types)
+        }
+        if constants:
+            # Fold the numeric kwargs into the expression
+            bound = optimize_tree(bind_variables(tree, constants))
+            removed += count_operations(tree) - count_operations(bound)
+            tree = bound
+        if self.session is not None:
+            self.session.operations_folded += removed
 
         long_kwargs = {}
         for var, value in kwargs.items():
@@ -314,32 +634,128 @@ class DGParser(object):
                 else:
                     # Turn all attribute names into long names for consistency with
                     # results in listConnections
-                    value = tokens[0]
-                    for t in tokens[1:]:
-                        attr = "{}.{}".format(value, t)
-                        value += ".{}".format(cmds.attributeName(attr, long=True))
+                    value = self.modifier.long_name(value)
             long_kwargs[var] = value
 
-        self.kwargs = long_kwargs
-        # Reverse variable look up to write cleaner notes
-        self._reverse_kwargs = {}
-        for k, v in self.kwargs.items():
-            self._reverse_kwargs[v] = k
-        self.expression_string = expression_string
-        self.expr_stack = []
-        self.assignment_stack = []
-        self.results = self.bnf.parseString(expression_string, True)
-        self.container = (
-            cmds.container(name=container, current=True) if container else None
+        # Functions such as abs and tan call dge recursively so restore the state of
+        # the calling expression when done
+        state = (
+            self.kwargs,
+            self._reverse_kwargs,
+            self.expression_string,
+            self.container,
+            self.created_nodes,
+            self.scope,
         )
-        self.created_nodes = {}
-        stack = self.expr_stack[:] + self.assignment_stack[:]
-        result = self.evaluate_stack(stack)
-
-        if self.container:
-            self.publish_container_attributes()
+        try:
+            self.kwargs = long_kwargs
+            # Reverse variable look up to write cleaner notes
+            self._reverse_kwargs = {}
+            for k, v in self.kwargs.items():
+                self._reverse_kwargs[v] = k
+            self.expression_string = expression_string
+            self.container = (
+                cmds.container(name=container, current=True) if container else None
+            )
+            if self.container:
+                self.scope = self.container
+            self.created_nodes = {}
+            first_node = len(self.modifier.nodes)
+            result = self.evaluate(tree)
+            if self.session is not None and state[2] is None:
+                # Nodes of nested expressions are part of the calling expression
+                node_types = [
+                    self.modifier.node_types[node]
+                    for node in list(self.modifier.nodes)[first_node:]
+                ]
+                self.session.expressions.append(
+                    (expression_string, len(node_types), get_cost(node_types))
+                )
+
+            if self.container:
+                # The nodes need to exist to be added to the container
+                self.modifier.execute()
+                nodes = list(self.modifier.nodes)[first_node:]
+                if nodes:
+                    cmds.container(self.container, e=True, addNode=nodes, force=True)
+                self.publish_container_attributes()
+        finally:
+            (
+                self.kwargs,
+                self._reverse_kwargs,
+                self.expression_string,
+                self.container,
+                self.created_nodes,
+                self.scope,
+            ) = state
         return result
 
+    @contextmanager
+    def batch(self):
+        """Queue the nodes of all the evals in the block in a single DGModifier.
+
+        The modifier is executed at the end of the block and undone as a single step.
+        Nested batches are part of the outermost batch.
+
+        :return: Context manager yielding the DGModifier
+        """
+        if self.modifier is not None:
+            yield self.modifier
+            return
+        self.modifier = DGModifier()
+        cmds.undoInfo(openChunk=True)
+        try:
+            yield self.modifier
+            self.modifier.execute()
+        finally:
+            self.modifier = None
+            cmds.undoInfo(closeChunk=True)
+
+    def compile(self, expression_string):
+        """Compile an expression into an expression tree.
+
+        The grammar only runs the first time an expression is seen.  Compiled trees are
+        cached by expression string so later calls only bind the kwargs and create the
+        nodes.
+
+        Tree nodes are tuples starting with the operation:
+
+            ("number", value)
+            ("variable", name)
+            ("unary -", operand)
+            (op, operand1, operand2) where op is one of + - * / ^
+            ("?", first_term, condition_index, second_term, if_true, if_false)
+            ("call", function_name, (arguments, ...))
+            ("=", ("variable", name), source)
+
+        The returned tree is optimized with optimize_tree.
+
+        :param expression_string: Expression
+        :return: The expression tree
+        """
+        return self._compile(expression_string)[0]
+
+    def _compile(self, expression_string):
+        """Compile an expression.
+
+        :param expression_string: Expression
+        :return: Tuple of the optimized expression tree and the number of operations
+            removed by the optimization.
+        """
+        compiled = self.compiled.pop(expression_string, None)
+        if compiled is None:
+            self.expr_stack = []
+            self.assignment_stack = []
+            self.results = self.bnf.parseString(expression_string, True)
+            stack = self.expr_stack[:] + self.assignment_stack[:]
+            tree = self.build_tree(stack)
+            optimized = optimize_tree(tree)
+            compiled = (optimized, count_operations(tree) - count_operations(optimized))
+            while len(self.compiled) >= COMPILE_CACHE_SIZE:
+                self.compiled.popitem(last=False)
+        self.compiled[expression_string] = compiled
+        return compiled
+
     def push_first(self, toks):
         self.expr_stack.append(toks[0])
 
@@ -354,20 +770,79 @@ class DGParser(object):
             else:
                 break
 
-    def evaluate_stack(self, s):
+    def build_tree(self, s):
+        """Build the expression tree from the postfix stack of the parser.
+
+        :param s: Postfix stack
+        :return: The expression tree
+        """
         op, num_args = s.pop(), 0
         if isinstance(op, tuple):
             op, num_args = op
         if op == "unary -":
-            op1 = self.evaluate_stack(s)
-            return self.get_op_result(op, self.multiply, -1, op1)
+            return (op, self.build_tree(s))
         elif op == "?":
             # ternary
-            if_false = self.evaluate_stack(s)
-            if_true = self.evaluate_stack(s)
-            condition = self.evaluate_stack(s)
-            second_term = self.evaluate_stack(s)
-            first_term = self.evaluate_stack(s)
+            if_false = self.build_tree(s)
+            if_true = self.build_tree(s)
+            condition = self.conditionals.index(s.pop())
+            second_term = self.build_tree(s)
+            first_term = self.build_tree(s)
+            return (op, first_term, condition, second_term, if_true, if_false)
+        elif op == ":":
+            # Return the if_true statement to the ternary
+            return self.build_tree(s)
+        elif op in self.opn:
+            # operands are pushed onto the stack in reverse order
+            op2 = self.build_tree(s)
+            op1 = self.build_tree(s)
+            return (op, op1, op2)
+        elif op == "PI":
+            return ("number", math.pi)
+        elif op == "E":
+            return ("number", math.e)
+        elif num_args:
+            if op not in self.fn:
+                raise Exception("invalid function '%s'" % op)
+            # args are pushed onto the stack in reverse order
+            args = reversed([self.build_tree(s) for _ in range(num_args)])
+            return ("call", op, tuple(args))
+        elif op[0].isalpha():
+            return ("variable", op)
+        elif op == "=":
+            destination = self.build_tree(s)
+            source = self.build_tree(s)
+            return (op, destination, source)
+        else:
+            # try to evaluate as int first, then as float if int fails
+            try:
+                return ("number", int(op))
+            except ValueError:
+                return ("number", float(op))
+
+    def evaluate(self, tree):
+        """Create the nodes of a compiled expression tree.
+
+        :param tree: Expression tree from compile
+        :return: The output attribute or value of the expression
+        """
+        op = tree[0]
+        if op == "number":
+            return tree[1]
+        elif op == "variable":
+            value = self.kwargs.get(tree[1])
+            if value is None:
+                raise Exception("invalid identifier '%s'" % tree[1])
+            return value
+        elif op == "unary -":
+            op1 = self.evaluate(tree[1])
+            return self.get_op_result(op, self.multiply, -1, op1)
+        elif op == "?":
+            first_term = self.evaluate(tree[1])
+            condition = tree[2]
+            second_term = self.evaluate(tree[3])
+            if_true = self.evaluate(tree[4])
+            if_false = self.evaluate(tree[5])
             note = "{} {} {} ? {} : {}".format(
                 first_term, self.conditionals[condition], second_term, if_true, if_false
             )
@@ -382,51 +857,49 @@ class DGParser(object):
                 if_false,
                 op_str=note,
             )
-        elif op == ":":
-            # Return the if_true statement to the ternary
-            return self.evaluate_stack(s)
-        elif op in "+-*/^":
-            # operands are pushed onto the stack in reverse order
-            op2 = self.evaluate_stack(s)
-            op1 = self.evaluate_stack(s)
-
+        elif op in self.opn:
+            op1 = self.evaluate(tree[1])
+            op2 = self.evaluate(tree[2])
             return self.get_op_result(op, self.opn[op], op1, op2)
-        elif op == "PI":
-            return math.pi
-        elif op == "E":
-            return math.e
-        elif op in self.fn:
-            # args are pushed onto the stack in reverse order
-            args = reversed([self.evaluate_stack(s) for _ in range(num_args)])
-            args = list(args)
-            return self.get_op_result(op, self.fn[op], *args)
-        elif op[0].isalpha():
-            value = self.kwargs.get(op)
-            if value is None:
-                raise Exception("invalid identifier '%s'" % op)
-            return value
-        elif op in self.conditionals:
-            return self.conditionals.index(op)
+        elif op == "call":
+            args = [self.evaluate(arg) for arg in tree[2]]
+            return self.get_op_result(tree[1], self.fn[tree[1]], *args)
         elif op == "=":
-            destination = self.evaluate_stack(s)
-            source = self.evaluate_stack(s)
-            cmds.connectAttr(source, destination, f=True)
-        else:
-            # try to evaluate as int first, then as float if int fails
-            try:
-                return int(op)
-            except ValueError:
-                return float(op)
+            destination = self.evaluate(tree[1])
+            source = self.evaluate(tree[2])
+            if isinstance(source, string_types):
+                self.modifier.connect(source, destination)
+            else:
+                # The expression was folded into a constant
+                self.modifier.set_value(destination, source)
 
     def get_op_result(self, op, func, *args, **kwargs):
         op_str = kwargs.get("op_str", self.op_str(op, *args))
-        result = self.created_nodes.get(op_str)
+        # Operations with the same bound inputs create the same nodes
+        key = (func.__name__, self.scope) + args
+        result = self.created_nodes.get(key)
+        if result is None and self.session is not None:
+            result = self.session.get(key, self.modifier.exists)
         if result is None:
+            node_count = self.node_count
             result = func(*args)
-            self.created_nodes[op_str] = result
+            if self.session is not None:
+                self.session.add(key, result, self.node_count - node_count)
             self.add_notes(result, op_str)
+        self.created_nodes[key] = result
         return result
 
+    def create_node(self, node_type):
+        """Create a node of the network.
+
+        :param node_type: Node type
+        :return: The node name
+        """
+        self.node_count += 1
+        if self.session is not None:
+            self.session.nodes_created += 1
+        return self.modifier.create_node(node_type)
+
     def add(self, v1, v2):
         return self._connect_plus_minus_average(1, v1, v2)
 
@@ -434,36 +907,36 @@ class DGParser(object):
         return self._connect_plus_minus_average(2, v1, v2)
 
     def _connect_plus_minus_average(self, operation, v1, v2):
-        pma = cmds.createNode("plusMinusAverage")
-        cmds.setAttr("{}.operation".format(pma), operation)
+        pma = self.create_node("plusMinusAverage")
+        self.modifier.set_value("{}.operation".format(pma), operation)
         in_attr = "input1D"
         out_attr = "output1D"
         # Determine whether we should use 1D or 3D attributes
         for v in [v1, v2]:
-            if isinstance(v, string_types) and attribute_is_array(v):
+            if isinstance(v, string_types) and self.modifier.is_array(v):
                 in_attr = "input3D"
                 out_attr = "output3D"
 
         for i, v in enumerate([v1, v2]):
             if isinstance(v, string_types):
-                if attribute_is_array(v):
-                    cmds.connectAttr(v, "{}.{}[{}]".format(pma, in_attr, i))
+                if self.modifier.is_array(v):
+                    self.modifier.connect(v, "{}.{}[{}]".format(pma, in_attr, i))
                 else:
                     if in_attr == "input3D":
                         for x in "xyz":
-                            cmds.connectAttr(
+                            self.modifier.connect(
                                 v, "{}.{}[{}].input3D{}".format(pma, in_attr, i, x)
                             )
                     else:
-                        cmds.connectAttr(v, "{}.{}[{}]".format(pma, in_attr, i))
+                        self.modifier.connect(v, "{}.{}[{}]".format(pma, in_attr, i))
             else:
                 if in_attr == "input3D":
                     for x in "xyz":
-                        cmds.setAttr(
+                        self.modifier.set_value(
                             "{}.{}[{}].input3D{}".format(pma, in_attr, i, x), v
                         )
                 else:
-                    cmds.setAttr("{}.{}[{}]".format(pma, in_attr, i), v)
+                    self.modifier.set_value("{}.{}[{}]".format(pma, in_attr, i), v)
         return "{}.{}".format(pma, out_attr)
 
     def multiply(self, v1, v2):
@@ -482,59 +955,59 @@ class DGParser(object):
         return self._connect_multiply_divide(3, x, 0.5)
 
     def _connect_multiply_divide(self, operation, v1, v2):
-        mdn = cmds.createNode("multiplyDivide")
-        cmds.setAttr("{}.operation".format(mdn), operation)
+        mdn = self.create_node("multiplyDivide")
+        self.modifier.set_value("{}.operation".format(mdn), operation)
         value_count = 1
         # Determine whether we should use 1D or 3D attributes
         for v in [v1, v2]:
-            if isinstance(v, string_types) and attribute_is_array(v):
+            if isinstance(v, string_types) and self.modifier.is_array(v):
                 value_count = 3
 
         for i, v in enumerate([v1, v2]):
             i += 1
             if isinstance(v, string_types):
-                if attribute_is_array(v):
-                    cmds.connectAttr(v, "{}.input{}".format(mdn, i))
+                if self.modifier.is_array(v):
+                    self.modifier.connect(v, "{}.input{}".format(mdn, i))
                 else:
                     if value_count == 3:
                         for x in "XYZ":
-                            cmds.connectAttr(v, "{}.input{}{}".format(mdn, i, x))
+                            self.modifier.connect(v, "{}.input{}{}".format(mdn, i, x))
                     else:
-                        cmds.connectAttr(v, "{}.input{}X".format(mdn, i))
+                        self.modifier.connect(v, "{}.input{}X".format(mdn, i))
             else:
                 if value_count == 3:
                     for x in "XYZ":
-                        cmds.setAttr("{}.input{}{}".format(mdn, i, x), v)
+                        self.modifier.set_value("{}.input{}{}".format(mdn, i, x), v)
                 else:
-                    cmds.setAttr("{}.input{}X".format(mdn, i), v)
+                    self.modifier.set_value("{}.input{}X".format(mdn, i), v)
         return "{}.output".format(mdn) if value_count == 3 else "{}.outputX".format(mdn)
 
     def clamp(self, value, min_value, max_value):
-        clamp = cmds.createNode("clamp")
+        clamp = self.create_node("clamp")
 
         for v, attr in [[min_value, "min"], [max_value, "max"]]:
             if isinstance(v, string_types):
-                if attribute_is_array(v):
-                    cmds.connectAttr(v, "{}.{}".format(clamp, attr))
+                if self.modifier.is_array(v):
+                    self.modifier.connect(v, "{}.{}".format(clamp, attr))
                 else:
                     for x in "RGB":
-                        cmds.connectAttr(v, "{}.{}{}".format(clamp, attr, x))
+                        self.modifier.connect(v, "{}.{}{}".format(clamp, attr, x))
             else:
                 for x in "RGB":
-                    cmds.setAttr("{}.{}{}".format(clamp, attr, x), v)
+                    self.modifier.set_value("{}.{}{}".format(clamp, attr, x), v)
 
         value_count = 1
         if isinstance(value, string_types):
-            if attribute_is_array(value):
+            if self.modifier.is_array(value):
                 value_count = 3
-                cmds.connectAttr(value, "{}.input".format(clamp))
+                self.modifier.connect(value, "{}.input".format(clamp))
             else:
                 for x in "RGB":
-                    cmds.connectAttr(value, "{}.input{}".format(clamp, x))
+                    self.modifier.connect(value, "{}.input{}".format(clamp, x))
         else:
             # Unlikely for a static value to be clamped, but it should still work
             for x in "RGB":
-                cmds.setAttr("{}.input{}".format(clamp, x), value)
+                self.modifier.set_value("{}.input{}".format(clamp, x), value)
         return (
             "{}.output".format(clamp)
             if value_count == 3
@@ -542,26 +1015,26 @@ class DGParser(object):
         )
 
     def condition(self, first_term, second_term, operation, if_true, if_false):
-        node = cmds.createNode("condition")
-        cmds.setAttr("{}.operation".format(node), operation)
+        node = self.create_node("condition")
+        self.modifier.set_value("{}.operation".format(node), operation)
 
         for v, attr in [[first_term, "firstTerm"], [second_term, "secondTerm"]]:
             if isinstance(v, string_types):
-                cmds.connectAttr(v, "{}.{}".format(node, attr))
+                self.modifier.connect(v, "{}.{}".format(node, attr))
             else:
-                cmds.setAttr("{}.{}".format(node, attr), v)
+                self.modifier.set_value("{}.{}".format(node, attr), v)
 
         value_count = 1
         for v, attr in [[if_true, "colorIfTrue"], [if_false, "colorIfFalse"]]:
             if isinstance(v, string_types):
-                if attribute_is_array(v):
+                if self.modifier.is_array(v):
                     value_count = 3
-                    cmds.connectAttr(v, "{}.{}".format(node, attr))
+                    self.modifier.connect(v, "{}.{}".format(node, attr))
                 else:
                     for x in "RGB":
-                        cmds.connectAttr(v, "{}.{}{}".format(node, attr, x))
+                        self.modifier.connect(v, "{}.{}{}".format(node, attr, x))
             else:
-                cmds.setAttr("{}.{}R".format(node, attr), v)
+                self.modifier.set_value("{}.{}R".format(node, attr), v)
         return (
             "{}.outColor".format(node)
             if value_count == 3
@@ -569,24 +1042,24 @@ class DGParser(object):
         )
 
     def lerp(self, a, b, t):
-        node = cmds.createNode("blendTwoAttr")
+        node = self.create_node("blendTwoAttr")
 
         if isinstance(t, string_types):
-            cmds.connectAttr(t, "{}.attributesBlender".format(node))
+            self.modifier.connect(t, "{}.attributesBlender".format(node))
         else:
             # Static value on attributesBlender doesn't make much sense
             # but we don't want to error out
-            cmds.setAttr("{}.attributesBlender".format(node), t)
+            self.modifier.set_value("{}.attributesBlender".format(node), t)
 
         for i, v in enumerate([a, b]):
             if isinstance(v, string_types):
-                cmds.connectAttr(v, "{}.input[{}]".format(node, i))
+                self.modifier.connect(v, "{}.input[{}]".format(node, i))
             else:
-                cmds.setAttr("{}.input[{}]".format(node, i), v)
+                self.modifier.set_value("{}.input[{}]".format(node, i), v)
         return "{}.output".format(node)
 
     def abs(self, x):
-        return dge("x > 0 ? x : -x", x=x)
+        return self.lower("abs", x)
 
     def min(self, x, y):
         return self.condition(x, y, self.conditionals.index("<="), x, y)
@@ -595,91 +1068,190 @@ class DGParser(object):
         return self.condition(x, y, self.conditionals.index(">="), x, y)
 
     def sin(self, x):
-        return self._euler_to_quat(x, "X")
+        return self.lower("sin", x)
 
     def cos(self, x):
-        return self._euler_to_quat(x, "W")
-
-    def _euler_to_quat(self, x, attr):
-        cmds.loadPlugin("quatNodes", qt=False)
-        mdl = cmds.createNode("multDoubleLinear")
-        cmds.setAttr("{}.input1".format(mdl), 2 * 57.2958)  # To degrees
-        if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.input2".format(mdl))
-        else:
-            cmds.setAttr("{}.input2".format(mdl), x)
-        quat = cmds.createNode("eulerToQuat")
-        cmds.connectAttr("{}.output".format(mdl), "{}.inputRotateX".format(quat))
-        return "{}.outputQuat.outputQuat{}".format(quat, attr)
+        return self.lower("cos", x)
 
     def tan(self, x):
-        half_pi = math.pi * 0.5
-        c = dge("{} - x".format(half_pi), x=x)
-        return dge("sin(x) / sin(c)", x=x, c=c)
+        return self.lower("tan", x)
 
     def acos(self, x):
-        angle = cmds.createNode("angleBetween")
-        for attr in ["{}{}".format(i, j) for i in [1, 2] for j in "XYZ"]:
-            cmds.setAttr("{}.vector{}".format(angle, attr), 0)
-
-        if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.vector1X".format(angle))
-            dge("y = x == 0.0 ? 1.0 : abs(x)", y="{}.vector2X".format(angle), x=x)
-        else:
-            cmds.setAttr("{}.vector1X".format(angle), x)
-            cmds.setAttr("{}.vector2X".format(angle), math.fabs(x))
-        dge("y = sqrt(1.0 - x*x)", y="{}.vector1Y".format(angle), x=x)
-        return "{}.axisAngle.angle".format(angle)
+        return self.lower("acos", x)
 
     def asin(self, x):
-        angle = cmds.createNode("angleBetween")
-        for attr in ["{}{}".format(i, j) for i in [1, 2] for j in "XYZ"]:
-            cmds.setAttr("{}.vector{}".format(angle, attr), 0)
-
-        if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.vector1Y".format(angle))
-        else:
-            cmds.setAttr("{}.vector1Y".format(angle), x)
-        result = dge("sqrt(1.0 - x*x)", x=x)
-        cmds.connectAttr(result, "{}.vector1X".format(angle))
-        dge("y=abs(x) == 1.0 ? 1.0 : r", y="{}.vector2X".format(angle), x=x, r=result)
-        return dge("x < 0 ? -y : y", x=x, y="{}.axisAngle.angle".format(angle))
+        return self.lower("asin", x)
 
     def atan(self, x):
-        angle = cmds.createNode("angleBetween")
-        for attr in ["{}{}".format(i, j) for i in [1, 2] for j in "XYZ"]:
-            cmds.setAttr("{}.vector{}".format(angle, attr), 0)
-        cmds.setAttr("{}.vector1X".format(angle), 1)
-        cmds.setAttr("{}.vector2X".format(angle), 1)
-
-        if isinstance(x, string_types):
-            cmds.connectAttr(x, "{}.vector1Y".format(angle))
+        return self.lower("atan", x)
+
+    def lower(self, function, *args):
+        """Create the cheapest available node implementation of a function.
+
+        :param function: Function name in LOWERINGS
+        :param args: Function arguments
+        :return: The output attribute
+        """
+        implementation = choose_lowering(function, available_node_types())[0]
+        return getattr(self, implementation)(*args)
+
+    def _math_node(self, node_type, x, angle_output=False):
+        """Create one of the unary math nodes of Maya 2024.
+
+        :param node_type: Node type
+        :param x: Input attribute or value
+        :param angle_output: True for the inverse functions, whose output goes through
+            _to_radians.  LOWERINGS lists the unitConversion node of those.
+        :return: The output attribute
+        """
+        node = self.create_node(node_type)
+        # The input is a number in radians like the other implementations even if the
+        # node takes an angle
+        self._set_input(x, "{}.input".format(node), destination_unit=NUMBER)
+        output = "{}.output".format(node)
+        if angle_output:
+            output = self._to_radians(output)
+        return output
+
+    def _to_radians(self, angle):
+        """Get a double attribute with the value of an angle attribute in radians.
+
+        The internal value is passed on unchanged, so outputs that are already doubles
+        in radians are kept as they are.
+
+        :param angle: Angle attribute
+        :return: The output attribute of a unitConversion node
+        """
+        conversion = self.create_node("unitConversion")
+        self.modifier.set_value("{}.conversionFactor".format(conversion), 1.0)
+        self.modifier.connect(
+            angle, "{}.input".format(conversion), convert_units=False
+        )
+        return "{}.output".format(conversion)
+
+    def _set_input(self, value, attribute, **kwargs):
+        if isinstance(value, string_types):
+            self.modifier.connect(value, attribute, **kwargs)
         else:
-            cmds.setAttr("{}.vector1Y".format(angle), x)
-        return dge("x < 0 ? -y : y", x=x, y="{}.axisAngle.angle".format(angle))
+            self.modifier.set_value(attribute, value)
+
+    def _abs_node(self, x):
+        return self._math_node("absolute", x)
+
+    def _abs_condition(self, x):
+        return self.eval("x > 0 ? x : -x", x=x)
+
+    def _sin_node(self, x):
+        return self._math_node("sin", x)
+
+    def _cos_node(self, x):
+        return self._math_node("cos", x)
+
+    def _tan_node(self, x):
+        return self._math_node("tan", x)
+
+    def _sin_quat(self, x):
+        return "{}.outputQuat.outputQuatX".format(self._half_angle_quat(x))
+
+    def _cos_quat(self, x):
+        return "{}.outputQuat.outputQuatW".format(self._half_angle_quat(x))
+
+    def _tan_quat(self, x):
+        quat = self._half_angle_quat(x)
+        return self.eval(
+            "s / c",
+            s="{}.outputQuat.outputQuatX".format(quat),
+            c="{}.outputQuat.outputQuatW".format(quat),
+        )
+
+    def _half_angle_quat(self, x):
+        """Get the eulerToQuat node of a rotation of 2x around X.
+
+        The x and w values of the quaternion are sin(x) and cos(x).  sin, cos and tan
+        of the same value share the node.
+        """
+        return self.get_op_result(
+            "eulerToQuat",
+            self._euler_to_quat,
+            x,
+            op_str="eulerToQuat(2 * {})".format(self._reverse_kwargs.get(x, x)),
+        )
+
+    def _euler_to_quat(self, x):
+        self.modifier.load_plugin("quatNodes")
+        # The number x is doubled into the internal value of inputRotateX, which is in
+        # radians regardless of the UI unit
+        conversion = self.create_node("unitConversion")
+        self.modifier.set_value("{}.conversionFactor".format(conversion), 2.0)
+        self._set_input(x, "{}.input".format(conversion), destination_unit=NUMBER)
+        quat = self.create_node("eulerToQuat")
+        self.modifier.connect(
+            "{}.output".format(conversion),
+            "{}.inputRotateX".format(quat),
+            convert_units=False,
+        )
+        return quat
+
+    def _acos_node(self, x):
+        return self._math_node("acos", x, angle_output=True)
+
+    def _asin_node(self, x):
+        return self._math_node("asin", x, angle_output=True)
+
+    def _atan_node(self, x):
+        return self._math_node("atan", x, angle_output=True)
+
+    def _angle_between(self, vector_x, vector_y):
+        """Create an angleBetween node rotating the X axis onto (vector_x, vector_y, 0).
+
+        :return: The angleBetween node
+        """
+        node = self.create_node("angleBetween")
+        for attr, value in [
+            ("vector1X", 1.0),
+            ("vector1Y", 0.0),
+            ("vector1Z", 0.0),
+            ("vector2Z", 0.0),
+        ]:
+            self.modifier.set_value("{}.{}".format(node, attr), value)
+        self._set_input(vector_x, "{}.vector2X".format(node))
+        self._set_input(vector_y, "{}.vector2Y".format(node))
+        return node
+
+    def _acos_angle_between(self, x):
+        # The angle between the X axis and the unit vector (x, sqrt(1 - x^2)) in [0, PI]
+        node = self._angle_between(x, self.eval("sqrt(1.0 - x*x)", x=x))
+        return self._to_radians("{}.axisAngle.angle".format(node))
+
+    def _asin_angle_between(self, x):
+        # The signed Z rotation to the unit vector (sqrt(1 - x^2), x)
+        node = self._angle_between(self.eval("sqrt(1.0 - x*x)", x=x), x)
+        return self._to_radians("{}.euler.eulerZ".format(node))
+
+    def _atan_angle_between(self, x):
+        # The signed Z rotation to the vector (1, x)
+        node = self._angle_between(1.0, x)
+        return self._to_radians("{}.euler.eulerZ".format(node))
 
     def distance(self, node1, node2):
-        distance_between = cmds.createNode("distanceBetween")
-        cmds.connectAttr(node1, "{}.inMatrix1".format(distance_between))
-        cmds.connectAttr(node2, "{}.inMatrix2".format(distance_between))
+        distance_between = self.create_node("distanceBetween")
+        self.modifier.connect(node1, "{}.inMatrix1".format(distance_between))
+        self.modifier.connect(node2, "{}.inMatrix2".format(distance_between))
         return "{}.distance".format(distance_between)
 
     def add_notes(self, node, op_str):
         node = node.split(".")[0]
-        attrs = cmds.listAttr(node, ud=True) or []
-        if "notes" not in attrs:
-            cmds.addAttr(node, ln="notes", dt="string")
-        keys = self.kwargs.keys()
-        keys.sort()
+        keys = sorted(self.kwargs.keys())
         notes = "Node generated by dge\n\nExpression:\n  {}\n\nOperation:\n  {}\n\nkwargs:\n  {}".format(
             self.expression_string,
             op_str,
             "\n  ".join(["{}: {}".format(x, self.kwargs[x]) for x in keys]),
         )
-        cmds.setAttr("{}.notes".format(node), notes, type="string")
+        self.modifier.notes[node] = notes
 
     def publish_container_attributes(self):
         self.add_notes(self.container, self.expression_string)
+        self.modifier.execute()
         external_connections = cmds.container(
             self.container, q=True, connectionList=True
         )
@@ -734,9 +1306,406 @@ class DGParser(object):
         return op
 
 
-def attribute_is_array(value):
-    array_types = ["double3", "float3"]
-    return attribute_type(value) in array_types
+class NumpyEvaluator(object):
+    """Evaluates expression trees on numpy arrays.
+
+    Each operation matches the values of the nodes created by DGParser.
+    """
+
+    def __init__(self):
+        self.kwargs = {}
+        self.opn = {
+            "+": np.add,
+            "-": np.subtract,
+            "*": np.multiply,
+            "/": np.divide,
+            "^": np.power,
+        }
+        self.fn = {
+            "abs": np.abs,
+            "exp": np.exp,
+            "clamp": self.clamp,
+            "lerp": self.lerp,
+            "min": np.minimum,
+            "max": np.maximum,
+            "sqrt": np.sqrt,
+            "cos": np.cos,
+            "sin": np.sin,
+            "tan": np.tan,
+            "acos": np.arccos,
+            "asin": np.arcsin,
+            "atan": np.arctan,
+            "distance": self.distance,
+        }
+
+    def eval(self, expression_string, **kwargs):
+        tree = get_parser().compile(expression_string)
+        self.kwargs = {
+            var: np.asarray(value, dtype=np.float64) for var, value in kwargs.items()
+        }
+        # Out of domain values such as sqrt(-1) result in nan like the math would
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.asarray(self.evaluate(tree), dtype=np.float64)
+
+    def evaluate(self, tree):
+        """Evaluate an expression tree.
+
+        :param tree: Expression tree from DGParser.compile
+        :return: The values of the expression
+        """
+        op = tree[0]
+        if op == "number":
+            return tree[1]
+        elif op == "variable":
+            value = self.kwargs.get(tree[1])
+            if value is None:
+                raise Exception("invalid identifier '%s'" % tree[1])
+            return value
+        elif op == "unary -":
+            return np.negative(self.evaluate(tree[1]))
+        elif op == "?":
+            condition = _CONDITIONAL_FUNCTIONS[tree[2]]
+            return np.where(
+                condition(self.evaluate(tree[1]), self.evaluate(tree[3])),
+                self.evaluate(tree[4]),
+                self.evaluate(tree[5]),
+            )
+        elif op in self.opn:
+            return self.opn[op](self.evaluate(tree[1]), self.evaluate(tree[2]))
+        elif op == "call":
+            args = [self.evaluate(arg) for arg in tree[2]]
+            return self.fn[tree[1]](*args)
+        elif op == "=":
+            return self.evaluate(tree[2])
+        raise Exception("invalid operation '%s'" % op)
+
+    def clamp(self, value, min_value, max_value):
+        return np.minimum(np.maximum(value, min_value), max_value)
+
+    def lerp(self, a, b, t):
+        return a + np.subtract(b, a) * t
+
+    def distance(self, matrix1, matrix2):
+        matrix1 = np.asarray(matrix1, dtype=np.float64)
+        matrix2 = np.asarray(matrix2, dtype=np.float64)
+        return np.linalg.norm(matrix1[..., 3, :3] - matrix2[..., 3, :3], axis=-1)
+
+
+class DGModifier(object):
+    """Queues the nodes, values and connections of dge networks in a MDGModifier.
+
+    Nodes are named when they are queued so the attributes of a network can be used by
+    other networks before the modifier is executed.  Attribute lookups are cached per
+    node type and attribute.
+    """
+
+    def __init__(self):
+        self.modifier = OpenMaya2.MDGModifier()
+        # Node name: MObject of the nodes created by the modifier
+        self.nodes = OrderedDict()
+        self.node_types = {}
+        # Node name: notes set when the modifier is executed
+        self.notes = OrderedDict()
+        self.plugins = set()
+        # (Source attribute, factor): output of the unitConversion node
+        self.conversions = {}
+
+    def create_node(self, node_type):
+        """Queue the creation of a node.
+
+        :param node_type: Node type
+        :return: The name the node will have
+        """
+        mobject = self.modifier.createNode(node_type)
+        name = self._unique_name(node_type)
+        self.modifier.renameNode(mobject, name)
+        self.nodes[name] = mobject
+        self.node_types[name] = node_type
+        return name
+
+    def _unique_name(self, node_type):
+        while True:
+            count = _name_counters.get(node_type, 0) + 1
+            _name_counters[node_type] = count
+            name = "{}{}".format(node_type, count)
+            if not self.exists(name):
+                return name
+
+    def exists(self, node):
+        """Get whether a node exists or is queued in the modifier.
+
+        :param node: Node name
+        :return: True if the node exists
+        """
+        if node in self.nodes:
+            return True
+        try:
+            get_mobject(node)
+        except RuntimeError:
+            return False
+        return True
+
+    def get_mobject(self, node):
+        mobject = self.nodes.get(node)
+        return get_mobject(node) if mobject is None else mobject
+
+    def node_type(self, node):
+        node_type = self.node_types.get(node)
+        if node_type is None:
+            node_type = OpenMaya2.MFnDependencyNode(get_mobject(node)).typeName
+        return node_type
+
+    def get_plug(self, attribute):
+        """Get the MPlug of an attribute of an existing or queued node.
+
+        :param attribute: Attribute such as node.input3D[0].input3Dx
+        :return: MPlug
+        """
+        node, _, path = attribute.partition(".")
+        fn_node = OpenMaya2.MFnDependencyNode(self.get_mobject(node))
+        plug = None
+        for token in path.split("."):
+            name, _, index = token.partition("[")
+            if plug is None:
+                plug = fn_node.findPlug(name, False)
+            else:
+                plug = plug.child(fn_node.attribute(name))
+            if index:
+                plug = plug.elementByLogicalIndex(int(index[:-1]))
+        return plug
+
+    def long_name(self, attribute):
+        """Get an attribute with the long names of each attribute of its path.
+
+        :param attribute: Attribute such as node.t
+        :return: The attribute with long names such as node.translate
+        """
+        node, _, path = attribute.partition(".")
+        fn_node = OpenMaya2.MFnDependencyNode(self.get_mobject(node))
+        tokens = [node]
+        for token in path.split("."):
+            name, bracket, index = token.partition("[")
+            mobject = fn_node.attribute(name)
+            if mobject.isNull():
+                raise RuntimeError("{} has no attribute {}".format(node, name))
+            tokens.append(OpenMaya2.MFnAttribute(mobject).name + bracket + index)
+        return ".".join(tokens)
+
+    def is_array(self, attribute):
+        """Get whether an attribute has 3 values such as a double3 or float3.
+
+        :param attribute: Attribute name
+        :return: True if the attribute has 3 values
+        """
+        node, _, path = attribute.partition(".")
+        key = (self.node_type(node), path)
+        result = _array_attributes.get(key)
+        if result is None:
+            plug = self.get_plug(attribute)
+            result = plug.isCompound and not plug.isArray and plug.numChildren() == 3
+            if not plug.isDynamic:
+                _array_attributes[key] = result
+        return result
+
+    def unit_type(self, attribute):
+        """Get the unit type of an attribute.
+
+        :param attribute: Attribute name
+        :return: ANGLE, LINEAR or NUMBER, or None for attributes without units such as
+            matrices and generic attributes.  Compounds have the unit type of their
+            children.
+        """
+        node, _, path = attribute.partition(".")
+        key = (self.node_type(node), path)
+        if key in _unit_types:
+            return _unit_types[key]
+        plug = self.get_plug(attribute)
+        attribute_object = plug.attribute()
+        if plug.isCompound and not plug.isArray:
+            attribute_object = plug.child(0).attribute()
+        result = _get_unit_type(attribute_object)
+        if not plug.isDynamic:
+            _unit_types[key] = result
+        return result
+
+    def set_value(self, attribute, value):
+        """Queue setting the value of an attribute.
+
+        :param attribute: Attribute name
+        :param value: Number in UI units
+        """
+        node, _, path = attribute.partition(".")
+        key = (self.node_type(node), path)
+        plug = self.get_plug(attribute)
+        setter = _plug_setters.get(key)
+        if setter is None:
+            setter = _get_plug_setter(plug.attribute())
+            if not plug.isDynamic:
+                _plug_setters[key] = setter
+        setter(self.modifier, plug, value)
+
+    def connect(
+        self, source, destination, convert_units=True, destination_unit=None
+    ):
+        """Queue a connection, replacing any existing input connection.
+
+        Like connectAttr, a unitConversion node is inserted between angle, linear and
+        unitless attributes so the value in UI units is kept.  Conversion nodes of the
+        same source and factor are shared.
+
+        :param source: Source attribute
+        :param destination: Destination attribute
+        :param convert_units: False to connect the internal value of the source to the
+            internal value of the destination.
+        :param destination_unit: Unit type used instead of the unit type of the
+            destination, such as NUMBER for angle inputs that take radians.
+        """
+        if convert_units:
+            source_unit = self.unit_type(source)
+            destination_unit = destination_unit or self.unit_type(destination)
+            if source_unit and destination_unit and source_unit != destination_unit:
+                factor = _ui_unit_factor(source_unit) / _ui_unit_factor(
+                    destination_unit
+                )
+                if abs(factor - 1.0) > 1e-12:
+                    source = self._unit_conversion(source, factor)
+        destination = self.get_plug(destination)
+        if destination.isDestination:
+            self.modifier.disconnect(destination.source(), destination)
+        self.modifier.connect(self.get_plug(source), destination)
+
+    def _unit_conversion(self, source, factor):
+        """Get the output of a unitConversion node scaling the internal value of source.
+
+        :param source: Source attribute
+        :param factor: Conversion factor
+        :return: The output attribute
+        """
+        key = (source, factor)
+        output = self.conversions.get(key)
+        if output is None:
+            conversion = self.create_node("unitConversion")
+            self.set_value("{}.conversionFactor".format(conversion), factor)
+            self.connect(source, "{}.input".format(conversion), convert_units=False)
+            output = "{}.output".format(conversion)
+            self.conversions[key] = output
+        return output
+
+    def load_plugin(self, plugin):
+        if plugin not in self.plugins:
+            cmds.loadPlugin(plugin, qt=False)
+            self.plugins.add(plugin)
+
+    def execute(self):
+        """Execute the queued changes and add them to the undo queue.
+
+        The modifier can be used again afterwards.
+        """
+        from ywta.plugins import dgmodifier
+
+        for node in self.notes:
+            mobject = self.get_mobject(node)
+            if not OpenMaya2.MFnDependencyNode(mobject).hasAttribute("notes"):
+                attribute = OpenMaya2.MFnTypedAttribute().create(
+                    "notes", "notes", OpenMaya2.MFnData.kString
+                )
+                self.modifier.addAttribute(mobject, attribute)
+        self.modifier.doIt()
+        if self.notes:
+            # The notes attributes exist now
+            for node, notes in self.notes.items():
+                plug = self.get_plug("{}.notes".format(node))
+                self.modifier.newPlugValueString(plug, notes)
+            self.notes.clear()
+            self.modifier.doIt()
+        dgmodifier.commit(self.modifier)
+        self.modifier = OpenMaya2.MDGModifier()
+
+
+def _get_plug_setter(attribute):
+    """Get the function setting the value of an attribute in a MDGModifier.
+
+    :param attribute: Attribute MObject
+    :return: Function taking the MDGModifier, the MPlug and the value
+    """
+    api_type = attribute.apiType()
+    if api_type == OpenMaya2.MFn.kEnumAttribute:
+        return lambda modifier, plug, value: modifier.newPlugValueShort(plug, int(value))
+    elif api_type in [
+        OpenMaya2.MFn.kDoubleLinearAttribute,
+        OpenMaya2.MFn.kFloatLinearAttribute,
+    ]:
+        return lambda modifier, plug, value: modifier.newPlugValueMDistance(
+            plug, OpenMaya2.MDistance(value, OpenMaya2.MDistance.uiUnit())
+        )
+    elif api_type in [
+        OpenMaya2.MFn.kDoubleAngleAttribute,
+        OpenMaya2.MFn.kFloatAngleAttribute,
+    ]:
+        return lambda modifier, plug, value: modifier.newPlugValueMAngle(
+            plug, OpenMaya2.MAngle(value, OpenMaya2.MAngle.uiUnit())
+        )
+    elif api_type == OpenMaya2.MFn.kNumericAttribute:
+        numeric_type = OpenMaya2.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == OpenMaya2.MFnNumericData.kFloat:
+            return lambda modifier, plug, value: modifier.newPlugValueFloat(
+                plug, value
+            )
+        elif numeric_type == OpenMaya2.MFnNumericData.kBoolean:
+            return lambda modifier, plug, value: modifier.newPlugValueBool(
+                plug, bool(value)
+            )
+        elif numeric_type in [
+            OpenMaya2.MFnNumericData.kShort,
+            OpenMaya2.MFnNumericData.kInt,
+            OpenMaya2.MFnNumericData.kLong,
+            OpenMaya2.MFnNumericData.kByte,
+        ]:
+            return lambda modifier, plug, value: modifier.newPlugValueInt(
+                plug, int(value)
+            )
+    return lambda modifier, plug, value: modifier.newPlugValueDouble(plug, value)
+
+
+def _get_unit_type(attribute):
+    """Get the unit type of an attribute MObject.
+
+    :param attribute: Attribute MObject
+    :return: ANGLE, LINEAR, NUMBER or None
+    """
+    api_type = attribute.apiType()
+    if api_type in [
+        OpenMaya2.MFn.kDoubleAngleAttribute,
+        OpenMaya2.MFn.kFloatAngleAttribute,
+    ]:
+        return ANGLE
+    elif api_type in [
+        OpenMaya2.MFn.kDoubleLinearAttribute,
+        OpenMaya2.MFn.kFloatLinearAttribute,
+    ]:
+        return LINEAR
+    elif api_type in [OpenMaya2.MFn.kNumericAttribute, OpenMaya2.MFn.kEnumAttribute]:
+        return NUMBER
+    return None
+
+
+def _ui_unit_factor(unit_type):
+    """Get the factor converting the internal unit of a unit type to the UI unit.
+
+    :param unit_type: ANGLE, LINEAR or NUMBER
+    :return: The UI value of an internal value of 1
+    """
+    if unit_type == ANGLE:
+        return OpenMaya2.MAngle(1.0).asUnits(OpenMaya2.MAngle.uiUnit())
+    elif unit_type == LINEAR:
+        return OpenMaya2.MDistance(1.0).asUnits(OpenMaya2.MDistance.uiUnit())
+    return 1.0
+
+
+def get_mobject(node):
+    selection_list = OpenMaya2.MSelectionList()
+    selection_list.add(node)
+    return selection_list.getDependNode(0)
 
 
 def attribute_type(a):
@@ -747,3 +1716,391 @@ def attribute_type(a):
         # attributeQuery doesn't seem to work with worldMatrix
         return "matrix"
     return cmds.attributeQuery(attribute, node=node, at=True)
+
+
+# Relative evaluation cost of the node types created by dge.  Every node has the same
+# overhead in the DG, the utility nodes computing 3 values and the nodes doing vector
+# math cost more.
+NODE_COSTS = {
+    "addDoubleLinear": 1.0,
+    "multDoubleLinear": 1.0,
+    "unitConversion": 1.0,
+    "plusMinusAverage": 1.5,
+    "multiplyDivide": 1.5,
+    "condition": 1.5,
+    "clamp": 1.5,
+    "blendTwoAttr": 1.2,
+    "eulerToQuat": 2.0,
+    "angleBetween": 2.0,
+    "distanceBetween": 2.0,
+    "absolute": 1.0,
+    "sin": 1.0,
+    "cos": 1.0,
+    "tan": 1.0,
+    "acos": 1.0,
+    "asin": 1.0,
+    "atan": 1.0,
+}
+
+# First Maya version of the node types that are not available in every version
+NODE_TYPE_VERSIONS = {
+    "absolute": 2024,
+    "sin": 2024,
+    "cos": 2024,
+    "tan": 2024,
+    "acos": 2024,
+    "asin": 2024,
+    "atan": 2024,
+}
+
+# Node type: plug-in loaded when the node is created
+_PLUGIN_NODE_TYPES = {"eulerToQuat": "quatNodes"}
+
+# Nodes shared by the sin, cos and tan of the same value
+_HALF_ANGLE_QUAT = ["unitConversion", "eulerToQuat"]
+
+# Function: list of (DGParser implementation, node types created) to choose from
+LOWERINGS = {
+    "abs": [
+        ("_abs_node", ["absolute"]),
+        ("_abs_condition", ["multiplyDivide", "condition"]),
+    ],
+    "sin": [
+        ("_sin_node", ["sin"]),
+        ("_sin_quat", _HALF_ANGLE_QUAT),
+    ],
+    "cos": [
+        ("_cos_node", ["cos"]),
+        ("_cos_quat", _HALF_ANGLE_QUAT),
+    ],
+    "tan": [
+        ("_tan_node", ["tan"]),
+        ("_tan_quat", _HALF_ANGLE_QUAT + ["multiplyDivide"]),
+    ],
+    "acos": [
+        ("_acos_node", ["acos", "unitConversion"]),
+        (
+            "_acos_angle_between",
+            [
+                "multiplyDivide",
+                "plusMinusAverage",
+                "multiplyDivide",
+                "angleBetween",
+                "unitConversion",
+            ],
+        ),
+    ],
+    "asin": [
+        ("_asin_node", ["asin", "unitConversion"]),
+        (
+            "_asin_angle_between",
+            [
+                "multiplyDivide",
+                "plusMinusAverage",
+                "multiplyDivide",
+                "angleBetween",
+                "unitConversion",
+            ],
+        ),
+    ],
+    "atan": [
+        ("_atan_node", ["atan", "unitConversion"]),
+        ("_atan_angle_between", ["angleBetween", "unitConversion"]),
+    ],
+}
+
+# Node types created by the operators and the functions that are not lowered
+_OPERATOR_NODE_TYPES = {
+    "+": ["plusMinusAverage"],
+    "-": ["plusMinusAverage"],
+    "*": ["multiplyDivide"],
+    "/": ["multiplyDivide"],
+    "^": ["multiplyDivide"],
+    "unary -": ["multiplyDivide"],
+    "?": ["condition"],
+    "exp": ["multiplyDivide"],
+    "sqrt": ["multiplyDivide"],
+    "clamp": ["clamp"],
+    "lerp": ["blendTwoAttr"],
+    "min": ["condition"],
+    "max": ["condition"],
+    "distance": ["distanceBetween"],
+}
+
+_available_node_types = None
+
+
+def available_node_types(maya_version=None):
+    """Get the node types dge can create.
+
+    :param maya_version: Maya version such as 2024 to get the node types of a version
+        without running it.  Defaults to the running Maya or the latest version outside
+        of Maya.
+    :return: Set of node types
+    """
+    global _available_node_types
+    if maya_version is None and cmds is not None:
+        if _available_node_types is None:
+            _available_node_types = set(cmds.allNodeTypes())
+            _available_node_types.update(_PLUGIN_NODE_TYPES)
+        return _available_node_types
+    if maya_version is None:
+        maya_version = max(NODE_TYPE_VERSIONS.values())
+    return {
+        node_type
+        for node_type in NODE_COSTS
+        if NODE_TYPE_VERSIONS.get(node_type, 0) <= maya_version
+    }
+
+
+# Expression and samples of every lowered function used by verify_lowerings
+_LOWERING_SAMPLES = [
+    ("abs(x)", np.linspace(-2.0, 2.0, 9)),
+    ("sin(x)", np.linspace(-math.pi, math.pi, 13)),
+    ("cos(x)", np.linspace(-math.pi, math.pi, 13)),
+    ("tan(x)", np.linspace(-1.2, 1.2, 13)),
+    ("acos(x)", np.linspace(-1.0, 1.0, 9)),
+    ("asin(x)", np.linspace(-1.0, 1.0, 9)),
+    ("atan(x)", np.linspace(-10.0, 10.0, 9)),
+]
+
+
+def verify_lowerings(maya_version=None, tolerance=1e-4):
+    """Verify the implementations of the lowered functions with evaluate.
+
+    The node types of an older version are a subset of the running Maya, so the
+    implementations of every version can be verified in the latest Maya.
+
+    :param maya_version: Maya version such as 2023 to verify the implementations chosen
+        for that version.  Defaults to the running Maya.
+    :param tolerance: Largest allowed absolute difference
+    :return: Dictionary of expression: largest absolute difference
+    """
+    global _available_node_types
+    available = available_node_types()
+    node_types = available_node_types(maya_version) if maya_version else available
+    missing = sorted(node_types - available)
+    if missing:
+        raise RuntimeError(
+            "Node types {} are not available in this Maya".format(", ".join(missing))
+        )
+    previous = _available_node_types
+    _available_node_types = node_types
+    try:
+        return OrderedDict(
+            (expression, verify(expression, tolerance, x=samples))
+            for expression, samples in _LOWERING_SAMPLES
+        )
+    finally:
+        _available_node_types = previous
+
+
+def get_cost(node_types):
+    """Get the estimated evaluation cost of nodes.
+
+    :param node_types: List of node types
+    :return: Sum of the NODE_COSTS
+    """
+    return sum(NODE_COSTS.get(node_type, 1.0) for node_type in node_types)
+
+
+def choose_lowering(function, node_types):
+    """Choose the cheapest implementation of a function.
+
+    :param function: Function name in LOWERINGS
+    :param node_types: Set of the available node types
+    :return: Tuple of the DGParser implementation and the node types it creates
+    """
+    candidates = [
+        (implementation, created)
+        for implementation, created in LOWERINGS[function]
+        if all(node_type in node_types for node_type in created)
+    ]
+    return min(candidates, key=lambda candidate: get_cost(candidate[1]))
+
+
+def estimate(expression, maya_version=None):
+    """Estimate the nodes an expression creates without creating them.
+
+    Every variable is assumed to be a different unitless scalar attribute, so the
+    unitConversion nodes of angle and linear variables are not counted.
+
+    :param expression: Expression string
+    :param maya_version: Maya version such as 2024.  Defaults to the running Maya or
+        the latest version outside of Maya.
+    :return: Tuple of the number of nodes and the estimated evaluation cost
+    """
+    tree = get_parser().compile(expression)
+    node_types = available_node_types(maya_version)
+    created = []
+    # Identical sub-expressions share their nodes
+    operations = set()
+    half_angle_quats = set()
+
+    def visit(tree):
+        op = tree[0]
+        if op in ("number", "variable"):
+            return
+        children = tree[2] if op == "call" else tree[1:]
+        for child in children:
+            if isinstance(child, tuple):
+                visit(child)
+        if op == "=" or tree in operations:
+            return
+        operations.add(tree)
+        name = tree[1] if op == "call" else op
+        if name in LOWERINGS:
+            lowered = choose_lowering(name, node_types)[1]
+            if lowered[:2] == _HALF_ANGLE_QUAT:
+                if tree[2] in half_angle_quats:
+                    lowered = lowered[2:]
+                half_angle_quats.add(tree[2])
+            created.extend(lowered)
+        else:
+            created.extend(_OPERATOR_NODE_TYPES[name])
+
+    visit(tree)
+    return len(created), get_cost(created)
+
+
+# Comparison operators in the order of DGParser.conditionals
+_CONDITIONAL_FUNCTIONS = [
+    operator.eq,
+    operator.ne,
+    operator.gt,
+    operator.ge,
+    operator.lt,
+    operator.le,
+]
+
+_OPERATOR_FUNCTIONS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": math.pow,
+}
+
+# Functions that can be folded when their arguments are constant
+_CONSTANT_FUNCTIONS = {
+    "abs": math.fabs,
+    "exp": math.exp,
+    "clamp": lambda x, min_value, max_value: min(max(x, min_value), max_value),
+    "lerp": lambda a, b, t: a + (b - a) * t,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "cos": math.cos,
+    "sin": math.sin,
+    "tan": math.tan,
+    "acos": math.acos,
+    "asin": math.asin,
+    "atan": math.atan,
+}
+
+
+def optimize_tree(tree):
+    """Fold the constant sub-expressions of an expression tree and remove identities.
+
+    Operations with constant operands are replaced by their value, and x*1, 1*x, x/1,
+    x+0, 0+x, x-0, x^1 and --x are replaced by x.  Operations that would raise an
+    error, such as a division by zero, are kept.
+
+    :param tree: Expression tree from DGParser.compile
+    :return: The optimized expression tree
+    """
+    op = tree[0]
+    if op in ("number", "variable"):
+        return tree
+    elif op == "call":
+        args = tuple(optimize_tree(arg) for arg in tree[2])
+        tree = (op, tree[1], args)
+        if tree[1] in _CONSTANT_FUNCTIONS and all(_is_number(arg) for arg in args):
+            return _fold(tree, _CONSTANT_FUNCTIONS[tree[1]], *[a[1] for a in args])
+        return tree
+    elif op == "?":
+        first_term = optimize_tree(tree[1])
+        second_term = optimize_tree(tree[3])
+        if_true = optimize_tree(tree[4])
+        if_false = optimize_tree(tree[5])
+        if _is_number(first_term) and _is_number(second_term):
+            condition = _CONDITIONAL_FUNCTIONS[tree[2]]
+            return if_true if condition(first_term[1], second_term[1]) else if_false
+        if if_true == if_false:
+            return if_true
+        return (op, first_term, tree[2], second_term, if_true, if_false)
+    elif op == "unary -":
+        operand = optimize_tree(tree[1])
+        if _is_number(operand):
+            return ("number", -operand[1])
+        if operand[0] == "unary -":
+            return operand[1]
+        return (op, operand)
+    elif op == "=":
+        return (op, tree[1], optimize_tree(tree[2]))
+
+    op1 = optimize_tree(tree[1])
+    op2 = optimize_tree(tree[2])
+    if _is_number(op1) and _is_number(op2):
+        return _fold((op, op1, op2), _OPERATOR_FUNCTIONS[op], op1[1], op2[1])
+    if op2 == ("number", 1) and op in "*/^":
+        return op1
+    if op1 == ("number", 1) and op == "*":
+        return op2
+    if op2 == ("number", 0) and op in "+-":
+        return op1
+    if op1 == ("number", 0) and op == "+":
+        return op2
+    return (op, op1, op2)
+
+
+def _is_number(tree):
+    return tree[0] == "number"
+
+
+def _fold(tree, func, *args):
+    """Get the constant tree of an operation or the operation if it cannot be folded."""
+    try:
+        return ("number", func(*args))
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return tree
+
+
+def bind_variables(tree, values):
+    """Replace variables of an expression tree with constant values.
+
+    :param tree: Expression tree from DGParser.compile
+    :param values: Dictionary of variable name: number
+    :return: The expression tree with the variables replaced
+    """
+    op = tree[0]
+    if op == "variable":
+        value = values.get(tree[1])
+        return tree if value is None else ("number", value)
+    elif op == "number":
+        return tree
+    elif op == "call":
+        return (op, tree[1], tuple(bind_variables(arg, values) for arg in tree[2]))
+    elif op == "=":
+        return (op, tree[1], bind_variables(tree[2], values))
+    return tuple(
+        bind_variables(x, values) if isinstance(x, tuple) else x for x in tree
+    )
+
+
+def count_operations(tree):
+    """Get the number of operations of an expression tree.
+
+    Each operation creates at least one node.
+
+    :param tree: Expression tree from DGParser.compile
+    :return: The number of operations
+    """
+    op = tree[0]
+    if op in ("number", "variable"):
+        return 0
+    elif op == "call":
+        return 1 + sum(count_operations(arg) for arg in tree[2])
+    elif op == "=":
+        return count_operations(tree[2])
+    return 1 + sum(count_operations(x) for x in tree[1:] if isinstance(x, tuple))
@@ -1,10 +1,12 @@
+import numpy as np
 from maya import cmds
 import maya.api.OpenMaya as OpenMaya2
 import ywta.shortcuts as shortcuts
+import ywta.utility.mayaarrays as mayaarrays
 
 
 def create_colorset(mesh, name, colors):
-    dag = shortcuts.get_dag_path2.get_dag(mesh)
+    dag = shortcuts.get_dag_path(mesh)
     dag.extendToShape()
     mesh_fn = OpenMaya2.MFnMesh(dag)
     vertices = range(mesh_fn.numVertices)
@@ -13,12 +15,12 @@ def create_colorset(mesh, name, colors):
     mesh_fn.setVertexColors(colors, vertices)
 
 def get_colorset(mesh_name, colorset_name):
-    dag = shortcuts.get_dag_path2(mesh_name)
+    dag = shortcuts.get_dag_path(mesh_name)
     dag.extendToShape()
     mesh_fn = OpenMaya2.MFnMesh(dag)
     # vertices = range(mesh_fn.numVertices)
 
-    return mesh_fn.mesh_fn.getColors(colorset_name)
+    return mesh_fn.getColors(colorset_name)
 
 def get_colorset_list(mesh_name):
     colorsets = cmds.polyColorSet(mesh_name, q=True, allColorSets=True)
@@ -26,20 +28,44 @@ def get_colorset_list(mesh_name):
 
 def get_weights_from_colorset(mesh_name, colorset=None):
     # カラーセットの値を取得して、それをウェイトとして返す
-    fnmesh = shortcuts.get_mfnmesh(mesh_name)
-    points = fnmesh.getPoints(OpenMaya2.MSpace.kObject)
-
     if colorset is None:
-        return [1] * len(points)
+        return np.ones(len(mayaarrays.get_points(mesh_name)))
+    return get_weights_from_colorsets(mesh_name, [colorset])[0]
+
+
+def get_weights_from_colorsets(mesh_name, colorsets):
+    """Get the per vertex weights of many color sets as one stacked array.
+
+    The weight of a vertex is the average of its rgb values.  Vertices without a color
+    get a weight of 0.
+
+    :param mesh_name: Mesh name
+    :param colorsets: List of color set names
+    :return: (colorsets x vertices) numpy array
+    """
+    colors = np.stack(
+        [mayaarrays.get_vertex_colors(mesh_name, name) for name in colorsets]
+    )
+    weights = colors[..., :3].mean(axis=-1)
+    # Unset vertex colors are returned as -1
+    weights[np.all(colors[..., :3] < 0.0, axis=-1)] = 0.0
+    return weights
 
-    colors = fnmesh.getVertexColors(colorset)
-    vertices = fnmesh.getVertices()
 
-    weights = [0] * len(points)
+def benchmark_weights(mesh_name, colorsets=None, iterations=5):
+    """Time reading the weights of color sets end to end.
 
-    for i, id in enumerate(vertices[1]):
-        #average of rgb
-        weights[id] = (colors[id].r + colors[id].g + colors[id].b) / 3
-        # weights[id] *= weights[id]
+    :param mesh_name: Mesh name
+    :param colorsets: List of color set names.  Defaults to all the color sets.
+    :param iterations: Number of reads.
+    """
+    from ywta.utility.timing import Section
 
-    return weights
\ No newline at end of file
+    colorsets = colorsets or get_colorset_list(mesh_name)
+    workspace = "colorset weights {} sets x {} vertices".format(
+        len(colorsets), cmds.polyEvaluate(mesh_name, vertex=True)
+    )
+    with Section(workspace, "get_weights_from_colorsets"):
+        for _ in range(iterations):
+            get_weights_from_colorsets(mesh_name, colorsets)
+    Section.print_timing()
@@ -0,0 +1,81 @@
+"""ywtaDGModifier is a command that adds MDGModifiers executed by scripts to the undo queue.
+
+Changes made with an MDGModifier outside of a command cannot be undone.  Scripts that
+batch their changes in a modifier execute it and then commit it so the whole modifier is
+undone and redone as a single step:
+
+    modifier = OpenMaya.MDGModifier()
+    ...
+    modifier.doIt()
+    dgmodifier.commit(modifier)
+
+The plug-in is loaded from this file the first time commit is called.
+"""
+
+import os
+
+import maya.api.OpenMaya as OpenMaya
+import maya.cmds as cmds
+
+# Executed modifiers waiting for the command to take them
+_pending = []
+
+
+def maya_useNewAPI():
+    pass
+
+
+class DGModifierCommand(OpenMaya.MPxCommand):
+    """The command that takes ownership of the last committed modifier."""
+
+    name = "ywtaDGModifier"
+
+    @classmethod
+    def creator(cls):
+        return DGModifierCommand()
+
+    def __init__(self):
+        OpenMaya.MPxCommand.__init__(self)
+        self._modifier = None
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, arg_list):
+        # Maya loads the plug-in as a separate module so use the queue of the package
+        import ywta.plugins.dgmodifier as dgmodifier
+
+        # The modifier was already executed by the script
+        self._modifier = dgmodifier._pending.pop()
+
+    def redoIt(self):
+        self._modifier.doIt()
+
+    def undoIt(self):
+        self._modifier.undoIt()
+
+
+def commit(modifier):
+    """Add an executed modifier to the undo queue.
+
+    :param modifier: MDGModifier that was already executed with doIt
+    """
+    plugin = os.path.splitext(os.path.abspath(__file__))[0] + ".py"
+    if not cmds.pluginInfo(plugin, query=True, loaded=True):
+        cmds.loadPlugin(plugin, quiet=True)
+    _pending.append(modifier)
+    try:
+        getattr(cmds, DGModifierCommand.name)()
+    finally:
+        # Do not leave the modifier behind if the command failed
+        del _pending[:]
+
+
+def initializePlugin(obj):
+    plugin = OpenMaya.MFnPlugin(obj, "yohawing", "1.0", "Any")
+    plugin.registerCommand(DGModifierCommand.name, DGModifierCommand.creator)
+
+
+def uninitializePlugin(obj):
+    plugin = OpenMaya.MFnPlugin(obj)
+    plugin.deregisterCommand(DGModifierCommand.name)
@@ -2,23 +2,90 @@
 
 Most of this was taken from http://mathlab.github.io/PyGeM/_modules/pygem/radial.html#RBF
 
+The RBF is solved on a set of control points picked from the source mesh with farthest
+point or Poisson disk sampling, so dense meshes do not need to be solved in full.
+Compact support kernels such as RBF.beckert_wendland_c2_basis are solved and evaluated
+with sparse matrices.  The deformation of the retargeted meshes is evaluated in chunks
+of rows under a memory ceiling, with many retargeted meshes evaluated on a process
+pool.
+
+The numpy functions do not depend on Maya.  Maya is only imported by the functions that
+read from or write to Maya meshes.
+
 Example Usage
 =============
 
     retarget("source_body", "new_body", ["shirt", "pants"], rbf=RBF.linear)
 
+    # Solve on 2000 control points with a compact support kernel
+    retarget(
+        "source_body",
+        "new_body",
+        ["shirt", "pants"],
+        rbf=RBF.beckert_wendland_c2_basis,
+        radius=10.0,
+        control_points=2000,
+    )
+
+    # Retarget to many bodies with a single factorization
+    solver = RetargetSolver(source_points, RBF.linear, 0.5, cache_dir="/tmp/rbf")
+    for body in bodies:
+        deformed = solver.deform(shirt_points, solver.solve(body))
+
+Command Line Usage
+==================
+
+Objs can be retargeted without Maya with the maya directory of ywtatools on the
+PYTHONPATH.  The retargeted garments are written with the uvs, normals and groups of the
+input garments:
+
+    python -m ywta.rig.meshretarget source.obj new_source.obj garments/ output/
+        --rbf linear gaussian --radius 0.5 1.0 --control-points 2000
+
+When more than one rbf or radius is given, every combination is written as
+<garment>_<radius>_<rbf>.obj and timed, which can be used to benchmark kernels.
+
 """
+import argparse
+import glob
+import hashlib
+import inspect
 import math
+import os
 import time
 import numpy as np
+from scipy.linalg import lu_factor, lu_solve, solve
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.linalg import cg, minres, splu, spsolve_triangular
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
 
-import maya.api.OpenMaya as OpenMaya
-import maya.cmds as cmds
-import ywta.shortcuts as shortcuts
+import ywta.utility.mayaarrays as mayaarrays
+
+FARTHEST = "farthest"
+POISSON = "poisson"
 
+DIRECT = "direct"
+ITERATIVE = "iterative"
 
-def retarget(source, target, shapes, rbf=None, radius=0.5, stride=1):
+# Memory used by the distance matrices of the retargeted vertices evaluated at a time
+DEFAULT_MAX_MEMORY = 512 * 1024 * 1024
+
+
+def retarget(
+    source,
+    target,
+    shapes,
+    rbf=None,
+    radius=0.5,
+    stride=1,
+    control_points=None,
+    sampling=FARTHEST,
+    solver=None,
+    cache_dir=None,
+    max_memory=DEFAULT_MAX_MEMORY,
+    max_workers=None,
+):
     """Run the mesh retarget.
 
     :param source: Source mesh
@@ -28,23 +95,40 @@ def retarget(source, target, shapes, rbf=None, radius=0.5, stride=1):
     :param radius: Smoothing parameter for the rbf
     :param stride: Vertex stride to sample on the source mesh.  Increase to speed up
     the calculation but less accurate.
+    :param control_points: Optional number of control points sampled on the source
+    mesh.  All the strided vertices are used by default.
+    :param sampling: FARTHEST or POISSON control point sampling.
+    :param solver: DIRECT or ITERATIVE linear solver.  See get_weight_matrix.
+    :param cache_dir: Optional directory of the RetargetSolver factorization cache.
+    :param max_memory: Approximate memory ceiling in bytes of the deformation
+    evaluation, shared by all workers.
+    :param max_workers: Maximum number of worker processes evaluating the shapes.  1
+    evaluates the shapes in the calling process.
     """
-    start_time = time.time()
-    source_points = points_to_np_array(source, stride)
-    target_points = points_to_np_array(target, stride)
+    import maya.cmds as cmds
 
+    start_time = time.time()
     if rbf is None:
         rbf = RBF.linear
-    weights = get_weight_matrix(source_points, target_points, rbf, radius)
-
-    for shape in shapes:
-        points = points_to_np_array(shape)
-        n_points = points.shape[0]
-        dist = get_distance_matrix(points, source_points, rbf, radius)
-        identity = np.ones((n_points, 1))
-        h = np.bmat([[dist, identity, points]])
-        deformed = np.asarray(np.dot(h, weights))
-        points = [OpenMaya.MPoint(*p) for p in deformed]
+    source_points = points_to_np_array(source, stride)
+    target_points = points_to_np_array(target, stride)
+    shape_points = [points_to_np_array(shape) for shape in shapes]
+
+    deformed = retarget_points(
+        source_points,
+        target_points,
+        shape_points,
+        rbf,
+        radius,
+        control_points,
+        sampling,
+        solver,
+        cache_dir,
+        max_memory,
+        max_workers,
+    )
+    # Every shape is evaluated before Maya is touched
+    for shape, points in zip(shapes, deformed):
         dupe = cmds.duplicate(
             shape, name="{}_{}_{}".format(shape, radius, rbf.__name__)
         )[0]
@@ -54,43 +138,678 @@ def retarget(source, target, shapes, rbf=None, radius=0.5, stride=1):
     print("Transferred in {} seconds".format(end_time - start_time))
 
 
+def retarget_points(
+    source_points,
+    target_points,
+    shape_points,
+    rbf=None,
+    radius=0.5,
+    control_points=None,
+    sampling=FARTHEST,
+    solver=None,
+    cache_dir=None,
+    max_memory=DEFAULT_MAX_MEMORY,
+    max_workers=None,
+):
+    """Retarget point arrays without Maya.
+
+    :param source_points: (N x 3) source mesh points
+    :param target_points: (N x 3) modified source mesh points
+    :param shape_points: List of (M x 3) points to retarget
+    :param rbf: One of the RBF functions. See class RBF
+    :param radius: Smoothing parameter for the rbf
+    :param control_points: Optional number of control points sampled on the source.
+    :param sampling: FARTHEST or POISSON control point sampling.
+    :param solver: DIRECT or ITERATIVE linear solver.  See get_weight_matrix.
+    :param cache_dir: Optional directory of the RetargetSolver factorization cache.
+    :param max_memory: Approximate memory ceiling in bytes of the deformation
+    evaluation, shared by all workers.
+    :param max_workers: Maximum number of worker processes evaluating the shapes.  1
+    evaluates the shapes in the calling process.
+    :return: List of the (M x 3) retargeted points
+    """
+    rbf_solver = RetargetSolver(
+        source_points,
+        rbf,
+        radius,
+        control_points,
+        sampling,
+        solver,
+        cache_dir,
+    )
+    weights = rbf_solver.solve(target_points)
+    return rbf_solver.deform_shapes(shape_points, weights, max_memory, max_workers)
+
+
+def retarget_objs(
+    source,
+    target,
+    garments,
+    output_directory,
+    rbf=None,
+    radius=0.5,
+    suffix="",
+    **kwargs
+):
+    """Retarget obj files without Maya.
+
+    :param source: Source obj file
+    :param target: Modified source obj file
+    :param garments: List of obj files to retarget or a directory of obj files
+    :param output_directory: Directory the retargeted objs are written to.
+    :param rbf: One of the RBF functions. See class RBF
+    :param radius: Smoothing parameter for the rbf
+    :param suffix: Suffix added to the names of the written files.
+    :param kwargs: Extra arguments of retarget_points
+    :return: List of the written file paths
+    """
+    from ywta.deform import np_mesh
+
+    if isinstance(garments, str):
+        garments = sorted(glob.glob(os.path.join(garments, "*.obj")))
+    source_points = np_mesh.read_obj(source, faces=False)["points"]
+    target_points = np_mesh.read_obj(target, faces=False)["points"]
+    shape_points = [np_mesh.read_obj(path, faces=False)["points"] for path in garments]
+
+    deformed = retarget_points(
+        source_points, target_points, shape_points, rbf, radius, **kwargs
+    )
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+    file_paths = []
+    for path, points in zip(garments, deformed):
+        name = os.path.splitext(os.path.basename(path))[0]
+        file_path = os.path.join(output_directory, "{}{}.obj".format(name, suffix))
+        np_mesh.write_obj_points(file_path, points, path)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def main(argv=None):
+    """Command line entry point of retarget_objs.
+
+    :param argv: Optional list of arguments.  sys.argv is used by default.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m ywta.rig.meshretarget",
+        description="Retarget obj garments fit on a source mesh to a modified source.",
+    )
+    parser.add_argument("source", help="Source obj")
+    parser.add_argument("target", help="Modified source obj")
+    parser.add_argument("garments", help="Directory of the obj files to retarget")
+    parser.add_argument("output", help="Directory the retargeted objs are written to")
+    parser.add_argument(
+        "--rbf", nargs="+", default=["linear"], choices=RBF.names(), help="Rbf kernels"
+    )
+    parser.add_argument(
+        "--radius", nargs="+", type=float, default=[0.5], help="Rbf radii"
+    )
+    parser.add_argument(
+        "--control-points", type=int, help="Number of sampled control points"
+    )
+    parser.add_argument("--sampling", default=FARTHEST, choices=[FARTHEST, POISSON])
+    parser.add_argument("--solver", choices=[DIRECT, ITERATIVE])
+    parser.add_argument("--cache-dir", help="Factorization cache directory")
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=DEFAULT_MAX_MEMORY // (1024 * 1024),
+        help="Memory ceiling of the evaluation in MB",
+    )
+    parser.add_argument("--max-workers", type=int, help="Number of worker processes")
+    args = parser.parse_args(argv)
+
+    benchmark = len(args.rbf) * len(args.radius) > 1
+    for name in args.rbf:
+        for radius in args.radius:
+            start_time = time.time()
+            suffix = "_{}_{}".format(radius, name) if benchmark else ""
+            file_paths = retarget_objs(
+                args.source,
+                args.target,
+                args.garments,
+                args.output,
+                getattr(RBF, name),
+                radius,
+                suffix,
+                control_points=args.control_points,
+                sampling=args.sampling,
+                solver=args.solver,
+                cache_dir=args.cache_dir,
+                max_memory=args.max_memory * 1024 * 1024,
+                max_workers=args.max_workers,
+            )
+            print(
+                "Transferred {} objs with {} radius {} in {} seconds".format(
+                    len(file_paths), name, radius, time.time() - start_time
+                )
+            )
+
+
 def points_to_np_array(mesh, stride=1):
-    points = get_points(mesh)
-    sparse_points = [OpenMaya.MPoint(p) for p in points][::stride]
-    np_points = np.array([[p.x, p.y, p.z] for p in sparse_points])
-    return np_points
+    return mayaarrays.get_points(mesh)[::stride]
 
 
 def get_points(mesh):
-    path = shortcuts.get_dag_path2(shortcuts.get_shape(mesh))
+    import maya.api.OpenMaya as OpenMaya
+    import ywta.shortcuts as shortcuts
+
+    path = shortcuts.get_dag_path(shortcuts.get_shape(mesh))
     mesh_fn = OpenMaya.MFnMesh(path)
     return mesh_fn.getPoints()
 
 
-def get_weight_matrix(sp, tp, rbf, radius):
+def sample_control_points(points, count, method=FARTHEST, seed=0):
+    """Pick evenly spread control points on a point cloud.
+
+    :param points: (N x 3) points
+    :param count: Number of control points.
+    :param method: FARTHEST or POISSON.
+    :param seed: Random seed of the first point or the Poisson visiting order.
+    :return: Array of the indices of the control points.
+    """
+    if method == FARTHEST:
+        return farthest_point_indices(points, count, seed)
+    elif method == POISSON:
+        return poisson_disk_indices(points, count, seed=seed)
+    raise RuntimeError("Invalid sampling method {}".format(method))
+
+
+def farthest_point_indices(points, count, seed=0):
+    """Pick points with farthest point sampling.
+
+    Each new point is the point farthest from the points picked so far, which gives
+    an even cover of the mesh and always keeps the extremities.
+
+    :param points: (N x 3) points
+    :param count: Number of points to pick.
+    :param seed: Random seed of the first point.
+    :return: Array of count point indices.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    count = min(count, points.shape[0])
+    indices = np.empty(count, dtype=np.int64)
+    indices[0] = np.random.default_rng(seed).integers(points.shape[0])
+    distance = np.full(points.shape[0], np.inf)
+    for i in range(1, count):
+        offset = points - points[indices[i - 1]]
+        np.minimum(distance, np.einsum("ij,ij->i", offset, offset), out=distance)
+        indices[i] = np.argmax(distance)
+    return indices
+
+
+def poisson_disk_indices(points, count=None, min_distance=None, seed=0):
+    """Pick points that are no closer to each other than a minimum distance.
+
+    Points are visited in random order and kept when no kept point is within
+    min_distance.  When only count is given, min_distance is estimated from the
+    average vertex spacing so about count points are kept.
+
+    :param points: (N x 3) points
+    :param count: Approximate number of points to pick.
+    :param min_distance: Minimum distance between picked points.
+    :param seed: Random seed of the visiting order.
+    :return: Array of point indices.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    tree = cKDTree(points)
+    if min_distance is None:
+        if count is None:
+            raise RuntimeError("Poisson sampling requires a count or a min_distance.")
+        # Approximate the surface area from the nearest neighbor spacing.  Random
+        # sequential packing keeps about one point per 1.4 * min_distance^2.
+        spacing = tree.query(points, k=2)[0][:, 1]
+        area = points.shape[0] * np.mean(spacing) ** 2
+        min_distance = math.sqrt(area / (count * 1.4))
+
+    order = np.random.default_rng(seed).permutation(points.shape[0])
+    neighbors = tree.query_ball_point(points, min_distance)
+    removed = np.zeros(points.shape[0], dtype=bool)
+    indices = []
+    for i in order:
+        if removed[i]:
+            continue
+        indices.append(i)
+        removed[neighbors[i]] = True
+    return np.array(indices, dtype=np.int64)
+
+
+def get_weight_matrix(sp, tp, rbf, radius, solver=None):
     """Get the weight matrix x in Ax=B
 
+    Use RetargetSolver directly to solve many modified sources with one factorization.
+
     :param sp: Source control point array
     :param tp: Target control point aray
     :param rbf: Rbf function from class RBF
     :param radius: Smoothing parameter
+    :param solver: DIRECT or ITERATIVE.  Defaults to DIRECT.  ITERATIVE skips the
+        factorization, which can be faster for a single solve of a large compact
+        support system.
+
+    :return: (N + 4 x 3) weight matrix
+    """
+    return RetargetSolver(sp, rbf, radius, solver=solver).solve(tp)
+
+
+class RetargetSolver(object):
+    """The RBF system of a source mesh, factorized once for many modified sources.
+
+    The matrix of the system only depends on the source control points, the kernel and
+    the radius, so it is factorized on construction and each solve is a back
+    substitution.  Global kernels use a dense LU factorization.  Compact support
+    kernels only solve their sparse, positive definite kernel matrix K and get the
+    constant and linear terms c from the 4 x 4 Schur complement:
+
+        c = (P^T K^-1 P)^-1 P^T K^-1 tp
+        w = K^-1 (tp - P c)
+
+    Solving the full system instead would fill in the sparse factorization through
+    its dense constraint rows.  K^-1 P is computed once.
+
+    When cache_dir is given, the factorization is saved to a file named after a hash
+    of the source points and solver settings and loaded by later solvers.
+
+    Example Usage
+    =============
+
+        solver = RetargetSolver(source_points, RBF.linear, 0.5, cache_dir="/tmp/rbf")
+        for body in bodies:
+            weights = solver.solve(body)
+            deformed = solver.deform(shirt_points, weights)
+    """
+
+    def __init__(
+        self,
+        source_points,
+        rbf=None,
+        radius=0.5,
+        control_points=None,
+        sampling=FARTHEST,
+        solver=None,
+        cache_dir=None,
+    ):
+        """Constructor
+
+        :param source_points: (N x 3) source mesh points
+        :param rbf: One of the RBF functions. See class RBF
+        :param radius: Smoothing parameter for the rbf
+        :param control_points: Optional number of control points sampled on the source.
+        :param sampling: FARTHEST or POISSON control point sampling.
+        :param solver: DIRECT or ITERATIVE.  Defaults to DIRECT.  ITERATIVE does not
+            factorize the system and solves every column of every solve with CG or
+            MINRES instead.  Global kernel systems that do not converge iteratively
+            are solved with a LU factorization.
+        :param cache_dir: Optional directory of the factorization cache.
+        """
+        self.rbf = rbf or RBF.linear
+        self.radius = radius
+        self.compact = RBF.is_compact(self.rbf)
+        self.solver = solver or DIRECT
+        if self.solver not in (DIRECT, ITERATIVE):
+            raise RuntimeError("Invalid solver {}".format(self.solver))
+        source_points = np.asarray(source_points, dtype=np.float64)
+        self.vertex_count = source_points.shape[0]
+
+        self.cache_path = None
+        data = None
+        if cache_dir:
+            key = self.cache_key(
+                source_points,
+                self.rbf,
+                radius,
+                control_points,
+                sampling,
+                self.solver,
+            )
+            self.cache_path = os.path.join(cache_dir, "{}.npz".format(key))
+            if os.path.exists(self.cache_path):
+                with np.load(self.cache_path) as cached:
+                    data = dict(cached)
+
+        if data is not None:
+            self.indices = data.get("indices")
+        elif control_points is not None and control_points < self.vertex_count:
+            self.indices = sample_control_points(source_points, control_points, sampling)
+        else:
+            self.indices = None
+        if self.indices is not None:
+            source_points = source_points[self.indices]
+        self.source_points = source_points
+        self.polynomial = get_polynomial_matrix(source_points)
+
+        self._lu = None
+        self._matrix = None
+        # LU of global kernel systems that MINRES does not converge on
+        self._fallback_lu = None
+        if data is None:
+            data = self._factorize()
+            if self.cache_path:
+                self.save(data)
+        self._load(data)
+
+    @classmethod
+    def cache_key(cls, source_points, rbf, radius, control_points, sampling, solver):
+        """Get the cache file name of a solver.
+
+        :return: Hex digest of the source points and solver settings.
+        """
+        digest = hashlib.sha1(np.ascontiguousarray(source_points).tobytes())
+        settings = (rbf.__name__, float(radius), control_points, sampling, solver)
+        digest.update(repr(settings).encode("utf-8"))
+        return digest.hexdigest()
+
+    def save(self, data):
+        """Write the factorization arrays to the cache file."""
+        directory = os.path.dirname(self.cache_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        if self.indices is not None:
+            data = dict(data, indices=self.indices)
+        np.savez(self.cache_path, **data)
+
+    def _factorize(self):
+        """Factorize the system.
+
+        :return: Dictionary of the arrays needed to solve the system.
+        """
+        data = {}
+        if not self.compact:
+            if self.solver == DIRECT:
+                a = get_system_matrix(self.source_points, self.rbf, self.radius)
+                data["lu"], data["piv"] = lu_factor(a, overwrite_a=True)
+            return data
+
+        kernel = self._kernel_matrix()
+        if self.solver == DIRECT:
+            self._lu = splu(kernel, permc_spec="MMD_AT_PLUS_A")
+            data["l_data"], data["l_indices"], data["l_indptr"] = _csr_arrays(
+                self._lu.L
+            )
+            data["u_data"], data["u_indices"], data["u_indptr"] = _csr_arrays(
+                self._lu.U
+            )
+            data["perm_r"] = self._lu.perm_r
+            data["perm_c"] = self._lu.perm_c
+        else:
+            self._matrix = kernel
+        data["kernel_polynomial"] = self._solve_kernel(self.polynomial)
+        return data
+
+    def _load(self, data):
+        """Set up the solve from the factorization arrays."""
+        self._data = data
+        if self.solver == ITERATIVE and self._matrix is None:
+            if self.compact:
+                self._matrix = self._kernel_matrix()
+            else:
+                self._matrix = get_system_matrix(
+                    self.source_points, self.rbf, self.radius
+                )
+        if self.compact:
+            self._schur = self.polynomial.T @ data["kernel_polynomial"]
+            if self.solver == DIRECT and self._lu is None:
+                size = self.source_points.shape[0]
+                self._lower = csr_matrix(
+                    (data["l_data"], data["l_indices"], data["l_indptr"]),
+                    shape=(size, size),
+                )
+                self._upper = csr_matrix(
+                    (data["u_data"], data["u_indices"], data["u_indptr"]),
+                    shape=(size, size),
+                )
+
+    def _kernel_matrix(self):
+        return get_sparse_distance_matrix(
+            self.source_points, self.source_points, self.rbf, self.radius
+        ).tocsc()
+
+    def _solve_kernel(self, b):
+        """Solve the sparse kernel matrix of a compact support rbf."""
+        if self.solver == ITERATIVE:
+            return _solve_iterative(cg, self._matrix, b)
+        if self._lu is not None:
+            return self._lu.solve(b)
+        # Factors loaded from the cache: Pr K Pc = L U
+        y = np.empty(b.shape)
+        y[self._data["perm_r"]] = b
+        y = spsolve_triangular(self._lower, y, lower=True, unit_diagonal=True)
+        y = spsolve_triangular(self._upper, y, lower=False)
+        return y[self._data["perm_c"]]
+
+    def solve(self, target_points):
+        """Get the weight matrix of modified source points.
+
+        :param target_points: (N x 3) modified source points or a (targets x N x 3)
+            array of many modified sources.  N is the vertex count of the source
+            points given to the constructor.
+        :return: (N + 4 x 3) weight matrix, or (targets x N + 4 x 3) weight matrices.
+        """
+        target_points = np.asarray(target_points, dtype=np.float64)
+        if target_points.shape[-2] != self.vertex_count:
+            raise RuntimeError(
+                "Expected {} target points, got {}".format(
+                    self.vertex_count, target_points.shape[-2]
+                )
+            )
+        single = target_points.ndim == 2
+        if single:
+            target_points = target_points[np.newaxis]
+        if self.indices is not None:
+            target_points = target_points[:, self.indices]
+        target_count = target_points.shape[0]
+        size = self.source_points.shape[0]
+        # Solve every axis of every target as one block of right hand side columns
+        b = target_points.transpose(1, 0, 2).reshape(size, target_count * 3)
+
+        if self.compact:
+            kernel_tp = self._solve_kernel(b)
+            constants = solve(self._schur, self.polynomial.T @ kernel_tp)
+            weights = kernel_tp - self._data["kernel_polynomial"] @ constants
+            weights = np.vstack([weights, constants])
+        else:
+            b = np.vstack([b, np.zeros((4, b.shape[1]))])
+            if self.solver == DIRECT:
+                weights = lu_solve((self._data["lu"], self._data["piv"]), b)
+            else:
+                # The system is symmetric but indefinite
+                try:
+                    weights = _solve_iterative(minres, self._matrix, b)
+                    residual = np.linalg.norm(self._matrix @ weights - b)
+                    if residual > 1e-8 * max(np.linalg.norm(b), 1.0):
+                        raise RuntimeError("The RBF solve is inaccurate.")
+                except RuntimeError:
+                    # Smooth kernels such as the gaussian are too ill-conditioned
+                    # for MINRES so fall back to the direct solve
+                    if self._fallback_lu is None:
+                        self._fallback_lu = lu_factor(self._matrix)
+                    weights = lu_solve(self._fallback_lu, b)
+
+        weights = weights.reshape(size + 4, target_count, 3).transpose(1, 0, 2)
+        return weights[0] if single else weights
+
+    def deform(self, points, weights, max_memory=DEFAULT_MAX_MEMORY):
+        """Evaluate the RBF deformation of points.
+
+        :param points: (M x 3) points to deform
+        :param weights: (N + 4 x 3) weight matrix from solve
+        :param max_memory: Approximate memory ceiling in bytes.
+        :return: (M x 3) deformed points
+        """
+        return deform_points(
+            points,
+            self.source_points,
+            weights,
+            self.rbf,
+            self.radius,
+            max_memory=max_memory,
+        )
+
+    def deform_shapes(
+        self, shape_points, weights, max_memory=DEFAULT_MAX_MEMORY, max_workers=None
+    ):
+        """Evaluate the RBF deformation of many point arrays on a process pool.
+
+        :param shape_points: List of (M x 3) points to deform
+        :param weights: (N + 4 x 3) weight matrix from solve
+        :param max_memory: Approximate memory ceiling in bytes shared by all workers.
+        :param max_workers: Maximum number of worker processes.  1 evaluates the shapes
+            in the calling process.
+        :return: List of the (M x 3) deformed points
+        """
+        return deform_shapes(
+            shape_points,
+            self.source_points,
+            weights,
+            self.rbf,
+            self.radius,
+            max_memory,
+            max_workers,
+        )
+
+
+def get_system_matrix(sp, rbf, radius):
+    """Get the matrix A in Ax=B
+
+    The matrix holds the kernel values between the control points and the constraints
+    of the constant and linear terms.
+
+    :param sp: Source control point array
+    :param rbf: Rbf function from class RBF
+    :param radius: Smoothing parameter
 
-    :return: Weight matrix
+    :return: (N + 4 x N + 4) numpy array
     """
-    identity = np.ones((sp.shape[0], 1))
+    polynomial = get_polynomial_matrix(sp)
     dist = get_distance_matrix(sp, sp, rbf, radius)
-    # Solve x for Ax=B
-    dim = 3
-    a = np.bmat(
-        [
-            [dist, identity, sp],
-            [identity.T, np.zeros((1, 1)), np.zeros((1, dim))],
-            [sp.T, np.zeros((dim, 1)), np.zeros((dim, dim))],
+    return np.block([[dist, polynomial], [polynomial.T, np.zeros((4, 4))]])
+
+
+def get_polynomial_matrix(points):
+    """Get the [1, x, y, z] rows of the constant and linear terms.
+
+    :param points: (N x 3) points
+    :return: (N x 4) numpy array
+    """
+    return np.hstack([np.ones((points.shape[0], 1)), points])
+
+
+# scipy 1.12 renamed the tolerance of the iterative solvers from tol to rtol and 1.14
+# removed tol.  Maya 2022 runs Python 3.7 which stops at scipy 1.7.
+_TOLERANCE_KEYWORD = "rtol" if "rtol" in inspect.signature(cg).parameters else "tol"
+
+
+def _solve_iterative(method, a, b):
+    """Solve each column of b with a scipy.sparse.linalg iterative method."""
+    x = np.empty(b.shape)
+    tolerance = {_TOLERANCE_KEYWORD: 1e-10}
+    for column in range(b.shape[1]):
+        x[:, column], info = method(a, b[:, column], **tolerance)
+        if info > 0:
+            raise RuntimeError("The RBF solve did not converge.")
+    return x
+
+
+def _csr_arrays(matrix):
+    matrix = matrix.tocsr()
+    return matrix.data, matrix.indices, matrix.indptr
+
+
+def deform_shapes(
+    shape_points,
+    sp,
+    weights,
+    rbf,
+    radius,
+    max_memory=DEFAULT_MAX_MEMORY,
+    max_workers=None,
+):
+    """Evaluate the RBF deformation of many point arrays on a process pool.
+
+    Each worker evaluates one point array at a time in chunks of rows.  The memory
+    ceiling is split between the workers.
+
+    :param shape_points: List of (M x 3) points to deform
+    :param sp: Source control point array the weights were solved for
+    :param weights: Weight matrix from get_weight_matrix
+    :param rbf: Rbf function from class RBF
+    :param radius: Smoothing parameter
+    :param max_memory: Approximate memory ceiling in bytes shared by all workers.
+    :param max_workers: Maximum number of worker processes.  1 evaluates the shapes in
+        the calling process.
+    :return: List of the (M x 3) deformed points
+    """
+    from ywta.utility.parallel import process_pool
+
+    shape_points = [np.asarray(points, dtype=np.float64) for points in shape_points]
+    workers = min(max_workers or os.cpu_count() or 1, len(shape_points))
+    if workers < 2:
+        return [
+            deform_points(points, sp, weights, rbf, radius, max_memory=max_memory)
+            for points in shape_points
         ]
-    )
-    b = np.bmat([[tp], [np.zeros((1, dim))], [np.zeros((dim, dim))]])
-    weights = np.linalg.solve(a, b)
-    return weights
+    count = len(shape_points)
+    with process_pool(workers) as executor:
+        return list(
+            executor.map(
+                deform_points,
+                shape_points,
+                [sp] * count,
+                [weights] * count,
+                [rbf] * count,
+                [radius] * count,
+                [None] * count,
+                [max_memory // workers] * count,
+            )
+        )
+
+
+def deform_points(
+    points, sp, weights, rbf, radius, chunk_size=None, max_memory=DEFAULT_MAX_MEMORY
+):
+    """Evaluate the RBF deformation of points.
+
+    :param points: (M x 3) points to deform
+    :param sp: Source control point array the weights were solved for
+    :param weights: Weight matrix from get_weight_matrix
+    :param rbf: Rbf function from class RBF
+    :param radius: Smoothing parameter
+    :param chunk_size: Number of points evaluated at a time.  Defaults to the number
+        of points that fit in max_memory.
+    :param max_memory: Approximate memory ceiling in bytes.
+    :return: (M x 3) deformed points
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n_sources = sp.shape[0]
+    if chunk_size is None:
+        chunk_size = get_chunk_size(n_sources, max_memory)
+    kernel_weights = weights[:n_sources]
+    polynomial_weights = weights[n_sources:]
+    tree = cKDTree(sp) if RBF.is_compact(rbf) else None
+
+    deformed = np.empty(points.shape)
+    for start in range(0, points.shape[0], chunk_size):
+        chunk = points[start : start + chunk_size]
+        if tree is not None:
+            dist = get_sparse_distance_matrix(chunk, sp, rbf, radius, tree)
+        else:
+            dist = get_distance_matrix(chunk, sp, rbf, radius)
+        result = dist @ kernel_weights
+        result += polynomial_weights[0]
+        result += chunk @ polynomial_weights[1:]
+        deformed[start : start + chunk_size] = result
+    return deformed
+
+
+def get_chunk_size(n_sources, max_memory=DEFAULT_MAX_MEMORY):
+    """Get the number of points whose distance matrix fits in a memory ceiling.
+
+    :param n_sources: Number of control points
+    :param max_memory: Memory ceiling in bytes
+    :return: Number of points evaluated at a time
+    """
+    # The float64 distance matrix and the kernel temporaries
+    return max(1, int(max_memory // (n_sources * 8 * 3)))
 
 
 def get_distance_matrix(v1, v2, rbf, radius):
@@ -100,15 +819,54 @@ def get_distance_matrix(v1, v2, rbf, radius):
     return matrix
 
 
+def get_sparse_distance_matrix(v1, v2, rbf, radius, tree=None):
+    """Get the kernel matrix of a compact support rbf as a sparse matrix.
+
+    Only the point pairs closer than radius are computed.
+
+    :param v1: (N x 3) points
+    :param v2: (M x 3) points
+    :param rbf: Compact support rbf function from class RBF
+    :param radius: Support radius
+    :param tree: Optional cKDTree of v2
+    :return: (N x M) scipy csr_matrix
+    """
+    if tree is None:
+        tree = cKDTree(v2)
+    pairs = cKDTree(v1).sparse_distance_matrix(tree, radius, output_type="ndarray")
+    values = rbf(pairs["v"], radius)
+    return coo_matrix(
+        (values, (pairs["i"], pairs["j"])), shape=(v1.shape[0], v2.shape[0])
+    ).tocsr()
+
+
 def set_points(mesh, points):
-    path = shortcuts.get_dag_path2(shortcuts.get_shape(mesh))
-    mesh_fn = OpenMaya.MFnMesh(path)
-    mesh_fn.setPoints(points)
+    mayaarrays.set_points(mesh, points)
 
 
 class RBF(object):
     """Various RBF kernels"""
 
+    @classmethod
+    def names(cls):
+        """Get the names of the rbf functions."""
+        return [
+            "linear",
+            "gaussian",
+            "thin_plate",
+            "multi_quadratic_biharmonic",
+            "inv_multi_quadratic_biharmonic",
+            "beckert_wendland_c2_basis",
+        ]
+
+    @classmethod
+    def is_compact(cls, rbf):
+        """Get whether an rbf is zero beyond its radius.
+
+        :param rbf: Rbf function from class RBF
+        """
+        return rbf == cls.beckert_wendland_c2_basis
+
     @classmethod
     def linear(cls, matrix, radius):
         return matrix
@@ -123,9 +881,8 @@ class RBF(object):
         result = matrix / radius
         result *= matrix
 
-        np.warnings.filterwarnings("ignore")
-        result = np.where(result > 0, np.log(result), result)
-        np.warnings.filterwarnings("always")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = np.where(result > 0, np.log(result), result)
 
         return result
 
@@ -147,3 +904,7 @@ class RBF(object):
         second = (4 * arg) + 1
         result = first * second
         return result
+
+
+if __name__ == "__main__":
+    main()
@@ -361,13 +361,10 @@ def resetBindPose():
 
 
 def get_skinCluster_list(allJnt):
-    skinClusterList = []
-    for jnt in allJnt:
-        scTmp = cmds.listConnections(jnt, type="skinCluster")
-        if scTmp is not None:
-            scTmp = list(set(scTmp))
-            for i in scTmp:
-                skinClusterList.append(i)
+    # 全ジョイントの接続を一度にクエリする
+    if not allJnt:
+        return []
+    skinClusterList = cmds.listConnections(allJnt, type="skinCluster") or []
     return list(set(skinClusterList))
 
 
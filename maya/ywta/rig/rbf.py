@@ -1,6 +1,9 @@
 import maya.cmds as cmds
 import maya.api.OpenMaya as OpenMaya
-import math
+import numpy as np
+
+import ywta.shortcuts as shortcuts
+import ywta.utility.quaternion as quaternion
 
 
 class RBF(object):
@@ -294,37 +297,68 @@ class RBF(object):
         :param rotation_type:
         :return: True if the sample already exists.
         """
-        indices = cmds.getAttr("{}.sample".format(self.name), mi=True) or []
+        indices, rotation_types, values, quats = self.sample_inputs(
+            len(input_values), len(input_rotations)
+        )
         if not indices:
             return False
         threshold = 0.0001
-        for idx in indices:
-            rt = cmds.getAttr("{}.sample[{}].rotationType".format(self.name, idx))
-            if rotation_type != rt:
-                continue
-            sample_is_same = True
-            for i, v1 in enumerate(input_values):
-                v2 = cmds.getAttr(
-                    "{}.sample[{}].sampleInputValue[{}]".format(self.name, idx, i)
-                )
-                if math.fabs(v1 - v2) > threshold:
-                    sample_is_same = False
-                    break
-
-            for i, v1 in enumerate(input_rotations):
-                v2 = cmds.getAttr(
-                    "{}.sample[{}].sampleInputQuat[{}]".format(self.name, idx, i)
-                )[0]
-                q1 = OpenMaya.MQuaternion(*v1)
-                q2 = OpenMaya.MQuaternion(*v2)
-                d = quaternion_distance(q1, q2)
-
-                if d > threshold:
-                    sample_is_same = False
-                    break
-            if sample_is_same:
-                return True
-        return False
+        # Compare the inputs of every sample at once
+        input_values = np.asarray(input_values, dtype=np.float64).reshape(1, -1)
+        input_rotations = np.asarray(input_rotations, dtype=np.float64)
+        same = rotation_types == rotation_type
+        same &= np.all(np.abs(values - input_values) <= threshold, axis=1)
+        distance = quaternion.distance(quats, input_rotations.reshape(1, -1, 4))
+        same &= np.all(distance <= threshold, axis=1)
+        return bool(np.any(same))
+
+    def sample_inputs(self, value_count=None, quat_count=None):
+        """Get the inputs of every sample.
+
+        The whole sample array is read from a single data handle of the sample plug
+        instead of a plug or getAttr per sample and input.
+
+        :param value_count: Number of input values read per sample.  Defaults to the
+            input value count of the node.
+        :param quat_count: Number of input quaternions read per sample.  Defaults to the
+            input quat count of the node.
+        :return: Tuple of the list of sample indices, the (samples) rotation types, the
+            (samples x inputs) input values and the (samples x input transforms x 4)
+            input quaternions.
+        """
+        if value_count is None:
+            value_count = cmds.getAttr("{}.inputValueCount".format(self.name))
+        if quat_count is None:
+            quat_count = cmds.getAttr("{}.inputQuatCount".format(self.name))
+        fn_node = OpenMaya.MFnDependencyNode(shortcuts.get_mobject(self.name))
+        sample_plug = fn_node.findPlug("sample", False)
+        rotation_type_attribute = fn_node.attribute("rotationType")
+        value_attribute = fn_node.attribute("sampleInputValue")
+        quat_attribute = fn_node.attribute("sampleInputQuat")
+
+        handle = sample_plug.asMDataHandle()
+        try:
+            samples = OpenMaya.MArrayDataHandle(handle)
+            sample_count = len(samples)
+            indices = []
+            rotation_types = np.empty(sample_count, dtype=np.int64)
+            values = np.zeros((sample_count, value_count))
+            quats = np.zeros((sample_count, quat_count, 4))
+            quats[..., 3] = 1.0
+            for i in range(sample_count):
+                samples.jumpToPhysicalElement(i)
+                indices.append(samples.elementLogicalIndex())
+                sample = samples.inputValue()
+                rotation_types[i] = sample.child(rotation_type_attribute).asShort()
+                for j, element in _array_elements(sample.child(value_attribute)):
+                    if j < value_count:
+                        values[i, j] = element.asDouble()
+                for j, element in _array_elements(sample.child(quat_attribute)):
+                    if j < quat_count:
+                        quats[i, j] = OpenMaya.MFnNumericData(element.data()).getData()
+        finally:
+            sample_plug.destructHandle(handle)
+        return indices, rotation_types, values, quats
 
     def remove_sample(self, i):
         """Remove the sample at index i
@@ -338,37 +372,52 @@ class RBF(object):
 
 
 def quaternion_distance(q1, q2):
-    dot = quaternion_dot(q1, q2)
-    return math.acos(2.0 * dot * dot - 1.0) / math.pi
+    return float(quaternion.distance(q1, q2))
 
 
 def quaternion_dot(q1, q2):
-    value = (q1.x * q2.x) + (q1.y * q2.y) + (q1.z * q2.z) + (q1.w * q2.w)
-    # Clamp any floating point error
-    if value < -1.0:
-        value = -1.0
-    elif value > 1.0:
-        value = 1.0
-    return value
+    return float(quaternion.dot(q1, q2))
+
+
+def _array_elements(handle):
+    """Iterate over the elements of an array data handle.
+
+    :param handle: MDataHandle of an array attribute
+    :return: Generator of (logical index, MDataHandle) tuples
+    """
+    elements = OpenMaya.MArrayDataHandle(handle)
+    for i in range(len(elements)):
+        elements.jumpToPhysicalElement(i)
+        yield elements.elementLogicalIndex(), elements.inputValue()
 
 
 def euler_to_quat(eulers, transforms):
     """Convert a list of eulers to quaternions
 
+    The rotate orders and joint orients are read once per unique transform with the
+    API instead of with getAttr and nodeType per rotation.
+
     :param eulers: List of tuples or lists of length 3
     :param transforms: List of transforms per rotation
     :return: List of quaternions
     """
-    quats = []
-    for i, v in enumerate(eulers):
-        rotate_order = cmds.getAttr("{}.ro".format(transforms[i]))
-        r = [math.radians(x) for x in v]
-        euler = OpenMaya.MEulerRotation(r[0], r[1], r[2], rotate_order)
-        q = euler.asQuaternion()
-        if cmds.nodeType(transforms[i]) == "joint":
-            jo = cmds.getAttr("{}.jo".format(transforms[i]))[0]
-            jo = [math.radians(x) for x in jo]
-            jo = OpenMaya.MEulerRotation(jo[0], jo[1], jo[2])
-            q *= jo.asQuaternion()
-        quats.append([q.x, q.y, q.z, q.w])
-    return quats
+    if not eulers:
+        return []
+    transforms = transforms[: len(eulers)]
+    # Transform: (rotate order, joint orient)
+    attributes = {}
+    for transform in set(transforms):
+        node = shortcuts.get_mobject(transform)
+        fn_node = OpenMaya.MFnDependencyNode(node)
+        rotate_order = fn_node.findPlug("rotateOrder", False).asShort()
+        joint_orient = (0.0, 0.0, 0.0)
+        if node.hasFn(OpenMaya.MFn.kJoint):
+            plug = fn_node.findPlug("jointOrient", False)
+            # The plug values are in internal units, radians
+            joint_orient = tuple(plug.child(j).asDouble() for j in range(3))
+        attributes[transform] = (rotate_order, joint_orient)
+    rotate_orders = [attributes[x][0] for x in transforms]
+    joint_orients = [attributes[x][1] for x in transforms]
+    quats = quaternion.from_euler(eulers, rotate_orders, degrees=True)
+    quats = quaternion.multiply(quats, quaternion.from_euler(joint_orients))
+    return quats.tolist()
@@ -1,6 +1,5 @@
 import functools
 import maya.cmds as cmds
-import maya.mel as mel
 import math as math
 import ywta.deform.skinio as skinio
 
@@ -51,7 +50,13 @@ def duplicate_skinned_mesh():
     cmds.select(mesh)
     cmds.select(dup_mesh,add=True)
 
-    mel.eval('CopySkinWeights')
+    # ywtaのウェイト転送で最近接点のウェイトをコピー
+    skinio.SkinCluster(skincluster_dup[0]).set_data(
+        skinio.transfer_data(
+            skinio.SkinCluster(skin_cluster).gather_data(include_geometry=True),
+            skinio.get_mesh_geometry(dup_mesh)[0],
+        )
+    )
     #cmds.copySkinWeights(ss=skin_cluster, ds=skincluster_dup, noMirror=True, surfaceAssociation='closestPoint', influenceAssociation=['name','closestJoint', 'label'])
     # ウェイトをコピー
     # for i, influence in enumerate(influences):
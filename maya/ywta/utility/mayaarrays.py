@@ -0,0 +1,458 @@
+"""Move point, normal, color and weight arrays between Maya and numpy.
+
+Converting OpenMaya arrays element by element creates a Python object per vertex which
+dominates the run time of numpy based tools on dense meshes.  The functions in this
+module copy whole arrays at once instead:
+
+* Object space points are copied straight from the internal float buffer of the mesh
+  returned by the API 1 MFnMesh.getRawPoints.  The buffer is only read.  Points are
+  written with a single MFnMesh.setPoints call so the DG and undo see the change.
+* API 1 arrays are copied into a packed C buffer with their get method and the buffer
+  is viewed as a numpy array.  Skin weights are read through the API 1 MFnSkinCluster
+  for the same reason.
+* API 2 arrays do not expose their memory and are still converted element by element
+  by numpy, so they are avoided on the hot paths.
+
+All functions go through a backend.  MayaBackend is used inside Maya.  PythonBackend is a
+stand-in that stores meshes as Python lists so code using this module can be run and
+tested without Maya.
+
+Example Usage
+=============
+
+    import ywta.utility.mayaarrays as mayaarrays
+
+    points = mayaarrays.get_points("body")
+    mayaarrays.set_points("body", points * 2.0)
+    normals = mayaarrays.get_normals("body", world=True)
+    colors = mayaarrays.get_vertex_colors("body", "mask")
+    weights = mayaarrays.get_skin_weights("skinCluster1")
+
+    # Without Maya
+    backend = mayaarrays.PythonBackend()
+    backend.add_mesh("body", [[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+    mayaarrays.set_backend(backend)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import ctypes
+
+import numpy as np
+
+_backend = None
+
+# API 1 array type: (MScriptUtil pointer method, ctypes type, values per element)
+_API1_LAYOUTS = {
+    "MPointArray": ("asDouble4Ptr", ctypes.c_double, 4),
+    "MFloatPointArray": ("asFloat4Ptr", ctypes.c_float, 4),
+    "MVectorArray": ("asDouble3Ptr", ctypes.c_double, 3),
+    "MFloatVectorArray": ("asFloat3Ptr", ctypes.c_float, 3),
+    "MColorArray": ("asFloat4Ptr", ctypes.c_float, 4),
+    "MDoubleArray": ("asDoublePtr", ctypes.c_double, 1),
+    "MFloatArray": ("asFloatPtr", ctypes.c_float, 1),
+    "MIntArray": ("asIntPtr", ctypes.c_int, 1),
+}
+
+# ctypes type: API 1 array of the same type used to allocate scratch buffers
+_SCRATCH_ARRAYS = {
+    ctypes.c_double: "MDoubleArray",
+    ctypes.c_float: "MFloatArray",
+    ctypes.c_int: "MIntArray",
+}
+
+
+def get_backend():
+    """Get the active backend.
+
+    :return: MayaBackend if Maya can be imported, PythonBackend otherwise.
+    """
+    global _backend
+    if _backend is None:
+        try:
+            import maya.OpenMaya  # noqa: F401
+
+            _backend = MayaBackend()
+        except ImportError:
+            _backend = PythonBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """Set the backend used by the module functions.
+
+    :param backend: MayaBackend, PythonBackend or None to pick the default again.
+    """
+    global _backend
+    _backend = backend
+
+
+def get_points(mesh, world=False, dtype=np.float64):
+    """Get the points of a mesh.
+
+    :param mesh: Mesh name
+    :param world: True for world space points, object space otherwise.
+    :param dtype: Type of the returned array.
+    :return: (N x 3) numpy array
+    """
+    return get_backend().get_points(mesh, world).astype(dtype, copy=False)
+
+
+def set_points(mesh, points):
+    """Set the object space points of a mesh.
+
+    :param mesh: Mesh name
+    :param points: (N x 3) points
+    """
+    get_backend().set_points(mesh, np.asarray(points))
+
+
+def get_normals(mesh, world=False):
+    """Get the vertex normals of a mesh.
+
+    :param mesh: Mesh name
+    :param world: True for world space normals, object space otherwise.
+    :return: (N x 3) numpy array
+    """
+    return get_backend().get_normals(mesh, world)
+
+
+def get_vertex_colors(mesh, colorset=None):
+    """Get the vertex colors of a mesh.
+
+    :param mesh: Mesh name
+    :param colorset: Color set name.  The current color set is used by default.
+    :return: (N x 4) rgba numpy array.  Vertices without a color are -1.
+    """
+    return get_backend().get_vertex_colors(mesh, colorset)
+
+
+def get_skin_weights(skin_cluster):
+    """Get the weights of a skinCluster.
+
+    :param skin_cluster: skinCluster name
+    :return: (vertices x influences) numpy array in influence index order
+    """
+    return get_backend().get_skin_weights(skin_cluster)
+
+
+def get_blend_weights(skin_cluster):
+    """Get the dual quaternion blend weights of a skinCluster.
+
+    :param skin_cluster: skinCluster name
+    :return: 1D numpy array with a weight per vertex
+    """
+    return get_backend().get_blend_weights(skin_cluster)
+
+
+def to_numpy(array, dtype=np.float64):
+    """Convert an OpenMaya array or a sequence into a numpy array.
+
+    :param array: API 1 or API 2 point, vector, color, double, float or int array.
+    :param dtype: Type of the returned array.
+    :return: (N x components) numpy array for point, vector and color arrays, 1D
+        otherwise.  Points keep their w component.
+    """
+    return get_backend().to_numpy(array).astype(dtype, copy=False)
+
+
+def to_point_array(points):
+    """Convert (N x 3) points into an API 2 MPointArray.
+
+    :param points: (N x 3) numpy array
+    :return: MPointArray
+    """
+    return get_backend().to_point_array(np.asarray(points))
+
+
+def to_double_array(values):
+    """Convert values into an API 2 MDoubleArray.
+
+    :param values: 1D numpy array
+    :return: MDoubleArray
+    """
+    return get_backend().to_double_array(np.asarray(values).ravel())
+
+
+class PythonBackend(object):
+    """Stand-in backend storing meshes as Python lists.
+
+    Arrays are plain Python lists where Maya would return OpenMaya arrays, e.g. points
+    are lists of [x, y, z, w].
+    """
+
+    def __init__(self):
+        self.meshes = {}
+        self.skin_clusters = {}
+
+    def add_mesh(self, name, points, normals=None, colors=None):
+        """Add a mesh to the stand-in scene.
+
+        :param name: Mesh name
+        :param points: List of [x, y, z] points
+        :param normals: Optional list of [x, y, z] vertex normals
+        :param colors: Optional dictionary of {color set: list of [r, g, b, a]}
+        """
+        self.meshes[name] = {
+            "points": [list(p)[:3] for p in points],
+            "normals": [list(n) for n in normals or []],
+            "colors": {k: [list(c) for c in v] for k, v in (colors or {}).items()},
+        }
+
+    def add_skin_cluster(self, name, weights, blend_weights=None):
+        """Add a skinCluster to the stand-in scene.
+
+        :param name: skinCluster name
+        :param weights: List of the influence weights of each vertex
+        :param blend_weights: Optional list of a blend weight per vertex
+        """
+        self.skin_clusters[name] = {
+            "weights": [list(w) for w in weights],
+            "blendWeights": list(blend_weights or [0.0] * len(weights)),
+        }
+
+    def _get_skin_cluster(self, skin_cluster):
+        if skin_cluster not in self.skin_clusters:
+            raise RuntimeError("skinCluster {} does not exist".format(skin_cluster))
+        return self.skin_clusters[skin_cluster]
+
+    def _get_mesh(self, mesh):
+        if mesh not in self.meshes:
+            raise RuntimeError("Mesh {} does not exist".format(mesh))
+        return self.meshes[mesh]
+
+    def get_points(self, mesh, world=False):
+        return np.array(self._get_mesh(mesh)["points"], dtype=np.float64).reshape(-1, 3)
+
+    def set_points(self, mesh, points):
+        data = self._get_mesh(mesh)
+        if len(points) != len(data["points"]):
+            raise RuntimeError(
+                "{} has {} vertices, expected {}".format(
+                    mesh, len(data["points"]), len(points)
+                )
+            )
+        data["points"] = np.asarray(points)[:, :3].tolist()
+
+    def get_normals(self, mesh, world=False):
+        return np.array(self._get_mesh(mesh)["normals"], dtype=np.float64).reshape(
+            -1, 3
+        )
+
+    def get_vertex_colors(self, mesh, colorset=None):
+        data = self._get_mesh(mesh)
+        colors = data["colors"]
+        if colorset is None:
+            colorset = sorted(colors)[0] if colors else None
+        if colorset not in colors:
+            return -np.ones((len(data["points"]), 4))
+        return np.array(colors[colorset], dtype=np.float64).reshape(-1, 4)
+
+    def get_skin_weights(self, skin_cluster):
+        weights = self._get_skin_cluster(skin_cluster)["weights"]
+        return np.array(weights, dtype=np.float64).reshape(len(weights), -1)
+
+    def get_blend_weights(self, skin_cluster):
+        blend_weights = self._get_skin_cluster(skin_cluster)["blendWeights"]
+        return np.array(blend_weights, dtype=np.float64)
+
+    def to_numpy(self, array):
+        return np.array([list(x) if _is_sequence(x) else x for x in array])
+
+    def to_point_array(self, points):
+        return [list(p[:3]) + [1.0] for p in points.tolist()]
+
+    def to_double_array(self, values):
+        return values.tolist()
+
+
+class MayaBackend(object):
+    """Backend using the OpenMaya APIs."""
+
+    def get_points(self, mesh, world=False):
+        if not world:
+            return _get_raw_points(mesh)[1].copy()
+        import maya.OpenMaya as OpenMaya1
+
+        fn_mesh = _get_api1_mfnmesh(mesh)
+        points = OpenMaya1.MPointArray()
+        fn_mesh.getPoints(points, OpenMaya1.MSpace.kWorld)
+        return self.to_numpy(points)[:, :3]
+
+    def set_points(self, mesh, points):
+        """The points are set with a single MFnMesh.setPoints call so the change
+        propagates through the DG and is stored in the tweaks of meshes with history.
+        """
+        import maya.api.OpenMaya as OpenMaya2
+        import ywta.shortcuts as shortcuts
+
+        fn_mesh = OpenMaya2.MFnMesh(shortcuts.get_dag_path(_get_shape(mesh)))
+        if fn_mesh.numVertices != len(points):
+            raise RuntimeError(
+                "{} has {} vertices, expected {}".format(
+                    mesh, fn_mesh.numVertices, len(points)
+                )
+            )
+        fn_mesh.setPoints(self.to_point_array(points))
+
+    def get_normals(self, mesh, world=False):
+        import maya.OpenMaya as OpenMaya1
+
+        fn_mesh = _get_api1_mfnmesh(mesh)
+        normals = OpenMaya1.MFloatVectorArray()
+        space = OpenMaya1.MSpace.kWorld if world else OpenMaya1.MSpace.kObject
+        fn_mesh.getVertexNormals(False, normals, space)
+        return self.to_numpy(normals)
+
+    def get_vertex_colors(self, mesh, colorset=None):
+        import maya.OpenMaya as OpenMaya1
+
+        fn_mesh = _get_api1_mfnmesh(mesh)
+        if colorset is None:
+            colorset = fn_mesh.currentColorSetName()
+        # The API 1 array is copied in bulk through its C buffer
+        colors = OpenMaya1.MColorArray()
+        fn_mesh.getVertexColors(colors, colorset)
+        return self.to_numpy(colors).astype(np.float64)
+
+    def get_skin_weights(self, skin_cluster):
+        import maya.OpenMaya as OpenMaya1
+
+        fn_skin, path, components = _get_api1_skin_cluster(skin_cluster)
+        weights = OpenMaya1.MDoubleArray()
+        util = OpenMaya1.MScriptUtil()
+        util.createFromInt(0)
+        count_pointer = util.asUintPtr()
+        fn_skin.getWeights(path, components, weights, count_pointer)
+        influence_count = OpenMaya1.MScriptUtil.getUint(count_pointer)
+        return self.to_numpy(weights).reshape(-1, influence_count)
+
+    def get_blend_weights(self, skin_cluster):
+        import maya.OpenMaya as OpenMaya1
+
+        fn_skin, path, components = _get_api1_skin_cluster(skin_cluster)
+        weights = OpenMaya1.MDoubleArray()
+        fn_skin.getBlendWeights(path, components, weights)
+        return self.to_numpy(weights)
+
+    def to_numpy(self, array):
+        layout = _API1_LAYOUTS.get(type(array).__name__)
+        if layout is None or not hasattr(array, "length"):
+            # API 2 arrays do not expose their memory
+            return np.array(array, dtype=np.float64)
+        return _api1_to_numpy(array, *layout)
+
+    def to_point_array(self, points):
+        import maya.api.OpenMaya as OpenMaya2
+
+        return OpenMaya2.MPointArray(np.asarray(points, dtype=np.float64).tolist())
+
+    def to_double_array(self, values):
+        import maya.api.OpenMaya as OpenMaya2
+
+        return OpenMaya2.MDoubleArray(np.asarray(values, dtype=np.float64).tolist())
+
+
+def _is_sequence(value):
+    return hasattr(value, "__len__") and not isinstance(value, str)
+
+
+def _api1_to_numpy(array, pointer_method, c_type, components):
+    """Copy an API 1 array into a numpy array through a packed C buffer.
+
+    :param array: API 1 array
+    :param pointer_method: MScriptUtil method returning a pointer of the array layout.
+    :param c_type: ctypes type of a single value.
+    :param components: Number of values per element.
+    :return: numpy array
+    """
+    import maya.OpenMaya as OpenMaya1
+
+    count = array.length()
+    size = count * components
+    if not count:
+        return np.zeros((0, components) if components > 1 else 0)
+    if components == 1:
+        # The MScriptUtil copies the values of double, float and int arrays itself
+        util = OpenMaya1.MScriptUtil(array)
+        pointer = getattr(util, pointer_method)()
+    else:
+        # Allocate the scratch buffer in C instead of from a Python list
+        scratch = getattr(OpenMaya1, _SCRATCH_ARRAYS[c_type])(size, 0)
+        util = OpenMaya1.MScriptUtil(scratch)
+        pointer = getattr(util, pointer_method)()
+        array.get(pointer)
+    buffer = (c_type * size).from_address(int(pointer))
+    result = np.ctypeslib.as_array(buffer).copy()
+    return result.reshape(count, components) if components > 1 else result
+
+
+def _get_api1_mfnmesh(mesh):
+    """Get the API 1 MFnMesh of a mesh.
+
+    :param mesh: Mesh name
+    :return: maya.OpenMaya.MFnMesh
+    """
+    import maya.OpenMaya as OpenMaya1
+
+    selection = OpenMaya1.MSelectionList()
+    selection.add(_get_shape(mesh))
+    path = OpenMaya1.MDagPath()
+    selection.getDagPath(0, path)
+    return OpenMaya1.MFnMesh(path)
+
+
+def _get_api1_skin_cluster(skin_cluster):
+    """Get the API 1 MFnSkinCluster of a skinCluster and its deformed components.
+
+    :param skin_cluster: skinCluster name
+    :return: Tuple of the maya.OpenMayaAnim.MFnSkinCluster, the MDagPath of the
+        deformed geometry and the MObject of its deformed components.
+    """
+    import maya.OpenMaya as OpenMaya1
+    import maya.OpenMayaAnim as OpenMayaAnim1
+
+    selection = OpenMaya1.MSelectionList()
+    selection.add(skin_cluster)
+    node = OpenMaya1.MObject()
+    selection.getDependNode(0, node)
+    fn_skin = OpenMayaAnim1.MFnSkinCluster(node)
+    members = OpenMaya1.MSelectionList()
+    OpenMaya1.MFnSet(fn_skin.deformerSet()).getMembers(members, False)
+    path = OpenMaya1.MDagPath()
+    components = OpenMaya1.MObject()
+    members.getDagPath(0, path, components)
+    return fn_skin, path, components
+
+
+def _get_shape(mesh):
+    """Get the shape of a mesh transform.  Shapes, including intermediate shapes, are
+    returned as is.
+
+    :param mesh: Mesh transform or shape name
+    :return: Shape name
+    """
+    import maya.cmds as cmds
+    import ywta.shortcuts as shortcuts
+
+    if cmds.objectType(mesh, isAType="shape"):
+        return mesh
+    return shortcuts.get_shape(mesh)
+
+
+def _get_raw_points(mesh):
+    """Get a numpy view of the internal float point buffer of a mesh.
+
+    :param mesh: Mesh name
+    :return: Tuple of the API 1 MFnMesh and the (N x 3) float32 view.  The view is only
+        valid while the mesh is not modified by anything else.
+    """
+    fn_mesh = _get_api1_mfnmesh(mesh)
+    count = fn_mesh.numVertices()
+    if not count:
+        return fn_mesh, np.zeros((0, 3), dtype=np.float32)
+    address = int(fn_mesh.getRawPoints())
+    buffer = (ctypes.c_float * (count * 3)).from_address(address)
+    return fn_mesh, np.ctypeslib.as_array(buffer).reshape(count, 3)
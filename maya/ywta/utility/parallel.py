@@ -0,0 +1,49 @@
+"""Helpers to run numpy work on multiple processes from inside Maya.
+
+Worker processes are started with the spawn method.  Inside the Maya GUI sys.executable
+is the Maya application which cannot run worker processes, so mayapy from the same
+installation is used instead.  Workers must only import modules that do not depend on
+Maya.
+
+Example Usage
+=============
+
+    from ywta.utility.parallel import process_pool
+
+    with process_pool() as executor:
+        results = list(executor.map(work, items))
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_pool(max_workers=None):
+    """Create a process pool that works both inside and outside of Maya.
+
+    :param max_workers: Maximum number of worker processes.  Defaults to the number of
+        cpus.
+    :return: ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context())
+
+
+def get_context():
+    """Get the multiprocessing context used to start worker processes.
+
+    :return: Spawn multiprocessing context
+    """
+    context = multiprocessing.get_context("spawn")
+    executable = os.path.basename(sys.executable).lower()
+    if executable.startswith("maya") and not executable.startswith("mayapy"):
+        mayapy = os.path.join(os.path.dirname(sys.executable), "mayapy")
+        if sys.platform == "win32":
+            mayapy += ".exe"
+        context.set_executable(mayapy)
+    return context
@@ -0,0 +1,201 @@
+"""Vectorized quaternion math on numpy arrays.
+
+Quaternions are stored in (..., 4) arrays of (x, y, z, w) like MQuaternion, and every
+function broadcasts over the leading dimensions so many rotations are processed in a
+single call.  multiply(a, b) matches a * b of MQuaternion: a is applied first.  Euler
+rotations use the Maya rotate order enum values of the rotateOrder attribute.
+
+The module does not depend on Maya.
+
+Example Usage
+=============
+
+    import ywta.utility.quaternion as quaternion
+
+    q = quaternion.from_euler([[90.0, 0.0, 0.0], [0.0, 45.0, 0.0]], degrees=True)
+    d = quaternion.distance(q, quaternion.identity())
+    swing, twist = quaternion.swing_twist(q, twist_axis=0)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+XYZ = 0
+YZX = 1
+ZXY = 2
+XZY = 3
+YXZ = 4
+ZYX = 5
+
+# Rotate order: Extrinsic scipy axis sequence.  Maya applies the first axis first.
+_EULER_SEQUENCES = ["xyz", "yzx", "zxy", "xzy", "yxz", "zyx"]
+# Rotate order: Indices of the x, y, z angles in the order of the sequence
+_EULER_AXES = [["xyz".index(axis) for axis in order] for order in _EULER_SEQUENCES]
+
+
+def identity(shape=()):
+    """Get identity quaternions.
+
+    :param shape: Leading dimensions of the returned array.
+    :return: (shape x 4) array
+    """
+    if isinstance(shape, int):
+        shape = (shape,)
+    q = np.zeros(tuple(shape) + (4,))
+    q[..., 3] = 1.0
+    return q
+
+
+def normalize(q):
+    q = np.asarray(q, dtype=np.float64)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def conjugate(q):
+    q = np.array(q, dtype=np.float64)
+    q[..., :3] *= -1.0
+    return q
+
+
+def multiply(a, b):
+    """Multiply quaternions with the MQuaternion convention: a is applied first.
+
+    :param a: (..., 4) quaternions
+    :param b: (..., 4) quaternions
+    :return: (..., 4) quaternions
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    ax, ay, az, aw = np.moveaxis(a, -1, 0)
+    bx, by, bz, bw = np.moveaxis(b, -1, 0)
+    # Hamilton product b * a
+    return np.stack(
+        [
+            bw * ax + bx * aw + by * az - bz * ay,
+            bw * ay - bx * az + by * aw + bz * ax,
+            bw * az + bx * ay - by * ax + bz * aw,
+            bw * aw - bx * ax - by * ay - bz * az,
+        ],
+        axis=-1,
+    )
+
+
+def dot(q1, q2):
+    """Get the clamped dot products of quaternions.
+
+    :param q1: (..., 4) quaternions
+    :param q2: (..., 4) quaternions
+    :return: (...) array in [-1, 1]
+    """
+    value = np.sum(np.asarray(q1) * np.asarray(q2), axis=-1)
+    # Clamp any floating point error
+    return np.clip(value, -1.0, 1.0)
+
+
+def distance(q1, q2):
+    """Get the angles between rotations normalized to [0, 1].
+
+    q and -q are the same rotation and have a distance of 0.
+
+    :param q1: (..., 4) quaternions
+    :param q2: (..., 4) quaternions
+    :return: (...) array where 1 is a 180 degree difference
+    """
+    d = dot(q1, q2)
+    return np.arccos(np.clip(2.0 * d * d - 1.0, -1.0, 1.0)) / np.pi
+
+
+def from_euler(eulers, rotate_order=XYZ, degrees=False):
+    """Convert euler rotations to quaternions.
+
+    :param eulers: (..., 3) euler rotations
+    :param rotate_order: Maya rotate order or an array of rotate orders, one per
+        rotation.
+    :param degrees: True if the eulers are in degrees, False for radians.
+    :return: (..., 4) quaternions
+    """
+    eulers = np.asarray(eulers, dtype=np.float64)
+    flat = eulers.reshape(-1, 3)
+    orders = np.broadcast_to(np.asarray(rotate_order), flat.shape[:1])
+    quats = np.empty((flat.shape[0], 4))
+    for order in np.unique(orders):
+        mask = orders == order
+        angles = flat[mask][:, _EULER_AXES[order]]
+        rotation = Rotation.from_euler(_EULER_SEQUENCES[order], angles, degrees=degrees)
+        quats[mask] = rotation.as_quat()
+    return quats.reshape(eulers.shape[:-1] + (4,))
+
+
+def to_euler(q, rotate_order=XYZ, degrees=False):
+    """Convert quaternions to euler rotations.
+
+    :param q: (..., 4) quaternions
+    :param rotate_order: Maya rotate order or an array of rotate orders, one per
+        quaternion.
+    :param degrees: True to return degrees, False for radians.
+    :return: (..., 3) euler rotations
+    """
+    q = np.asarray(q, dtype=np.float64)
+    flat = q.reshape(-1, 4)
+    orders = np.broadcast_to(np.asarray(rotate_order), flat.shape[:1])
+    eulers = np.empty((flat.shape[0], 3))
+    for order in np.unique(orders):
+        mask = orders == order
+        rotation = Rotation.from_quat(flat[mask])
+        angles = rotation.as_euler(_EULER_SEQUENCES[order], degrees=degrees)
+        eulers[np.ix_(np.flatnonzero(mask), _EULER_AXES[order])] = angles
+    return eulers.reshape(q.shape[:-1] + (3,))
+
+
+def slerp(qa, qb, t):
+    """Spherical linear interpolation along the shortest path.
+
+    :param qa: (..., 4) start quaternions
+    :param qb: (..., 4) end quaternions
+    :param t: Parameter or (...) parameters between 0.0 and 1.0
+    :return: (..., 4) quaternions
+    """
+    qa = np.asarray(qa, dtype=np.float64)
+    qb = np.asarray(qb, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., np.newaxis]
+    cos_half_theta = np.sum(qa * qb, axis=-1, keepdims=True)
+    # Take the shortest path
+    qb = np.where(cos_half_theta < 0.0, -qb, qb)
+    cos_half_theta = np.minimum(np.abs(cos_half_theta), 1.0)
+    half_theta = np.arccos(cos_half_theta)
+    sin_half_theta = np.sqrt(1.0 - cos_half_theta * cos_half_theta)
+    # Nearly identical rotations fall back to a linear interpolation
+    close = sin_half_theta < 1e-6
+    safe = np.where(close, 1.0, sin_half_theta)
+    ratio_a = np.where(close, 1.0 - t, np.sin((1.0 - t) * half_theta) / safe)
+    ratio_b = np.where(close, t, np.sin(t * half_theta) / safe)
+    return normalize(qa * ratio_a + qb * ratio_b)
+
+
+def swing_twist(q, twist_axis=0):
+    """Decompose rotations into swing and twist.
+
+    The twist is the rotation around the twist axis and q = multiply(twist, swing).
+
+    :param q: (..., 4) quaternions
+    :param twist_axis: 0, 1 or 2 for the x, y or z axis, or a 3 vector.
+    :return: Tuple of the (..., 4) swing and (..., 4) twist quaternions.
+    """
+    q = np.asarray(q, dtype=np.float64)
+    if np.ndim(twist_axis) == 0:
+        axis = np.zeros(3)
+        axis[twist_axis] = 1.0
+    else:
+        axis = np.asarray(twist_axis, dtype=np.float64)
+        axis = axis / np.linalg.norm(axis)
+    projection = np.sum(q[..., :3] * axis, axis=-1, keepdims=True) * axis
+    twist = np.concatenate([projection, q[..., 3:]], axis=-1)
+    length = np.linalg.norm(twist, axis=-1, keepdims=True)
+    # A 180 degree swing leaves no twist
+    twist = np.where(length < 1e-9, identity(), twist / np.where(length, length, 1.0))
+    swing = multiply(conjugate(twist), q)
+    return swing, twist